@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ALMACÉN LOCAL DE VELAS - COLUMNAR, BINARIO Y MAPEABLE EN MEMORIA
+Estructura: <raiz>/<SIMBOLO>/<temporalidad>/<año>/<columna>.bin (+ esquema.json por temporalidad).
+Cada columna es un array NumPy plano: se anexa sin reescribir y se lee con np.memmap sin copiar.
+"""
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+RAIZ_DATOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "datos")
+ARCHIVO_ESQUEMA = "esquema.json"
+
+# Columnas de los rates de MT5 (time en segundos)
+DTYPE_VELAS = np.dtype([
+    ('time', np.int64),
+    ('open', np.float64),
+    ('high', np.float64),
+    ('low', np.float64),
+    ('close', np.float64),
+    ('tick_volume', np.int64),
+    ('spread', np.int32),
+    ('real_volume', np.int64),
+])
+
+
+def _año(tiempos):
+    return tiempos.astype('datetime64[s]').astype('datetime64[Y]').astype(np.int64) + 1970
+
+
+def _a_segundos(fecha):
+    """datetime / str / Timestamp / int → segundos epoch (None se mantiene)"""
+    if fecha is None or isinstance(fecha, (int, np.integer)):
+        return fecha
+    fecha = pd.Timestamp(fecha)
+    if fecha.tzinfo is not None:
+        fecha = fecha.tz_convert('UTC').tz_localize(None)
+    return int(fecha.value // 10**9)
+
+
+class AlmacenVelas:
+    """Velas por símbolo, temporalidad y año en columnas binarias"""
+
+    def __init__(self, raiz=RAIZ_DATOS):
+        self.raiz = raiz
+        self._mapas = {}  # ruta del año -> (filas, columnas memmap)
+
+    # ---------------- Rutas y esquema ----------------
+
+    def _ruta(self, simbolo, temporalidad, año=None):
+        ruta = os.path.join(self.raiz, simbolo.upper(), temporalidad)
+        return ruta if año is None else os.path.join(ruta, str(año))
+
+    def esquema(self, simbolo, temporalidad):
+        """dtype de las columnas guardadas (None si no hay datos)"""
+        ruta = os.path.join(self._ruta(simbolo, temporalidad), ARCHIVO_ESQUEMA)
+        if not os.path.exists(ruta):
+            return None
+        with open(ruta, 'r', encoding='utf-8') as f:
+            return np.dtype([(nombre, tipo) for nombre, tipo in json.load(f)])
+
+    def _guardar_esquema(self, simbolo, temporalidad, dtype):
+        ruta = self._ruta(simbolo, temporalidad)
+        os.makedirs(ruta, exist_ok=True)
+        with open(os.path.join(ruta, ARCHIVO_ESQUEMA), 'w', encoding='utf-8') as f:
+            json.dump([(nombre, dtype[nombre].str) for nombre in dtype.names], f)
+
+    def años(self, simbolo, temporalidad):
+        ruta = self._ruta(simbolo, temporalidad)
+        if not os.path.isdir(ruta):
+            return []
+        return sorted(int(nombre) for nombre in os.listdir(ruta) if nombre.isdigit())
+
+    def _filas(self, ruta_año, dtype):
+        """Filas completas de una partición (una escritura cortada deja columnas desiguales)"""
+        filas = []
+        for nombre in dtype.names:
+            archivo = os.path.join(ruta_año, f"{nombre}.bin")
+            filas.append(os.path.getsize(archivo) // dtype[nombre].itemsize if os.path.exists(archivo) else 0)
+        return min(filas)
+
+    # ---------------- Escritura ----------------
+
+    def anexar(self, simbolo, temporalidad, rates):
+        """
+        Anexa las velas posteriores a la última guardada (array estructurado en orden cronológico).
+        Returns:
+            número de velas anexadas
+        """
+        if rates is None or len(rates) == 0:
+            return 0
+        dtype = self.esquema(simbolo, temporalidad)
+        if dtype is None:
+            dtype = rates.dtype
+            self._guardar_esquema(simbolo, temporalidad, dtype)
+
+        ultimo = self.ultimo_tiempo(simbolo, temporalidad)
+        if ultimo is not None:
+            rates = rates[rates['time'] > ultimo]
+        if len(rates) == 0:
+            return 0
+
+        años = _año(rates['time'])
+        for año in np.unique(años):
+            parte = rates[años == año]
+            ruta_año = self._ruta(simbolo, temporalidad, año)
+            os.makedirs(ruta_año, exist_ok=True)
+            self._mapas.pop(ruta_año, None)
+            # Descartar restos de una escritura cortada antes de anexar
+            filas = self._filas(ruta_año, dtype)
+            for nombre in dtype.names:
+                archivo = os.path.join(ruta_año, f"{nombre}.bin")
+                with open(archivo, 'ab') as f:
+                    tamaño = filas * dtype[nombre].itemsize
+                    if f.tell() != tamaño:
+                        f.truncate(tamaño)
+                    f.write(np.ascontiguousarray(parte[nombre], dtype=dtype[nombre]).tobytes())
+        return len(rates)
+
+    def importar_csv(self, ruta_csv, simbolo, temporalidad):
+        """Importa un CSV exportado por get_dataset.py (datetime, open, high, low, close, volume)"""
+        df = pd.read_csv(ruta_csv)
+        col_tiempo = [col for col in df.columns if 'time' in col.lower() or 'date' in col.lower()][0]
+        rates = np.zeros(len(df), dtype=DTYPE_VELAS)
+        rates['time'] = pd.to_datetime(df[col_tiempo]).to_numpy(dtype='datetime64[s]').astype(np.int64)
+        for campo in ('open', 'high', 'low', 'close'):
+            rates[campo] = df[[col for col in df.columns if campo in col.lower()][0]].to_numpy(dtype=np.float64)
+        volumen = [col for col in df.columns if 'volume' in col.lower()]
+        if volumen:
+            rates['tick_volume'] = df[volumen[0]].to_numpy(dtype=np.int64)
+        rates = rates[np.argsort(rates['time'], kind='stable')]
+        return self.anexar(simbolo, temporalidad, rates)
+
+    # ---------------- Lectura ----------------
+
+    def _columnas_año(self, simbolo, temporalidad, año, dtype):
+        """Columnas de un año como np.memmap de solo lectura (reutilizados mientras no crezcan)"""
+        ruta_año = self._ruta(simbolo, temporalidad, año)
+        filas = self._filas(ruta_año, dtype)
+        if filas == 0:
+            return None
+        previo = self._mapas.get(ruta_año)
+        if previo is not None and previo[0] == filas:
+            return previo[1]
+        columnas = {
+            nombre: np.memmap(os.path.join(ruta_año, f"{nombre}.bin"), dtype=dtype[nombre], mode='r', shape=(filas,))
+            for nombre in dtype.names
+        }
+        self._mapas[ruta_año] = (filas, columnas)
+        return columnas
+
+    def ultimo_tiempo(self, simbolo, temporalidad):
+        """Tiempo (segundos) de la última vela guardada o None"""
+        dtype = self.esquema(simbolo, temporalidad)
+        if dtype is None:
+            return None
+        for año in reversed(self.años(simbolo, temporalidad)):
+            columnas = self._columnas_año(simbolo, temporalidad, año, dtype)
+            if columnas is not None:
+                return int(columnas['time'][-1])
+        return None
+
+    def particiones(self, simbolo, temporalidad, desde=None, hasta=None, columnas=None):
+        """
+        Genera, por año, las columnas del rango [desde, hasta) como vistas sin copia del memmap.
+        """
+        dtype = self.esquema(simbolo, temporalidad)
+        if dtype is None:
+            return
+        desde, hasta = _a_segundos(desde), _a_segundos(hasta)
+        nombres = columnas or dtype.names
+        año_desde = _año(np.array([desde]))[0] if desde is not None else None
+        año_hasta = _año(np.array([hasta]))[0] if hasta is not None else None
+        for año in self.años(simbolo, temporalidad):
+            if (año_desde is not None and año < año_desde) or (año_hasta is not None and año > año_hasta):
+                continue
+            datos = self._columnas_año(simbolo, temporalidad, año, dtype)
+            if datos is None:
+                continue
+            tiempos = datos['time']
+            inicio = int(np.searchsorted(tiempos, desde, side='left')) if desde is not None else 0
+            fin = int(np.searchsorted(tiempos, hasta, side='left')) if hasta is not None else len(tiempos)
+            if fin > inicio:
+                yield {nombre: datos[nombre][inicio:fin] for nombre in nombres}
+
+    def leer(self, simbolo, temporalidad, desde=None, hasta=None, columnas=None):
+        """
+        Columnas del rango [desde, hasta). Si el rango cae en un solo año se devuelven
+        vistas del memmap (sin copia); si abarca varios se concatenan.
+        """
+        dtype = self.esquema(simbolo, temporalidad)
+        nombres = list(columnas or (dtype.names if dtype is not None else DTYPE_VELAS.names))
+        partes = list(self.particiones(simbolo, temporalidad, desde, hasta, nombres))
+        if not partes:
+            tipos = dtype if dtype is not None else DTYPE_VELAS
+            return {nombre: np.empty(0, dtype=tipos[nombre]) for nombre in nombres}
+        if len(partes) == 1:
+            return partes[0]
+        return {nombre: np.concatenate([parte[nombre] for parte in partes]) for nombre in nombres}
+
+    def leer_rates(self, simbolo, temporalidad, desde=None, hasta=None):
+        """Rango como array estructurado (mismo formato que copy_rates_* de MT5)"""
+        dtype = self.esquema(simbolo, temporalidad)
+        if dtype is None:
+            dtype = DTYPE_VELAS
+        columnas = self.leer(simbolo, temporalidad, desde, hasta)
+        rates = np.empty(len(columnas['time']), dtype=dtype)
+        for nombre in dtype.names:
+            rates[nombre] = columnas[nombre]
+        return rates
+
+    def resumen(self):
+        """Símbolos, temporalidades, velas y rango guardados"""
+        filas = []
+        if not os.path.isdir(self.raiz):
+            return filas
+        for simbolo in sorted(os.listdir(self.raiz)):
+            for temporalidad in sorted(os.listdir(os.path.join(self.raiz, simbolo))):
+                tiempos = self.leer(simbolo, temporalidad, columnas=['time'])['time']
+                if len(tiempos):
+                    filas.append({
+                        'simbolo': simbolo,
+                        'temporalidad': temporalidad,
+                        'velas': len(tiempos),
+                        'desde': pd.to_datetime(int(tiempos[0]), unit='s'),
+                        'hasta': pd.to_datetime(int(tiempos[-1]), unit='s'),
+                    })
+        return filas
+
+
+# Instancia por defecto (backtest/datos)
+almacen = AlmacenVelas()
+
+
+def main():
+    """Importa los CSV incluidos y muestra el contenido del almacén"""
+    for ruta_csv, simbolo, temporalidad in (
+        ('EURUSD_4H.csv', 'EURUSD', '4hour'),
+        ('EURUSD_1H_20150102_to_20260213.csv', 'EURUSD', '1hour'),
+    ):
+        if os.path.exists(ruta_csv):
+            print(f"📥 {ruta_csv}: {almacen.importar_csv(ruta_csv, simbolo, temporalidad):,} velas nuevas")
+    for fila in almacen.resumen():
+        print(f"   {fila['simbolo']} {fila['temporalidad']}: {fila['velas']:,} velas ({fila['desde']} - {fila['hasta']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,72 +1,198 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import os
+import sys
 import pandas as pd
 import numpy as np
+from time import perf_counter
 from datetime import datetime, time
 import warnings
+from almacen import almacen
+from cargador import cargar_velas_csv, velas_a_dataframe, calcular_sesion_ny, formato_conocido, DTYPE_CACHE
+
+# Módulos de la raíz del proyecto (métricas compartidas con el bot)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from metricas import AcumuladorMetricas
 warnings.filterwarnings('ignore')
 
+# Operaciones cerradas (una fila por operación, preasignado)
+DTYPE_OPERACION = np.dtype([
+    ('idx_entrada', np.int64),
+    ('idx_salida', np.int64),
+    ('compra', np.bool_),
+    ('por_sl', np.bool_),
+    ('precio_entrada', np.float64),
+    ('precio_salida', np.float64),
+    ('stop_loss', np.float64),
+    ('take_profit', np.float64),
+    ('diferencia', np.float64),
+    ('suma_precios', np.float64),
+    ('tamaño', np.float64),
+    ('pnl', np.float64),
+    ('pnl_pips', np.float64),
+    ('velas_hold', np.int64),
+])
+
+# Velas revisadas por operación en la primera pasada y tope de celdas por bloque
+BLOQUE_INICIAL = 64
+MAX_CELDAS_BLOQUE = 4_000_000
+
+
+def primer_toque(high, low, inicios, compra, sl, tp, bloque=BLOQUE_INICIAL):
+    """
+    Primera vela (desde la de entrada, incluida) en la que cada operación toca su SL o TP.
+    Se revisan bloques de velas para todas las operaciones abiertas a la vez; el bloque
+    se duplica en cada pasada para las que siguen abiertas.
+    Si SL y TP se tocan en la misma vela gana el SL.
+
+    Returns:
+        (salida, por_sl): índice de la vela de salida (-1 si nunca se cierra) y si fue por SL
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    inicios = np.asarray(inicios, dtype=np.int64)
+    n = len(high)
+    m = len(inicios)
+
+    salida = np.full(m, -1, dtype=np.int64)
+    por_sl = np.zeros(m, dtype=bool)
+    abiertas = np.flatnonzero(inicios < n)
+    desde = inicios.copy()
+    ancho = bloque
+
+    while abiertas.size:
+        base = desde[abiertas]
+        posiciones = base[:, None] + np.arange(ancho)
+        valido = posiciones < n
+        np.minimum(posiciones, n - 1, out=posiciones)
+        h = high[posiciones]
+        l = low[posiciones]
+
+        es_compra = compra[abiertas][:, None]
+        nivel_sl = sl[abiertas][:, None]
+        nivel_tp = tp[abiertas][:, None]
+        toca_sl = np.where(es_compra, l <= nivel_sl, h >= nivel_sl) & valido
+        toca_tp = np.where(es_compra, h >= nivel_tp, l <= nivel_tp) & valido
+        toca = toca_sl | toca_tp
+
+        hay = toca.any(axis=1)
+        primera = toca.argmax(axis=1)
+        filas = np.flatnonzero(hay)
+        salida[abiertas[filas]] = base[filas] + primera[filas]
+        por_sl[abiertas[filas]] = toca_sl[filas, primera[filas]]
+
+        siguen = ~hay & (base + ancho < n)
+        desde[abiertas[siguen]] = base[siguen] + ancho
+        abiertas = abiertas[siguen]
+        if abiertas.size:
+            ancho = max(bloque, min(ancho * 2, MAX_CELDAS_BLOQUE // abiertas.size))
+
+    return salida, por_sl
+
+
 class BacktestEURUSD:
-    def __init__(self, csv_path, capital_inicial=10000, comision=0.0001, slippage=0.0001):
+    def __init__(self, csv_path=None, capital_inicial=10000, comision=0.0001, slippage=0.0001,
+                 simbolo=None, temporalidad=None, desde=None, hasta=None, usar_cache=True, filas_muestra=35,
+                 resolucion_intrabar=False, temporalidad_intrabar='1min', simbolo_intrabar=None):
         self.csv_path = csv_path
+        # Desempate SL/TP en la misma vela con velas M1 del almacén (solo las velas ambiguas)
+        self.resolucion_intrabar = resolucion_intrabar
+        self.temporalidad_intrabar = temporalidad_intrabar
+        self.simbolo_intrabar = simbolo_intrabar
+        self.intrabar = {}
+        self.usar_cache = usar_cache
+        self.filas_muestra = filas_muestra
+        # Si se indica símbolo y temporalidad los datos salen del almacén local (backtest/datos)
+        self.simbolo = simbolo
+        self.temporalidad = temporalidad
+        self.desde = desde
+        self.hasta = hasta
         self.capital_inicial = capital_inicial
         self.comision = comision
         self.slippage = slippage
         self.datos = None
         self.trades = None
+        self.operaciones = None
         self.resultados = None
         self.metricas = {}
 
     def cargar_datos(self):
         print("📊 Cargando datos...")
         try:
-            self.datos = pd.read_csv(self.csv_path)
-            col_tiempo = [col for col in self.datos.columns if 'time' in col.lower() or 'date' in col.lower()][0]
-            self.datos['datetime'] = pd.to_datetime(self.datos[col_tiempo])
-            self.datos.set_index('datetime', inplace=True)
-
-            if self.datos.index.tz is None:
-                self.datos.index = self.datos.index.tz_localize('UTC')
+            if self.simbolo:
+                self.datos = velas_a_dataframe(self._leer_almacen())
+            elif formato_conocido(self.csv_path):
+                velas, desde_cache = cargar_velas_csv(self.csv_path, self.usar_cache)
+                self.datos = velas_a_dataframe(velas)
+                if desde_cache:
+                    print("⚡ Datos leídos desde la caché binaria")
             else:
-                self.datos.index = self.datos.index.tz_convert('UTC')
-
-            self.datos.index = self.datos.index.tz_convert('America/New_York')
-
-            column_mapping = {}
-            for col in self.datos.columns:
-                col_lower = col.lower()
-                if 'open' in col_lower:
-                    column_mapping[col] = 'open'
-                elif 'high' in col_lower:
-                    column_mapping[col] = 'high'
-                elif 'low' in col_lower:
-                    column_mapping[col] = 'low'
-                elif 'close' in col_lower:
-                    column_mapping[col] = 'close'
-                elif 'volume' in col_lower:
-                    column_mapping[col] = 'volume'
-
-            self.datos.rename(columns=column_mapping, inplace=True)
-
-            required_cols = ['open', 'high', 'low', 'close']
-            for col in required_cols:
-                if col not in self.datos.columns:
-                    raise ValueError(f"Columna '{col}' no encontrada en el CSV")
+                self._leer_csv_generico()
 
             print(f"✅ Datos cargados: {len(self.datos)} velas de 4H")
             print(f"Período: {self.datos.index[0]} - {self.datos.index[-1]}")
-            print("\nPrimeras 35 filas del dataset:\n")
-            print(self.datos.head(35))
-            print("\nContinuando con el backtest...\n")
+            if self.filas_muestra:
+                print(f"\nPrimeras {self.filas_muestra} filas del dataset:\n")
+                print(self.datos.head(self.filas_muestra))
+                print("\nContinuando con el backtest...\n")
 
             return True
         except Exception as e:
             print(f"❌ Error cargando datos: {e}")
             return False
 
-    def identificar_velas_5am(self):
+    def _leer_csv_generico(self):
+        """CSV con otra cabecera: columnas deducidas por nombre y fechas sin formato fijo"""
+        self.datos = pd.read_csv(self.csv_path)
+        col_tiempo = [col for col in self.datos.columns if 'time' in col.lower() or 'date' in col.lower()][0]
+        self.datos['datetime'] = pd.to_datetime(self.datos[col_tiempo])
+        self.datos.set_index('datetime', inplace=True)
+
+        if self.datos.index.tz is None:
+            self.datos.index = self.datos.index.tz_localize('UTC')
+        else:
+            self.datos.index = self.datos.index.tz_convert('UTC')
+
+        self.datos.index = self.datos.index.tz_convert('America/New_York')
+
+        column_mapping = {}
+        for col in self.datos.columns:
+            col_lower = col.lower()
+            if 'open' in col_lower:
+                column_mapping[col] = 'open'
+            elif 'high' in col_lower:
+                column_mapping[col] = 'high'
+            elif 'low' in col_lower:
+                column_mapping[col] = 'low'
+            elif 'close' in col_lower:
+                column_mapping[col] = 'close'
+            elif 'volume' in col_lower:
+                column_mapping[col] = 'volume'
+
+        self.datos.rename(columns=column_mapping, inplace=True)
+
+        required_cols = ['open', 'high', 'low', 'close']
+        for col in required_cols:
+            if col not in self.datos.columns:
+                raise ValueError(f"Columna '{col}' no encontrada en el CSV")
         self.datos['hora_ny'] = self.datos.index.hour
+
+    def _leer_almacen(self):
+        """Velas del almacén columnar con las columnas de sesión NY"""
+        columnas = almacen.leer(self.simbolo, self.temporalidad, self.desde, self.hasta,
+                                columnas=['time', 'open', 'high', 'low', 'close', 'tick_volume'])
+        if len(columnas['time']) == 0:
+            raise ValueError(f"Sin datos de {self.simbolo} {self.temporalidad} en el almacén")
+        velas = np.empty(len(columnas['time']), dtype=DTYPE_CACHE)
+        for nombre in ('time', 'open', 'high', 'low', 'close'):
+            velas[nombre] = columnas[nombre]
+        velas['volume'] = columnas['tick_volume']
+        return calcular_sesion_ny(velas)
+
+    def identificar_velas_5am(self):
+        if 'hora_ny' not in self.datos.columns:
+            self.datos['hora_ny'] = self.datos.index.hour
         self.datos['es_5am'] = self.datos['hora_ny'] == 5
         return self.datos['es_5am'].sum()
 
@@ -79,84 +205,169 @@ class BacktestEURUSD:
         num_velas_5am = self.identificar_velas_5am()
         print(f"Velas de 5AM encontradas: {num_velas_5am}")
 
-        trades = []
+        datos = self.datos
+        n = len(datos)
+        open_ = datos['open'].to_numpy(dtype=np.float64)
+        high = datos['high'].to_numpy(dtype=np.float64)
+        low = datos['low'].to_numpy(dtype=np.float64)
+        close = datos['close'].to_numpy(dtype=np.float64)
+
+        # Entradas: velas de 5AM (a partir de la segunda), dirección según la vela anterior
+        idx = np.flatnonzero(datos['es_5am'].to_numpy(dtype=bool))
+        idx = idx[idx >= 1]
+        compra = close[idx - 1] < open_[idx - 1]
+
+        entrada = np.where(compra, open_[idx] + self.slippage, open_[idx] - self.slippage)
+        take_profit = np.where(compra, high[idx - 1], low[idx - 1])
+        distancia_tp = np.abs(entrada - take_profit)
+        stop_loss = np.where(compra, entrada - distancia_tp, entrada + distancia_tp)
+        riesgo_pips = np.abs(entrada - stop_loss)
+
+        # Primer toque de SL/TP de todas las operaciones a la vez
+        salida, por_sl = primer_toque(high, low, idx, compra, stop_loss, take_profit)
+        cerrada = salida >= 0
+        if self.resolucion_intrabar:
+            por_sl = self._resolver_intrabar(high, low, salida, por_sl, compra, stop_loss, take_profit)
+
+        operaciones = np.zeros(int(cerrada.sum()), dtype=DTYPE_OPERACION)
+        operaciones['idx_entrada'] = idx[cerrada]
+        operaciones['idx_salida'] = salida[cerrada]
+        operaciones['compra'] = compra[cerrada]
+        operaciones['por_sl'] = por_sl[cerrada]
+        operaciones['precio_entrada'] = entrada[cerrada]
+        operaciones['stop_loss'] = stop_loss[cerrada]
+        operaciones['take_profit'] = take_profit[cerrada]
+        operaciones['velas_hold'] = operaciones['idx_salida'] - operaciones['idx_entrada']
+        self._precios_salida(operaciones)
+
+        # El tamaño depende del capital acumulado: único paso secuencial (escalar por operación)
+        riesgos = riesgo_pips[cerrada].tolist()
+        diferencias = operaciones['diferencia'].tolist()
+        sumas = operaciones['suma_precios'].tolist()
+        tamaños = np.empty(len(operaciones))
+        pnls = np.empty(len(operaciones))
         capital = self.capital_inicial
-
-        for i in range(1, len(self.datos)):
-            if not self.datos.iloc[i]['es_5am']:
-                continue
-
-            vela_actual = self.datos.iloc[i]
-            vela_anterior = self.datos.iloc[i-1]
-
-            es_bajista_anterior = vela_anterior['close'] < vela_anterior['open']
-
-            if es_bajista_anterior:
-                direccion = 'BUY'
-                precio_entrada = vela_actual['open'] + self.slippage
-                take_profit = vela_anterior['high']
-            else:
-                direccion = 'SELL'
-                precio_entrada = vela_actual['open'] - self.slippage
-                take_profit = vela_anterior['low']
-
-            distancia_tp = abs(precio_entrada - take_profit)
-            stop_loss = precio_entrada - distancia_tp if direccion == 'BUY' else precio_entrada + distancia_tp
-
-            riesgo_pips = abs(precio_entrada - stop_loss)
+        for k in range(len(operaciones)):
             riesgo_dinero = capital * 0.01
-            tamaño_posicion = riesgo_dinero / riesgo_pips if riesgo_pips > 0 else 0
-
-            resultado = self.simular_operacion(i, direccion, precio_entrada, stop_loss, take_profit, tamaño_posicion, vela_actual)
-
-            if resultado:
-                capital += resultado['pnl']
-                trades.append(resultado)
-
-        self.trades = pd.DataFrame(trades)
+            tamaño = riesgo_dinero / riesgos[k] if riesgos[k] > 0 else 0
+            pnl = diferencias[k] * tamaño
+            pnl -= sumas[k] * tamaño * self.comision
+            tamaños[k] = tamaño
+            pnls[k] = pnl
+            capital += pnl
+        operaciones['tamaño'] = tamaños
+        operaciones['pnl'] = pnls
+
+        self.operaciones = operaciones
+        self.trades = self._operaciones_a_dataframe(operaciones)
         self.calcular_metricas()
         return True
 
+    def _resolver_intrabar(self, high, low, salida, por_sl, compra, sl, tp):
+        """
+        Velas de salida que tocan SL y TP a la vez: se decide el orden real con las velas M1
+        de esa vela (leídas del almacén solo para esas velas). Sin datos M1 se mantiene el SL.
+        """
+        inicio = perf_counter()
+        simbolo = self.simbolo_intrabar or self.simbolo
+        if not simbolo:
+            print("⚠️  Resolución intrabar sin símbolo para el almacén, se mantiene SL primero")
+            return por_sl
+        cerrada = salida >= 0
+        s = np.maximum(salida, 0)
+        toca_tp = np.where(compra, high[s] >= tp, low[s] <= tp)
+        ambiguas = np.flatnonzero(cerrada & por_sl & toca_tp)
+
+        tiempos = self.datos.index.asi8 // 10**9
+        duracion = int(np.diff(tiempos).min()) if len(tiempos) > 1 else 0
+        resuelto = por_sl.copy()
+        cambiadas = 0
+        sin_datos = 0
+        velas_m1 = 0
+        for k in ambiguas:
+            j = salida[k]
+            desde = int(tiempos[j])
+            hasta = min(int(tiempos[j + 1]), desde + duracion) if j + 1 < len(tiempos) else desde + duracion
+            m1 = almacen.leer(simbolo, self.temporalidad_intrabar, desde, hasta, columnas=['high', 'low'])
+            velas_m1 += len(m1['high'])
+            salida_m1, por_sl_m1 = primer_toque(m1['high'], m1['low'], np.array([0]), compra[k:k + 1],
+                                                sl[k:k + 1], tp[k:k + 1])
+            if salida_m1[0] < 0:
+                sin_datos += 1
+                continue
+            if not por_sl_m1[0]:
+                resuelto[k] = False
+                cambiadas += 1
+
+        self.intrabar = {
+            'velas_ambiguas': len(ambiguas),
+            'cambian_a_tp': cambiadas,
+            'sin_datos_m1': sin_datos,
+            'velas_m1_leidas': velas_m1,
+            'segundos': round(perf_counter() - inicio, 4),
+        }
+        print(f"🔬 Intrabar {self.temporalidad_intrabar}: {len(ambiguas)} velas ambiguas, "
+              f"{cambiadas} operaciones pasan de SL a TP, {sin_datos} sin datos "
+              f"({velas_m1} velas leídas en {self.intrabar['segundos']:.3f}s)")
+        return resuelto
+
+    def _precios_salida(self, operaciones):
+        """Precio de salida, diferencia a favor y pips según la razón de salida (vectorizado)"""
+        compra = operaciones['compra']
+        por_sl = operaciones['por_sl']
+        entrada = operaciones['precio_entrada']
+        nivel = np.where(por_sl, operaciones['stop_loss'], operaciones['take_profit'])
+        # Slippage en contra: SL de compra y TP de venta salen más arriba
+        sube = compra == por_sl
+        salida = np.where(sube, nivel + self.slippage, nivel - self.slippage)
+        operaciones['precio_salida'] = salida
+        operaciones['diferencia'] = np.where(compra, salida - entrada, entrada - salida)
+        operaciones['suma_precios'] = entrada + salida
+        operaciones['pnl_pips'] = operaciones['diferencia'] * 10000
+
+    def _operaciones_a_dataframe(self, operaciones):
+        """Convierte el array estructurado al DataFrame de trades"""
+        if len(operaciones) == 0:
+            return pd.DataFrame()
+        indice = self.datos.index
+        return pd.DataFrame({
+            'fecha_entrada': indice[operaciones['idx_entrada']],
+            'fecha_salida': indice[operaciones['idx_salida']],
+            'direccion': np.where(operaciones['compra'], 'BUY', 'SELL').astype(object),
+            'precio_entrada': operaciones['precio_entrada'],
+            'precio_salida': operaciones['precio_salida'],
+            'stop_loss': operaciones['stop_loss'],
+            'take_profit': operaciones['take_profit'],
+            'tamaño': operaciones['tamaño'],
+            'pnl': operaciones['pnl'],
+            'pnl_pips': operaciones['pnl_pips'],
+            'razon_salida': np.where(operaciones['por_sl'], 'SL', 'TP').astype(object),
+            'velas_hold': operaciones['velas_hold'],
+        })
+
     def simular_operacion(self, idx, direccion, entrada, sl, tp, tamaño, vela_entrada):
-        for j in range(idx, len(self.datos)):
-            vela = self.datos.iloc[j]
-
-            if direccion == 'BUY':
-                if vela['low'] <= sl:
-                    precio_salida = sl + self.slippage
-                    pnl = (precio_salida - entrada) * tamaño
-                    pnl -= (entrada + precio_salida) * tamaño * self.comision
-                    hora_salida = vela.name
-                    razon_salida = 'SL'
-                    break
-                elif vela['high'] >= tp:
-                    precio_salida = tp - self.slippage
-                    pnl = (precio_salida - entrada) * tamaño
-                    pnl -= (entrada + precio_salida) * tamaño * self.comision
-                    hora_salida = vela.name
-                    razon_salida = 'TP'
-                    break
-            else:
-                if vela['high'] >= sl:
-                    precio_salida = sl - self.slippage
-                    pnl = (entrada - precio_salida) * tamaño
-                    pnl -= (entrada + precio_salida) * tamaño * self.comision
-                    hora_salida = vela.name
-                    razon_salida = 'SL'
-                    break
-                elif vela['low'] <= tp:
-                    precio_salida = tp + self.slippage
-                    pnl = (entrada - precio_salida) * tamaño
-                    pnl -= (entrada + precio_salida) * tamaño * self.comision
-                    hora_salida = vela.name
-                    razon_salida = 'TP'
-                    break
-        else:
+        compra = direccion == 'BUY'
+        salida, por_sl = primer_toque(
+            self.datos['high'].to_numpy(dtype=np.float64),
+            self.datos['low'].to_numpy(dtype=np.float64),
+            np.array([idx]), np.array([compra]), np.array([sl], dtype=np.float64), np.array([tp], dtype=np.float64),
+        )
+        j = int(salida[0])
+        if j < 0:
             return None
 
+        if por_sl[0]:
+            precio_salida = sl + self.slippage if compra else sl - self.slippage
+            razon_salida = 'SL'
+        else:
+            precio_salida = tp - self.slippage if compra else tp + self.slippage
+            razon_salida = 'TP'
+        pnl = (precio_salida - entrada) * tamaño if compra else (entrada - precio_salida) * tamaño
+        pnl -= (entrada + precio_salida) * tamaño * self.comision
+
         return {
             'fecha_entrada': vela_entrada.name,
-            'fecha_salida': hora_salida,
+            'fecha_salida': self.datos.index[j],
             'direccion': direccion,
             'precio_entrada': entrada,
             'precio_salida': precio_salida,
@@ -164,7 +375,7 @@ class BacktestEURUSD:
             'take_profit': tp,
             'tamaño': tamaño,
             'pnl': pnl,
-            'pnl_pips': (precio_salida - entrada) * 10000 if direccion == 'BUY' else (entrada - precio_salida) * 10000,
+            'pnl_pips': (precio_salida - entrada) * 10000 if compra else (entrada - precio_salida) * 10000,
             'razon_salida': razon_salida,
             'velas_hold': j - idx
         }
@@ -174,40 +385,13 @@ class BacktestEURUSD:
             print("❌ No hay trades para calcular métricas")
             return
 
-        trades_ganadores = self.trades[self.trades['pnl'] > 0]
-        trades_perdedores = self.trades[self.trades['pnl'] < 0]
-
-        self.metricas = {
-            'Total Trades': len(self.trades),
-            'Trades Ganadores': len(trades_ganadores),
-            'Trades Perdedores': len(trades_perdedores),
-            '% Win Rate': len(trades_ganadores) / len(self.trades) * 100,
-            'Capital Inicial': self.capital_inicial,
-            'Capital Final': self.capital_inicial + self.trades['pnl'].sum(),
-            'Net Profit': self.trades['pnl'].sum(),
-            'Net Profit %': (self.trades['pnl'].sum() / self.capital_inicial) * 100,
-            'Total Pips': self.trades['pnl_pips'].sum(),
-            'Avg Pips por Trade': self.trades['pnl_pips'].mean(),
-            'Avg Pips Ganador': trades_ganadores['pnl_pips'].mean() if len(trades_ganadores) > 0 else 0,
-            'Avg Pips Perdedor': trades_perdedores['pnl_pips'].mean() if len(trades_perdedores) > 0 else 0,
-            'Avg Ganancia': trades_ganadores['pnl'].mean() if len(trades_ganadores) > 0 else 0,
-            'Avg Pérdida': trades_perdedores['pnl'].mean() if len(trades_perdedores) > 0 else 0,
-            'Ratio Ganancia/Pérdida': abs(trades_ganadores['pnl'].mean() / trades_perdedores['pnl'].mean()) if len(trades_perdedores) > 0 and trades_perdedores['pnl'].mean() != 0 else 0,
-            'Mayor Ganancia': self.trades['pnl'].max(),
-            'Mayor Pérdida': self.trades['pnl'].min(),
-            'Desviación Estándar': self.trades['pnl'].std(),
-            'Sharpe Ratio': self.trades['pnl'].mean() / self.trades['pnl'].std() if self.trades['pnl'].std() != 0 else 0,
-            'Trades TP': len(self.trades[self.trades['razon_salida'] == 'TP']),
-            'Trades SL': len(self.trades[self.trades['razon_salida'] == 'SL']),
-            '% TP': len(self.trades[self.trades['razon_salida'] == 'TP']) / len(self.trades) * 100,
-            'Avg Velas por Trade': self.trades['velas_hold'].mean(),
-            'Buy Trades': len(self.trades[self.trades['direccion'] == 'BUY']),
-            'Sell Trades': len(self.trades[self.trades['direccion'] == 'SELL']),
-            'Buy Win Rate': len(self.trades[(self.trades['direccion'] == 'BUY') & (self.trades['pnl'] > 0)]) / len(self.trades[self.trades['direccion'] == 'BUY']) * 100 if len(self.trades[self.trades['direccion'] == 'BUY']) > 0 else 0,
-            'Sell Win Rate': len(self.trades[(self.trades['direccion'] == 'SELL') & (self.trades['pnl'] > 0)]) / len(self.trades[self.trades['direccion'] == 'SELL']) * 100 if len(self.trades[self.trades['direccion'] == 'SELL']) > 0 else 0,
-            'Drawdown Máximo': self.calcular_max_drawdown(),
-            'Factor de Beneficio': abs(self.trades[self.trades['pnl'] > 0]['pnl'].sum() / self.trades[self.trades['pnl'] < 0]['pnl'].sum()) if len(self.trades[self.trades['pnl'] < 0]) > 0 else 0,
-        }
+        # Una sola pasada sobre los trades (mismo acumulador que el bot en vivo)
+        self.acumulador = AcumuladorMetricas(self.capital_inicial).registrar_trades(self.trades)
+        self.metricas = self.acumulador.metricas()
+        if self.intrabar:
+            self.metricas['Velas Ambiguas (intrabar)'] = self.intrabar['velas_ambiguas']
+            self.metricas['Trades SL→TP (intrabar)'] = self.intrabar['cambian_a_tp']
+            self.metricas['Coste Intrabar (s)'] = self.intrabar['segundos']
 
     def calcular_max_drawdown(self):
         capital_curve = self.capital_inicial + self.trades['pnl'].cumsum()
@@ -230,7 +414,10 @@ class BacktestEURUSD:
 
 def main():
     CONFIG = {
-        'csv_path': 'dataset.csv',
+        'simbolo': 'EURUSD',
+        'temporalidad': '4hour',
+        'csv_path': None,  # Solo si no se usa el almacén
+        'resolucion_intrabar': False,  # Requiere velas 1min del mismo símbolo en el almacén
         'capital_inicial': 10000,
         'comision': 0.0001,
         'slippage': 0.0001,
@@ -242,6 +429,9 @@ def main():
 
     backtest = BacktestEURUSD(
         csv_path=CONFIG['csv_path'],
+        simbolo=CONFIG['simbolo'],
+        temporalidad=CONFIG['temporalidad'],
+        resolucion_intrabar=CONFIG['resolucion_intrabar'],
         capital_inicial=CONFIG['capital_inicial'],
         comision=CONFIG['comision'],
         slippage=CONFIG['slippage']
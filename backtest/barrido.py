@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BARRIDO PARALELO DE PARÁMETROS (MAX_PIPS_SL, RATIOS Y HORARIO DE OPERACIÓN)
+Las velas y las candidatas de entrada (patrón + dirección) se calculan una sola vez y se
+comparten entre procesos; cada combinación solo rehace SL/TP, horario y salidas.
+"""
+import os
+import json
+import time
+import itertools
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from replay import ReplayEstrategia, cargar_rates_almacen, TZ_NY
+from backtest import primer_toque
+from patrones import calcular_stops, parametros_stops
+
+ARCHIVO_RESULTADOS = "barrido_resultados.jsonl"
+
+# Parámetros por defecto (los mismos que config.py)
+PARAMETROS_BASE = {
+    'max_pips_sl': 10,
+    'ratio_2velas': 3,
+    'ratio_1vela': 2,
+    'hora_inicio': 0,
+    'hora_fin': 24,
+    'max_operaciones_diarias': 1,
+}
+
+# Arrays compartidos adjuntados en cada proceso trabajador
+_memorias = []
+_datos_trabajador = None
+
+
+# ============ MEMORIA COMPARTIDA ============
+
+def _publicar(array, memorias):
+    """Copia un array a un bloque de memoria compartida y devuelve su descriptor"""
+    array = np.ascontiguousarray(array)
+    memoria = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    destino = np.ndarray(array.shape, dtype=array.dtype, buffer=memoria.buf)
+    destino[...] = array
+    memorias.append(memoria)
+    return (memoria.name, array.shape, array.dtype.str)
+
+
+def _adjuntar(descriptor):
+    nombre, forma, dtype = descriptor
+    memoria = shared_memory.SharedMemory(name=nombre)
+    _memorias.append(memoria)
+    return np.ndarray(forma, dtype=np.dtype(dtype), buffer=memoria.buf)
+
+
+def _iniciar_trabajador(descriptores):
+    """Adjunta los datos compartidos una sola vez por proceso"""
+    global _datos_trabajador
+    _datos_trabajador = {
+        par: {campo: _adjuntar(descriptor) for campo, descriptor in campos.items()}
+        for par, campos in descriptores.items()
+    }
+
+
+# ============ EVALUACIÓN DE UNA COMBINACIÓN ============
+
+def preparar_datos(datos):
+    """
+    Candidatas de entrada y precios de salida por par (independientes de los parámetros del barrido).
+    datos: {par: (rates_direccion, rates_precision)} como en ReplayEstrategia.
+    """
+    preparados = {}
+    for par, (rates_direccion, rates_precision) in datos.items():
+        candidatas = ReplayEstrategia.candidatas_par(rates_direccion, rates_precision)
+        horas = pd.to_datetime(candidatas['cierre'], unit='s', utc=True).tz_convert(TZ_NY).tz_localize(None)
+        candidatas['hora_ny'] = horas.hour.to_numpy(dtype=np.int64)
+        candidatas['dia_ny'] = horas.to_numpy(dtype='datetime64[D]').astype(np.int64)
+        candidatas['high'] = rates_precision['high']
+        candidatas['low'] = rates_precision['low']
+        preparados[par] = candidatas
+    return preparados
+
+
+def evaluar(preparados, parametros):
+    """
+    Resultado de una combinación: señales ejecutadas según horario y máximo diario,
+    salida por primer toque de SL/TP (SL gana el empate) desde la vela siguiente a la entrada.
+    """
+    inicio = time.perf_counter()
+    p = dict(PARAMETROS_BASE, **parametros)
+
+    partes = []
+    for par, c in preparados.items():
+        codigo = c['codigo']
+        es_long = codigo > 0
+        ratio = np.where(np.abs(codigo) == 2, float(p['ratio_2velas']), float(p['ratio_1vela']))
+        es_forex, multiplicador, limite_forex = parametros_stops(par)
+        stops = calcular_stops(c['entrada'], c['extremo'], es_long, ratio, es_forex, multiplicador,
+                               p['max_pips_sl'], limite_forex=limite_forex)
+        partes.append((par, c, es_long, ratio, stops))
+
+    # Eventos (cierres con al menos una señal) de todos los pares, en orden
+    cierres = np.concatenate([c['cierre'] for _, c, _, _, _ in partes])
+    horas = np.concatenate([c['hora_ny'] for _, c, _, _, _ in partes])
+    dias = np.concatenate([c['dia_ny'] for _, c, _, _, _ in partes])
+    eventos, primera, inversa = np.unique(cierres, return_index=True, return_inverse=True)
+    hora_evento = horas[primera]
+    dia_evento = dias[primera]
+
+    # Horario y máximo de operaciones por día (cuenta eventos, no señales, como el bot)
+    en_horario = (p['hora_inicio'] <= hora_evento) & (hora_evento < p['hora_fin'])
+    acumulado = np.cumsum(en_horario)
+    inicio_dia = np.r_[True, dia_evento[1:] != dia_evento[:-1]] if len(eventos) else np.zeros(0, dtype=bool)
+    base_dia = np.maximum.accumulate(np.where(inicio_dia, acumulado - en_horario, 0)) if len(eventos) else acumulado
+    ejecutado_evento = en_horario & (acumulado - base_dia <= p['max_operaciones_diarias'])
+    ejecutada = ejecutado_evento[inversa]
+
+    resultados_r = []
+    pips = []
+    orden = []
+    sin_cierre = 0
+    desplazamiento = 0
+    for par, c, es_long, ratio, stops in partes:
+        n = len(c['codigo'])
+        sel = ejecutada[desplazamiento:desplazamiento + n]
+        desplazamiento += n
+        if not sel.any():
+            continue
+        salida, por_sl = primer_toque(c['high'], c['low'], c['posicion'][sel] + 1, es_long[sel],
+                                      stops['sl'][sel], stops['tp'][sel])
+        cerrada = salida >= 0
+        sin_cierre += int((~cerrada).sum())
+        signo = np.where(es_long[sel], 1.0, -1.0)
+        precio_salida = np.where(por_sl, stops['sl'][sel], stops['tp'][sel])
+        riesgo = np.abs(c['entrada'][sel] - stops['sl'][sel])
+        r = np.where(riesgo > 0, signo * (precio_salida - c['entrada'][sel]) / np.where(riesgo > 0, riesgo, 1.0), 0.0)
+        resultados_r.append(r[cerrada])
+        multiplicador = parametros_stops(par)[1]
+        pips.append((signo * (precio_salida - c['entrada'][sel]) * multiplicador)[cerrada])
+        orden.append(c['cierre'][sel][cerrada])
+
+    r = np.concatenate(resultados_r) if resultados_r else np.zeros(0)
+    pips = np.concatenate(pips) if pips else np.zeros(0)
+    if orden:
+        cronologico = np.argsort(np.concatenate(orden), kind='stable')
+        r = r[cronologico]
+        pips = pips[cronologico]
+
+    curva = np.cumsum(r)
+    ganancia = r[r > 0].sum()
+    perdida = -r[r < 0].sum()
+    return {
+        **parametros,
+        'operaciones': int(len(r)),
+        'ganadoras': int((r > 0).sum()),
+        'win_rate': round(float((r > 0).mean() * 100), 2) if len(r) else 0.0,
+        'r_total': round(float(r.sum()), 4),
+        'r_medio': round(float(r.mean()), 4) if len(r) else 0.0,
+        'pips_total': round(float(pips.sum()), 2),
+        'factor_beneficio': round(float(ganancia / perdida), 4) if perdida > 0 else 0.0,
+        'drawdown_max_r': round(float((curva - np.maximum.accumulate(np.r_[0.0, curva])[1:]).min()), 4) if len(r) else 0.0,
+        'sin_cierre': sin_cierre,
+        'segundos': round(time.perf_counter() - inicio, 4),
+    }
+
+
+def _evaluar_en_trabajador(parametros):
+    return evaluar(_datos_trabajador, parametros)
+
+
+# ============ BARRIDO ============
+
+def clave_combinacion(parametros):
+    return json.dumps(parametros, sort_keys=True)
+
+
+def combinaciones(rejilla):
+    """Producto cartesiano de la rejilla {parametro: [valores]} (descarta horarios vacíos)"""
+    nombres = list(rejilla)
+    for valores in itertools.product(*(rejilla[nombre] for nombre in nombres)):
+        parametros = dict(zip(nombres, valores))
+        if parametros.get('hora_inicio', 0) >= parametros.get('hora_fin', 24):
+            continue
+        yield parametros
+
+
+class BarridoParametros:
+    """Evalúa una rejilla de parámetros en un pool de procesos con reanudación desde disco"""
+
+    def __init__(self, datos, rejilla, procesos=None, archivo_resultados=ARCHIVO_RESULTADOS, criterio='r_total'):
+        self.datos = datos
+        self.rejilla = rejilla
+        self.procesos = procesos or os.cpu_count() or 1
+        self.archivo_resultados = archivo_resultados
+        self.criterio = criterio
+        self.resultados = []
+
+    def _cargar_previos(self):
+        """Resultados de una ejecución anterior interrumpida"""
+        previos = {}
+        if not self.archivo_resultados or not os.path.exists(self.archivo_resultados):
+            return previos
+        with open(self.archivo_resultados, 'r', encoding='utf-8') as f:
+            contenido = f.read()
+        for linea in contenido.splitlines():
+            try:
+                resultado = json.loads(linea)
+            except ValueError:
+                continue  # Línea a medio escribir
+            previos[resultado['clave']] = resultado
+        if contenido and not contenido.endswith("\n"):
+            # Cerrar la línea cortada para no pegarle el siguiente resultado
+            with open(self.archivo_resultados, 'a', encoding='utf-8') as f:
+                f.write("\n")
+        return previos
+
+    def _registrar(self, archivo, resultado):
+        archivo.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+        archivo.flush()
+
+    def ejecutar(self):
+        inicio = time.perf_counter()
+        previos = self._cargar_previos()
+        pendientes = []
+        for parametros in combinaciones(self.rejilla):
+            if clave_combinacion(parametros) not in previos:
+                pendientes.append(parametros)
+        total = len(pendientes) + len(previos)
+        if previos:
+            print(f"♻️  Reanudando: {len(previos)} combinaciones ya evaluadas, {len(pendientes)} pendientes")
+
+        print("📊 Preparando candidatas de entrada...")
+        preparados = preparar_datos(self.datos)
+        nuevos = []
+
+        with open(self.archivo_resultados, 'a', encoding='utf-8') as archivo:
+            if self.procesos <= 1 or len(pendientes) <= 1:
+                for parametros in pendientes:
+                    resultado = dict(evaluar(preparados, parametros), clave=clave_combinacion(parametros))
+                    self._registrar(archivo, resultado)
+                    nuevos.append(resultado)
+            else:
+                memorias = []
+                try:
+                    descriptores = {
+                        par: {campo: _publicar(array, memorias) for campo, array in campos.items()}
+                        for par, campos in preparados.items()
+                    }
+                    with ProcessPoolExecutor(max_workers=self.procesos, mp_context=mp.get_context('spawn'),
+                                             initializer=_iniciar_trabajador, initargs=(descriptores,)) as pool:
+                        futuros = {pool.submit(_evaluar_en_trabajador, parametros): parametros for parametros in pendientes}
+                        for futuro in as_completed(futuros):
+                            parametros = futuros[futuro]
+                            resultado = dict(futuro.result(), clave=clave_combinacion(parametros))
+                            self._registrar(archivo, resultado)
+                            nuevos.append(resultado)
+                            print(f"   ✅ {len(previos) + len(nuevos)}/{total} {parametros} → {resultado[self.criterio]}")
+                finally:
+                    for memoria in memorias:
+                        memoria.close()
+                        memoria.unlink()
+
+        self.resultados = sorted(list(previos.values()) + nuevos, key=lambda r: r[self.criterio], reverse=True)
+        print(f"⏱️  {len(nuevos)} combinaciones evaluadas en {time.perf_counter() - inicio:.2f}s")
+        return self.tabla()
+
+    def tabla(self):
+        """Resultados ordenados por el criterio elegido"""
+        tabla = pd.DataFrame(self.resultados)
+        if len(tabla):
+            tabla = tabla.drop(columns=['clave'])
+            tabla.index = range(1, len(tabla) + 1)
+        return tabla
+
+    def mostrar_resultados(self, filas=20):
+        print("\n" + "=" * 80)
+        print(f"BARRIDO DE PARÁMETROS - ORDENADO POR {self.criterio}")
+        print("=" * 80)
+        print(self.tabla().head(filas).to_string())
+        print("=" * 80)
+
+
+def main():
+    CONFIG = {
+        'par': 'EURUSD',
+        'temporalidad_direccion': '1hour',
+        'temporalidad_precision': '5min',
+        'desfase_servidor': 0,
+        'procesos': None,
+        'exportar_resultados': True,
+    }
+    REJILLA = {
+        'max_pips_sl': [5, 8, 10, 15, 20],
+        'ratio_2velas': [2, 3, 4],
+        'ratio_1vela': [1, 1.5, 2, 3],
+        'hora_inicio': [0, 3, 8],
+        'hora_fin': [12, 17, 24],
+    }
+
+    datos = {
+        CONFIG['par']: (
+            cargar_rates_almacen(CONFIG['par'], CONFIG['temporalidad_direccion'], desfase_servidor=CONFIG['desfase_servidor']),
+            cargar_rates_almacen(CONFIG['par'], CONFIG['temporalidad_precision'], desfase_servidor=CONFIG['desfase_servidor']),
+        )
+    }
+    barrido = BarridoParametros(datos, REJILLA, procesos=CONFIG['procesos'])
+    tabla = barrido.ejecutar()
+    barrido.mostrar_resultados()
+    if CONFIG['exportar_resultados']:
+        tabla.to_csv('barrido_resultados.csv')
+        print("Resultados exportados a: barrido_resultados.csv")
+
+
+if __name__ == "__main__":
+    main()
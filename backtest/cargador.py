@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CARGA RÁPIDA DE CSV DE VELAS CON CACHÉ BINARIA
+El CSV se lee por bloques con tipos y formato de fecha fijos; el resultado (con las columnas
+de sesión NY ya calculadas) se guarda junto al CSV, identificado por el hash del archivo.
+Las siguientes cargas del mismo archivo solo mapean la caché.
+"""
+import os
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+TZ_NY = 'America/New_York'
+
+# Formato que exporta get_dataset.py
+COLUMNA_TIEMPO = 'datetime'
+FORMATO_FECHA = '%Y-%m-%d %H:%M:%S'
+TIPOS_CSV = {
+    'open': np.float64,
+    'high': np.float64,
+    'low': np.float64,
+    'close': np.float64,
+    'volume': np.int64,
+}
+
+# Filas por bloque al leer el CSV
+TAMAÑO_BLOQUE = 500_000
+DIRECTORIO_CACHE = ".cache_velas"
+
+# Velas con las columnas de sesión NY precalculadas (time en segundos UTC)
+DTYPE_CACHE = np.dtype([
+    ('time', np.int64),
+    ('open', np.float64),
+    ('high', np.float64),
+    ('low', np.float64),
+    ('close', np.float64),
+    ('volume', np.int64),
+    ('hora_ny', np.int8),
+    ('minuto_ny', np.int8),
+    ('dia_semana_ny', np.int8),
+])
+
+
+def hash_archivo(ruta, bloque=4 * 1024 * 1024):
+    """Hash del contenido del archivo (sin parsearlo)"""
+    h = hashlib.blake2b(digest_size=16)
+    with open(ruta, 'rb') as f:
+        while True:
+            datos = f.read(bloque)
+            if not datos:
+                break
+            h.update(datos)
+    return h.hexdigest()
+
+
+def formato_conocido(ruta):
+    """True si el CSV tiene la cabecera exacta que exporta get_dataset.py"""
+    with open(ruta, 'r', encoding='utf-8') as f:
+        cabecera = f.readline().strip().split(',')
+    return cabecera[0] == COLUMNA_TIEMPO and set(TIPOS_CSV) <= set(cabecera)
+
+
+def _ruta_cache(ruta_csv, clave):
+    directorio = os.path.join(os.path.dirname(os.path.abspath(ruta_csv)), DIRECTORIO_CACHE)
+    return directorio, os.path.join(directorio, f"{os.path.basename(ruta_csv)}.{clave}.npy")
+
+
+def calcular_sesion_ny(velas):
+    """Rellena hora/minuto/día de la semana en hora NY a partir de 'time' (segundos UTC)"""
+    ny = pd.DatetimeIndex(pd.to_datetime(velas['time'], unit='s')).tz_localize('UTC').tz_convert(TZ_NY)
+    velas['hora_ny'] = ny.hour
+    velas['minuto_ny'] = ny.minute
+    velas['dia_semana_ny'] = ny.dayofweek
+    return velas
+
+
+def _parsear_csv(ruta_csv, tamaño_bloque=TAMAÑO_BLOQUE):
+    """Lee el CSV por bloques con tipos explícitos; devuelve el array de caché"""
+    partes = []
+    lector = pd.read_csv(ruta_csv, usecols=[COLUMNA_TIEMPO, *TIPOS_CSV], dtype=TIPOS_CSV, chunksize=tamaño_bloque)
+    for bloque in lector:
+        parte = np.empty(len(bloque), dtype=DTYPE_CACHE)
+        tiempos = pd.to_datetime(bloque[COLUMNA_TIEMPO], format=FORMATO_FECHA)
+        parte['time'] = tiempos.to_numpy(dtype='datetime64[s]').astype(np.int64)
+        for columna in TIPOS_CSV:
+            parte[columna] = bloque[columna].to_numpy()
+
+        calcular_sesion_ny(parte)
+        partes.append(parte)
+    if not partes:
+        return np.empty(0, dtype=DTYPE_CACHE)
+    return np.concatenate(partes)
+
+
+def cargar_velas_csv(ruta_csv, usar_cache=True):
+    """
+    Velas del CSV como array estructurado DTYPE_CACHE.
+
+    Returns:
+        (velas, desde_cache)
+    """
+    if not usar_cache:
+        return _parsear_csv(ruta_csv), False
+
+    clave = hash_archivo(ruta_csv)
+    directorio, ruta = _ruta_cache(ruta_csv, clave)
+    if os.path.exists(ruta):
+        try:
+            velas = np.load(ruta, mmap_mode='r')
+            if velas.dtype == DTYPE_CACHE:
+                return velas, True
+        except (OSError, ValueError):
+            pass  # Caché dañada: se regenera
+
+    velas = _parsear_csv(ruta_csv)
+    os.makedirs(directorio, exist_ok=True)
+    # Quitar cachés de versiones anteriores del mismo CSV
+    prefijo = os.path.basename(ruta_csv) + "."
+    for nombre in os.listdir(directorio):
+        if nombre.startswith(prefijo) and nombre.endswith(".npy"):
+            os.remove(os.path.join(directorio, nombre))
+    temporal = ruta + ".tmp"
+    with open(temporal, 'wb') as f:
+        np.save(f, velas)
+    os.replace(temporal, ruta)
+    return velas, False
+
+
+def velas_a_dataframe(velas):
+    """DataFrame indexado en hora NY con las columnas de velas y de sesión"""
+    indice = pd.DatetimeIndex(pd.to_datetime(np.asarray(velas['time']), unit='s').astype('datetime64[ns]'))
+    indice = indice.tz_localize('UTC').tz_convert(TZ_NY)
+    indice.name = COLUMNA_TIEMPO
+    return pd.DataFrame(
+        {nombre: np.asarray(velas[nombre]) for nombre in DTYPE_CACHE.names if nombre != 'time'},
+        index=indice,
+    )
@@ -1,6 +1,13 @@
+import os
+import sys
 import pandas as pd
-import MetaTrader5 as mt5
 from datetime import datetime
+from almacen import almacen
+
+# Módulos de la raíz del proyecto (proxy instrumentado de MT5 compartido con el bot)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import instrumentacion_mt5
+from instrumentacion_mt5 import mt5
 
 def conectar_mt5(servidor, numero_cuenta, contraseña):
     """Conecta a una cuenta MT5 específica"""
@@ -15,10 +22,21 @@ def conectar_mt5(servidor, numero_cuenta, contraseña):
         return False
     return True
 
-def obtener_datos_eurusd_4h():
+# Temporalidades con el mismo nombre que usa el bot
+TIMEFRAMES_MT5 = {
+    '1min': mt5.TIMEFRAME_M1,
+    '5min': mt5.TIMEFRAME_M5,
+    '15min': mt5.TIMEFRAME_M15,
+    '30min': mt5.TIMEFRAME_M30,
+    '1hour': mt5.TIMEFRAME_H1,
+    '4hour': mt5.TIMEFRAME_H4,
+    '1day': mt5.TIMEFRAME_D1,
+}
+
+def descargar_velas(simbolo="EURUSD", temporalidad="4hour", fecha_inicio=datetime(2006, 1, 1)):
     """
-    Obtiene datos OHLCV de EURUSD en temporalidad 4H desde 2006
-    y los exporta a un archivo CSV
+    Descarga las velas cerradas de un símbolo al almacén local (backtest/datos).
+    Si ya hay datos guardados solo se piden las velas posteriores a la última.
     """
     
     print("🔄 Inicializando MetaTrader 5...")
@@ -27,59 +45,37 @@ def obtener_datos_eurusd_4h():
         return
     
     try:
-        # Definir símbolo y temporalidad
-        simbolo = "EURUSD"
-        timeframe = mt5.TIMEFRAME_H4
+        timeframe = TIMEFRAMES_MT5[temporalidad]
         
-        # Fecha de inicio: 1 de enero de 2006
-        fecha_inicio = datetime(2006, 1, 1)
+        # Continuar desde la última vela guardada
+        ultimo = almacen.ultimo_tiempo(simbolo, temporalidad)
+        if ultimo is not None:
+            fecha_inicio = datetime.utcfromtimestamp(ultimo + 1)
         fecha_fin = datetime.now()
         
-        print(f"📊 Solicitando datos de {simbolo} desde {fecha_inicio.date()} hasta {fecha_fin.date()}")
-        print(f"⏰ Temporalidad: 4 horas")
+        print(f"📊 Solicitando datos de {simbolo} desde {fecha_inicio} hasta {fecha_fin.date()}")
+        print(f"⏰ Temporalidad: {temporalidad}")
         
         # Obtener datos históricos
         rates = mt5.copy_rates_range(simbolo, timeframe, fecha_inicio, fecha_fin)
         
         if rates is None or len(rates) == 0:
-            print("❌ No se pudieron obtener datos")
-            mt5.shutdown()
+            print("ℹ️  Sin velas nuevas")
             return
         
-        # Crear DataFrame
-        df = pd.DataFrame(rates)
-        
-        # Convertir tiempo a datetime
-        df['time'] = pd.to_datetime(df['time'], unit='s')
-        
-        # Seleccionar y renombrar columnas OHLCV
-        df = df[['time', 'open', 'high', 'low', 'close', 'tick_volume']]
-        df.columns = ['datetime', 'open', 'high', 'low', 'close', 'volume']
-        
-        # Establecer datetime como índice
-        df.set_index('datetime', inplace=True)
-        
-        # Ordenar cronológicamente
-        df.sort_index(inplace=True)
+        # La última vela sigue en formación
+        rates = rates[:-1]
+        nuevas = almacen.anexar(simbolo, temporalidad, rates)
         
         # Mostrar información del dataset
-        print(f"\n✅ Datos obtenidos exitosamente:")
-        print(f"   Registros: {len(df):,}")
-        print(f"   Desde: {df.index[0]}")
-        print(f"   Hasta: {df.index[-1]}")
-        print(f"   Columnas: {', '.join(df.columns)}")
-        
-        # Mostrar muestra de los datos
-        print("\n📋 Primeros 5 registros:")
-        print(df.head())
-        print("\n📋 Últimos 5 registros:")
-        print(df.tail())
-        
-        # Exportar a CSV
-        nombre_archivo = f"EURUSD_4H_{df.index[0].strftime('%Y%m%d')}_to_{df.index[-1].strftime('%Y%m%d')}.csv"
-        df.to_csv(nombre_archivo, float_format='%.5f')
-        print(f"\n💾 Datos exportados a: {nombre_archivo}")
-        print(f"   Tamaño del archivo: {len(df):,} registros")
+        print(f"\n✅ Datos guardados en el almacén:")
+        print(f"   Velas nuevas: {nuevas:,}")
+        if nuevas:
+            print(f"   Desde: {pd.to_datetime(int(rates['time'][-nuevas]), unit='s')}")
+            print(f"   Hasta: {pd.to_datetime(int(rates['time'][-1]), unit='s')}")
+        for fila in almacen.resumen():
+            if fila['simbolo'] == simbolo.upper() and fila['temporalidad'] == temporalidad:
+                print(f"   Total: {fila['velas']:,} velas ({fila['desde']} - {fila['hasta']})")
         
     except Exception as e:
         print(f"❌ Error durante la obtención de datos: {str(e)}")
@@ -88,6 +84,15 @@ def obtener_datos_eurusd_4h():
         # Cerrar conexión
         mt5.shutdown()
         print("\n🔌 Conexión con MT5 cerrada")
+        instrumentacion_mt5.cerrar_ciclo(f"descarga {simbolo} {temporalidad}")
+        instrumentacion_mt5.mostrar_estadisticas()
+
+def obtener_datos_eurusd_4h():
+    """
+    Obtiene datos OHLCV de EURUSD en temporalidad 4H desde 2006
+    y los guarda en el almacén local
+    """
+    descargar_velas("EURUSD", "4hour", datetime(2006, 1, 1))
 
 if __name__ == "__main__":
     obtener_datos_eurusd_4h()
\ No newline at end of file
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+REPLAY MULTI-TEMPORALIDAD DE LA ESTRATEGIA EN VIVO (DIRECCIÓN 1H + ENTRADAS 5M)
+Reproduce verificar_direccion + buscar_entradas + los filtros de bot.py sobre el histórico
+con los mismos núcleos de patrones.py, sin MT5 y sin mirar velas futuras.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from almacen import almacen
+
+# Los núcleos de la estrategia viven en la raíz del proyecto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from patrones import (
+    mascaras_direccion, escanear_patrones, calcular_stops, parametros_stops,
+    NOMBRES_PATRON, SIN_DIRECCION, LONG, SHORT,
+)
+
+TZ_NY = 'America/New_York'
+
+# Mismo formato que los rates de MT5
+DTYPE_RATES = np.dtype([
+    ('time', np.int64),
+    ('open', np.float64),
+    ('high', np.float64),
+    ('low', np.float64),
+    ('close', np.float64),
+])
+
+
+def cargar_rates_almacen(simbolo, temporalidad, desde=None, hasta=None, desfase_servidor=0):
+    """Rates del almacén local en el formato del replay (time en UTC)"""
+    columnas = almacen.leer(simbolo, temporalidad, desde, hasta, columnas=['time', 'open', 'high', 'low', 'close'])
+    rates = np.empty(len(columnas['time']), dtype=DTYPE_RATES)
+    for campo in DTYPE_RATES.names:
+        rates[campo] = columnas[campo]
+    rates['time'] -= desfase_servidor
+    return rates
+
+
+def duracion_vela(tiempos):
+    """Duración de vela (segundos) deducida del menor salto entre velas consecutivas"""
+    saltos = np.diff(np.asarray(tiempos, dtype=np.int64))
+    saltos = saltos[saltos > 0]
+    return int(saltos.min()) if len(saltos) else 0
+
+
+def direccion_por_vela(rates):
+    """
+    Dirección vigente tras el cierre de cada vela (orden cronológico).
+    Equivale a alimentar SeguidorDireccion vela a vela: la última ruptura manda.
+    """
+    n = len(rates)
+    direccion = np.zeros(n, dtype=np.int8)
+    if n < 3:
+        return direccion
+
+    invertido = rates[::-1]
+    alcista, bajista = mascaras_direccion(invertido['open'], invertido['high'], invertido['low'], invertido['close'])
+    codigo = np.zeros(n, dtype=np.int8)
+    codigo[2:] = np.where(alcista, LONG, np.where(bajista, SHORT, SIN_DIRECCION))[::-1]
+
+    # Propagar hacia delante el último código distinto de cero
+    ultima = np.where(codigo != SIN_DIRECCION, np.arange(n), 0)
+    np.maximum.accumulate(ultima, out=ultima)
+    direccion = codigo[ultima]
+    return direccion
+
+
+def indice_padre(cierres_hijo, cierres_padre):
+    """
+    Para cada vela hija, índice de la última vela padre ya cerrada en su cierre (-1 si ninguna).
+    Una vela padre que cierra a la vez que la hija cuenta (dirección antes que precisión, como en bot.py).
+    """
+    return np.searchsorted(cierres_padre, cierres_hijo, side='right') - 1
+
+
+class ReplayEstrategia:
+    """
+    Replay de la estrategia en vivo sobre arrays de rates (time UTC en segundos, open, high, low, close).
+    datos: {par: (rates_direccion, rates_precision)} en orden cronológico.
+    """
+
+    def __init__(self, datos, temporalidad_direccion='1hour', temporalidad_precision='5min',
+                 ratio_2velas=3, ratio_1vela=2, max_pips_sl=10,
+                 hora_inicio=0, hora_fin=24, max_operaciones_diarias=1):
+        self.datos = datos
+        self.temporalidad_direccion = temporalidad_direccion
+        self.temporalidad_precision = temporalidad_precision
+        self.ratio_2velas = ratio_2velas
+        self.ratio_1vela = ratio_1vela
+        self.max_pips_sl = max_pips_sl
+        self.hora_inicio = hora_inicio
+        self.hora_fin = hora_fin
+        self.max_operaciones_diarias = max_operaciones_diarias
+
+        self.eventos = []
+        self.estadisticas = {}
+
+    @classmethod
+    def desde_config(cls, datos):
+        """Replay con los parámetros de config.py"""
+        import config
+        return cls(
+            datos,
+            temporalidad_direccion=config.temporalidad_direccion,
+            temporalidad_precision=config.temporalidad_precision,
+            ratio_2velas=config.RATIO_2VELAS,
+            ratio_1vela=config.RATIO_1VELA,
+            max_pips_sl=config.MAX_PIPS_SL,
+            hora_inicio=config.hora_inicio,
+            hora_fin=config.hora_fin,
+            max_operaciones_diarias=config.MAX_OPERACIONES_DIARIAS,
+        )
+
+    @staticmethod
+    def candidatas_par(rates_direccion, rates_precision):
+        """
+        Velas de precisión con patrón a favor de la dirección vigente (no dependen de SL/ratios/horario).
+
+        Returns:
+            dict de arrays: posicion, cierre, codigo, entrada, extremo (mínimo/máximo de las 3 velas)
+        """
+        cierres_direccion = rates_direccion['time'] + duracion_vela(rates_direccion['time'])
+        cierres_precision = rates_precision['time'] + duracion_vela(rates_precision['time'])
+
+        # Dirección vigente en el cierre de cada vela de 5m (sin mirar la vela 1h en formación)
+        direccion_1h = direccion_por_vela(rates_direccion)
+        padre = indice_padre(cierres_precision, cierres_direccion)
+        direccion = np.where(padre >= 0, direccion_1h[np.maximum(padre, 0)], SIN_DIRECCION)
+
+        codigo = escanear_patrones(rates_precision['open'], rates_precision['high'],
+                                   rates_precision['low'], rates_precision['close'])
+        # buscar_entradas exige al menos 4 velas cerradas
+        codigo[:3] = 0
+        valida = ((codigo > 0) & (direccion == LONG)) | ((codigo < 0) & (direccion == SHORT))
+        posiciones = np.flatnonzero(valida)
+
+        codigo = codigo[posiciones]
+        ventanas = posiciones[:, None] - np.arange(3)
+        extremo = np.where(codigo > 0,
+                           rates_precision['low'][ventanas].min(axis=1),
+                           rates_precision['high'][ventanas].max(axis=1))
+        return {
+            'posicion': posiciones,
+            'cierre': cierres_precision[posiciones],
+            'codigo': codigo,
+            'entrada': rates_precision['close'][posiciones],
+            'extremo': extremo,
+        }
+
+    def _señales_par(self, par, rates_direccion, rates_precision):
+        """Señales de un par en todas las velas de precisión (arrays alineados a rates_precision)"""
+        candidatas = self.candidatas_par(rates_direccion, rates_precision)
+        codigo = candidatas['codigo']
+        ratio = np.where(np.abs(codigo) == 2, self.ratio_2velas, self.ratio_1vela)
+        es_forex, multiplicador, limite_forex = parametros_stops(par)
+        stops = calcular_stops(candidatas['entrada'], candidatas['extremo'], codigo > 0, ratio, es_forex,
+                               multiplicador, self.max_pips_sl, limite_forex=limite_forex)
+        return candidatas['posicion'], candidatas['cierre'], codigo, candidatas['entrada'], ratio, stops
+
+    def ejecutar(self):
+        """
+        Recorre todos los cierres de precisión con señal, en orden, y aplica el horario
+        y el máximo de operaciones diarias como bot.ejecutar_tareas_segun_hora.
+
+        Returns:
+            lista de eventos {'hora', 'señales', 'ejecutada'}
+        """
+        inicio = time.perf_counter()
+        señales_por_cierre = {}
+        velas = 0
+        for par, (rates_direccion, rates_precision) in self.datos.items():
+            velas += len(rates_precision)
+            posiciones, cierres, codigo, entrada, ratio, stops = self._señales_par(par, rates_direccion, rates_precision)
+            for k in range(len(posiciones)):
+                tipo = NOMBRES_PATRON[int(codigo[k])]
+                señales_por_cierre.setdefault(int(cierres[k]), []).append({
+                    'par': par,
+                    'tipo': tipo,
+                    'temporalidad': self.temporalidad_precision,
+                    'entrada': float(entrada[k]),
+                    'sl': float(stops['sl'][k]),
+                    'tp': float(stops['tp'][k]),
+                    'pips_sl': self.max_pips_sl if bool(stops['tope_pips'][k]) else float(stops['pips_sl'][k]),
+                    'ratio': self.ratio_2velas if abs(codigo[k]) == 2 else self.ratio_1vela,
+                })
+
+        cierres = np.array(sorted(señales_por_cierre), dtype=np.int64)
+        horas_ny = pd.to_datetime(cierres, unit='s', utc=True).tz_convert(TZ_NY)
+
+        self.eventos = []
+        operaciones_dia = 0
+        ultimo_dia = None
+        for cierre, hora in zip(cierres.tolist(), horas_ny):
+            if ultimo_dia != hora.date():
+                ultimo_dia = hora.date()
+                operaciones_dia = 0
+            ejecutada = self.hora_inicio <= hora.hour < self.hora_fin and operaciones_dia < self.max_operaciones_diarias
+            if ejecutada:
+                operaciones_dia += 1
+            self.eventos.append({'hora': hora, 'señales': señales_por_cierre[cierre], 'ejecutada': ejecutada})
+
+        duracion = time.perf_counter() - inicio
+        self.estadisticas = {
+            'velas_precision': velas,
+            'cierres_con_señal': len(self.eventos),
+            'señales': sum(len(evento['señales']) for evento in self.eventos),
+            'ejecutadas': sum(1 for evento in self.eventos if evento['ejecutada']),
+            'segundos': round(duracion, 3),
+            'velas_por_segundo': round(velas / duracion) if duracion > 0 else 0,
+        }
+        return self.eventos
+
+    def señales_ejecutadas(self):
+        """Señales que el bot habría enviado a las cuentas"""
+        return [señal for evento in self.eventos if evento['ejecutada'] for señal in evento['señales']]
+
+    def mostrar_resumen(self):
+        print("\n" + "=" * 80)
+        print(f"REPLAY ESTRATEGIA - DIRECCIÓN {self.temporalidad_direccion} + ENTRADAS {self.temporalidad_precision}")
+        print("=" * 80)
+        for k, v in self.estadisticas.items():
+            print(f"{k}: {v}")
+        print("=" * 80)
+
+
+def main():
+    CONFIG = {
+        'par': 'EURUSD',
+        'temporalidad_direccion': '1hour',
+        'temporalidad_precision': '5min',
+        'desfase_servidor': 0,
+    }
+
+    print("🔄 Cargando datos...")
+    datos = {
+        CONFIG['par']: (
+            cargar_rates_almacen(CONFIG['par'], CONFIG['temporalidad_direccion'], desfase_servidor=CONFIG['desfase_servidor']),
+            cargar_rates_almacen(CONFIG['par'], CONFIG['temporalidad_precision'], desfase_servidor=CONFIG['desfase_servidor']),
+        )
+    }
+    replay = ReplayEstrategia(datos)
+    replay.ejecutar()
+    replay.mostrar_resumen()
+    for evento in replay.eventos[-5:]:
+        print(evento['hora'], evento['ejecutada'], evento['señales'])
+
+
+if __name__ == "__main__":
+    main()
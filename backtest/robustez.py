@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ROBUSTEZ DE RESULTADOS - MONTE CARLO / BOOTSTRAP SOBRE LA SECUENCIA DE TRADES
+Cada bloque de caminos se simula como una matriz (caminos x trades): curva de capital,
+drawdown máximo y racha de pérdidas salen de operaciones acumuladas por filas, sin bucles por trade.
+"""
+import os
+import time
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+METODOS = ('permutacion', 'bootstrap')
+# Caminos por bloque (acota la memoria: bloque x trades float64)
+TAMAÑO_BLOQUE = 1000
+PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+
+
+def metricas_caminos(pnl, capital_inicial):
+    """
+    Métricas por camino de una matriz de pnl (caminos x trades), como calcular_max_drawdown.
+
+    Returns:
+        (capital_final, drawdown_max_pct, racha_perdedora_max)
+    """
+    pnl = np.atleast_2d(pnl)
+    capital = capital_inicial + np.cumsum(pnl, axis=1)
+    maximo = np.maximum.accumulate(capital, axis=1)
+    drawdown = ((capital - maximo) / maximo * 100).min(axis=1)
+
+    # Racha: pérdidas acumuladas desde la última operación no perdedora
+    perdida = pnl < 0
+    acumulado = np.cumsum(perdida, axis=1)
+    base = np.maximum.accumulate(np.where(perdida, 0, acumulado), axis=1)
+    racha = (acumulado - base).max(axis=1)
+
+    return capital[:, -1], drawdown, racha
+
+
+def simular_bloque(pnl, capital_inicial, metodo, caminos, semilla):
+    """Simula un bloque de 'caminos' remuestreos de la secuencia de pnl"""
+    rng = np.random.default_rng(semilla)
+    pnl = np.asarray(pnl, dtype=np.float64)
+    n = len(pnl)
+    if metodo == 'permutacion':
+        # Misma muestra en otro orden: cambia el camino, no el resultado final
+        indices = rng.permuted(np.broadcast_to(np.arange(n), (caminos, n)), axis=1)
+    else:
+        # Muestreo con reemplazo: cambian el camino y el resultado final
+        indices = rng.integers(0, n, size=(caminos, n))
+    return metricas_caminos(pnl[indices], capital_inicial)
+
+
+class MonteCarloTrades:
+    """Distribuciones de capital final, drawdown máximo y racha perdedora remuestreando trades"""
+
+    def __init__(self, pnl, capital_inicial=10000, metodo='permutacion', simulaciones=10000,
+                 semilla=None, procesos=1, tamaño_bloque=TAMAÑO_BLOQUE):
+        if metodo not in METODOS:
+            raise ValueError(f"Método '{metodo}' no válido (usar {', '.join(METODOS)})")
+        self.pnl = np.asarray(pnl, dtype=np.float64)
+        self.capital_inicial = capital_inicial
+        self.metodo = metodo
+        self.simulaciones = simulaciones
+        self.semilla = semilla
+        self.procesos = procesos or os.cpu_count() or 1
+        self.tamaño_bloque = tamaño_bloque
+
+        self.capital_final = None
+        self.drawdown_max = None
+        self.racha_perdedora = None
+        self.segundos = 0.0
+
+    @classmethod
+    def desde_backtest(cls, backtest, **kwargs):
+        """Usa los trades y el capital inicial de un BacktestEURUSD ya ejecutado"""
+        return cls(backtest.trades['pnl'].to_numpy(), capital_inicial=backtest.capital_inicial, **kwargs)
+
+    def ejecutar(self):
+        inicio = time.perf_counter()
+        if len(self.pnl) == 0:
+            raise ValueError("No hay trades para simular")
+
+        # Una semilla por bloque: el resultado no depende del número de procesos
+        bloques = [self.tamaño_bloque] * (self.simulaciones // self.tamaño_bloque)
+        if self.simulaciones % self.tamaño_bloque:
+            bloques.append(self.simulaciones % self.tamaño_bloque)
+        semillas = np.random.SeedSequence(self.semilla).spawn(len(bloques))
+        argumentos = [(self.pnl, self.capital_inicial, self.metodo, caminos, semilla)
+                      for caminos, semilla in zip(bloques, semillas)]
+
+        if self.procesos <= 1 or len(bloques) == 1:
+            partes = [simular_bloque(*args) for args in argumentos]
+        else:
+            with ProcessPoolExecutor(max_workers=min(self.procesos, len(bloques)),
+                                     mp_context=mp.get_context('spawn')) as pool:
+                partes = list(pool.map(simular_bloque, *zip(*argumentos)))
+
+        self.capital_final = np.concatenate([p[0] for p in partes])
+        self.drawdown_max = np.concatenate([p[1] for p in partes])
+        self.racha_perdedora = np.concatenate([p[2] for p in partes])
+        self.segundos = time.perf_counter() - inicio
+        return self
+
+    def original(self):
+        """Métricas de la secuencia real de trades"""
+        final, drawdown, racha = metricas_caminos(self.pnl, self.capital_inicial)
+        return {'capital_final': float(final[0]), 'drawdown_max': float(drawdown[0]), 'racha_perdedora': int(racha[0])}
+
+    def resumen(self, percentiles=PERCENTILES):
+        """Percentiles de cada distribución y probabilidades de interés"""
+        if self.capital_final is None:
+            self.ejecutar()
+        distribuciones = {
+            'capital_final': self.capital_final,
+            'drawdown_max': self.drawdown_max,
+            'racha_perdedora': self.racha_perdedora,
+        }
+        resumen = {
+            nombre: {f"p{p}": float(v) for p, v in zip(percentiles, np.percentile(valores, percentiles))}
+            for nombre, valores in distribuciones.items()
+        }
+        for nombre, valores in distribuciones.items():
+            resumen[nombre]['media'] = float(valores.mean())
+        resumen['prob_perdida'] = float((self.capital_final < self.capital_inicial).mean() * 100)
+        resumen['original'] = self.original()
+        resumen['simulaciones'] = len(self.capital_final)
+        resumen['segundos'] = round(self.segundos, 3)
+        return resumen
+
+    def prob_drawdown_peor_que(self, umbral_pct):
+        """% de caminos con un drawdown máximo peor que umbral_pct (negativo, p. ej. -20)"""
+        return float((self.drawdown_max < umbral_pct).mean() * 100)
+
+    def mostrar_resumen(self):
+        resumen = self.resumen()
+        original = resumen['original']
+        print("\n" + "=" * 80)
+        print(f"ROBUSTEZ MONTE CARLO ({self.metodo}) - {resumen['simulaciones']:,} caminos x {len(self.pnl):,} trades"
+              f" en {resumen['segundos']:.2f}s")
+        print("=" * 80)
+        for nombre in ('capital_final', 'drawdown_max', 'racha_perdedora'):
+            valores = resumen[nombre]
+            percentiles = " | ".join(f"{k}: {v:,.2f}" for k, v in valores.items())
+            print(f"{nombre} (original {original[nombre]:,.2f}): {percentiles}")
+        print(f"Probabilidad de terminar en pérdida: {resumen['prob_perdida']:.2f}%")
+        print("=" * 80)
+
+
+def main():
+    from backtest import BacktestEURUSD
+
+    backtest = BacktestEURUSD(simbolo='EURUSD', temporalidad='4hour', filas_muestra=0)
+    if not backtest.ejecutar_backtest() or backtest.trades is None or len(backtest.trades) == 0:
+        print("❌ No hay trades para analizar")
+        return
+    for metodo in METODOS:
+        MonteCarloTrades.desde_backtest(backtest, metodo=metodo, simulaciones=10000, semilla=42).mostrar_resumen()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BENCHMARKS DEL BOT CON MetaTrader5 SIMULADO
+Mide los caminos críticos (velas, dirección, precisión, apertura de órdenes, ciclo completo del bot
+y backtest) con un terminal MT5 sintético y determinista, escalando el número de pares.
+Los resultados se guardan en JSON y se comparan con la ejecución anterior para detectar regresiones.
+"""
+import os
+import sys
+import json
+import glob
+import time
+import shutil
+import platform
+import tempfile
+import contextlib
+import statistics
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+RAIZ = os.path.dirname(DIRECTORIO)
+DIRECTORIO_RESULTADOS = os.path.join(DIRECTORIO, "resultados")
+DIVISAS = ("EUR", "USD", "GBP", "JPY", "CHF", "AUD", "CAD", "NZD")
+
+sys.path.insert(0, DIRECTORIO)
+import mt5_simulado
+
+
+def nombres_pares(n):
+    """n símbolos Forex distintos (con sufijo de broker cuando se agotan los cruces)"""
+    cruces = [base + cotizada for base in DIVISAS for cotizada in DIVISAS if base != cotizada]
+    return [cruces[i % len(cruces)] + (f".{i // len(cruces)}" if i >= len(cruces) else "") for i in range(n)]
+
+
+@contextlib.contextmanager
+def silencio():
+    """Descarta la salida por consola del bot mientras se mide"""
+    with open(os.devnull, 'w', encoding='utf-8') as nulo, contextlib.redirect_stdout(nulo):
+        yield
+
+
+def medir(funcion, repeticiones, preparar=None, calentar=True):
+    """
+    Ejecuta 'funcion' varias veces (preparar() antes de cada una, fuera del tiempo medido).
+    Returns:
+        dict con media, mediana, mínimo, máximo y desviación en ms
+    """
+    tiempos = []
+    with silencio():
+        if calentar:
+            if preparar:
+                preparar()
+            funcion()
+        for _ in range(repeticiones):
+            if preparar:
+                preparar()
+            inicio = time.perf_counter()
+            funcion()
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+    return {
+        'repeticiones': repeticiones,
+        'media_ms': round(statistics.fmean(tiempos), 4),
+        'mediana_ms': round(statistics.median(tiempos), 4),
+        'min_ms': round(min(tiempos), 4),
+        'max_ms': round(max(tiempos), 4),
+        'desviacion_ms': round(statistics.stdev(tiempos), 4) if len(tiempos) > 1 else 0.0,
+    }
+
+
+def generar_csv_velas(ruta, barras, semilla=42):
+    """CSV 1H sintético con el formato que exporta get_dataset.py"""
+    rng = np.random.default_rng(semilla)
+    cierre = 1.1 + np.cumsum(rng.normal(0, 0.0015, barras))
+    apertura = np.concatenate(([1.1], cierre[:-1]))
+    mechas = np.abs(rng.normal(0, 0.0008, (2, barras)))
+    pd.DataFrame({
+        'datetime': pd.date_range('1990-01-01', periods=barras, freq='h').strftime('%Y-%m-%d %H:%M:%S'),
+        'open': apertura,
+        'high': np.maximum(apertura, cierre) + mechas[0],
+        'low': np.minimum(apertura, cierre) - mechas[1],
+        'close': cierre,
+        'volume': rng.integers(100, 10000, barras),
+    }).to_csv(ruta, index=False, float_format='%.5f')
+
+
+class SuiteBenchmarks:
+    """Entorno aislado (directorio temporal + MT5 simulado) y benchmarks de cada camino crítico"""
+
+    def __init__(self, repeticiones=20, pares=(1, 10, 100), barras_backtest=(10_000, 100_000, 1_000_000),
+                 repeticiones_backtest=3):
+        self.repeticiones = repeticiones
+        self.pares = pares
+        self.barras_backtest = barras_backtest
+        self.repeticiones_backtest = repeticiones_backtest
+        self.resultados = {}
+        self.directorio_trabajo = None
+        self._directorio_original = os.getcwd()
+
+    # ---------------- Entorno ----------------
+
+    def preparar(self):
+        """Instala el MT5 simulado e importa el bot en un directorio temporal (estado y cachés aparte)"""
+        mt5_simulado.instalar()
+        self.directorio_trabajo = tempfile.mkdtemp(prefix="bench_ast_")
+        os.chdir(self.directorio_trabajo)
+        for ruta in (RAIZ, os.path.join(RAIZ, "backtest")):
+            if ruta not in sys.path:
+                sys.path.insert(0, ruta)
+
+        with silencio():
+            import config
+            import notificacion
+            import data_metatrader5
+            import cache_velas
+            import direccion
+            import precision
+            import bot
+            from backtest import BacktestEURUSD
+
+        # Sin envíos reales a Telegram
+        notificacion.notificador = None
+        with silencio():
+            bot.cargar_estado()
+        self.config = config
+        self.data_metatrader5 = data_metatrader5
+        self.cache_velas = cache_velas
+        self.direccion = direccion
+        self.precision = precision
+        self.bot = bot
+        self.BacktestEURUSD = BacktestEURUSD
+        self.cuenta = config.CUENTA_PRINCIPAL
+
+    def limpiar(self):
+        from persistencia import obtener_almacen
+        obtener_almacen().cerrar()
+        os.chdir(self._directorio_original)
+        shutil.rmtree(self.directorio_trabajo, ignore_errors=True)
+
+    def configurar_pares(self, n):
+        """Cambia los pares del bot en caliente (las listas y dicts de config son compartidos)"""
+        pares = nombres_pares(n)
+        self.config.PARES[:] = pares
+        self.config.direccion_global.clear()
+        self.config.direccion_global.update({par: None for par in pares})
+        self.direccion.seguidores.clear()
+        self.cache_velas.cache_velas.invalidar()
+        return pares
+
+    def registrar(self, nombre, resultado, **extra):
+        resultado.update(extra)
+        self.resultados[nombre] = resultado
+        print(f"   {nombre:<45} mediana {resultado['mediana_ms']:>10.3f} ms | "
+              f"min {resultado['min_ms']:>10.3f} ms | max {resultado['max_ms']:>10.3f} ms")
+
+    # ---------------- Benchmarks ----------------
+
+    def bench_velas(self):
+        cuenta = self.cuenta
+        for intervalo, barras in (('5min', 6), ('1hour', 50)):
+            self.registrar(f"obtener_velas_mt5[{intervalo} x{barras}]", medir(
+                lambda: self.data_metatrader5.obtener_velas_mt5(
+                    'EURUSD', intervalo, barras, cuenta['numero_cuenta'], cuenta['servidor'], cuenta['contraseña']),
+                self.repeticiones,
+                preparar=lambda: mt5_simulado.avanzar(300),
+            ))
+            self.registrar(f"obtener_velas_cache[{intervalo} x{barras}]", medir(
+                lambda: self.cache_velas.obtener_velas_cache(
+                    'EURUSD', intervalo, barras, cuenta['numero_cuenta'], cuenta['servidor'], cuenta['contraseña']),
+                self.repeticiones,
+                preparar=lambda: mt5_simulado.avanzar(300),
+            ))
+
+    def bench_direccion_precision(self, n):
+        self.configurar_pares(n)
+        temporalidad_direccion = self.config.temporalidad_direccion
+        temporalidad_precision = self.config.temporalidad_precision
+        self.registrar(f"verificar_direccion[pares={n}]", medir(
+            lambda: self.direccion.verificar_direccion(temporalidad_direccion),
+            self.repeticiones,
+            preparar=lambda: mt5_simulado.avanzar(3600),
+        ), etapas=dict(self.direccion.tiempos_etapas))
+        con_direccion = sum(1 for valor in self.config.direccion_global.values() if valor)
+        self.registrar(f"buscar_entradas[pares={n}]", medir(
+            lambda: self.precision.buscar_entradas(temporalidad_precision),
+            self.repeticiones,
+            preparar=lambda: mt5_simulado.avanzar(300),
+        ), pares_con_direccion=con_direccion, etapas=dict(self.precision.tiempos_etapas))
+
+    def bench_apertura(self):
+        cuenta = self.cuenta
+
+        def abrir(rapida):
+            tick = mt5_simulado.symbol_info_tick('EURUSD')
+            return self.data_metatrader5.abrir_operacion_mercado(
+                servidor=cuenta['servidor'], numero_cuenta=cuenta['numero_cuenta'], contraseña=cuenta['contraseña'],
+                simbolo='EURUSD', balance_cuenta=cuenta.get('balance', 10000),
+                precio_sl=tick.ask - 0.0010, precio_tp=tick.ask + 0.0020,
+                tipo_operacion='COMPRA', porcentaje_riesgo=1.0, max_reintentos=1, rapida=rapida,
+            )
+
+        self.registrar("abrir_operacion_mercado", medir(lambda: abrir(False), self.repeticiones))
+        self.registrar("abrir_operacion_mercado[rapida]", medir(lambda: abrir(True), self.repeticiones))
+
+    def bench_ciclo(self, n):
+        """Ciclo completo al cierre de vela: dirección + precisión + ejecución (modo REAL simulado)"""
+        self.configurar_pares(n)
+        bot = self.bot
+        temporalidades = [self.config.temporalidad_direccion, self.config.temporalidad_precision]
+        bot.MODO_OPERACION = 'REAL'
+        ejecuciones = []
+
+        def preparar():
+            mt5_simulado.avanzar(300)
+            bot.CANT_OPERACIONES = 0
+            bot.ULTIMA_SEÑAL_ID = None
+            ejecuciones.append(mt5_simulado.simulador.llamadas.get('order_send', 0))
+
+        def ciclo():
+            bot.ejecutar_tareas_segun_hora(datetime.now(), temporalidades)
+
+        resultado = medir(ciclo, self.repeticiones, preparar=preparar)
+        ordenes = mt5_simulado.simulador.llamadas.get('order_send', 0) - ejecuciones[0]
+        self.registrar(f"ejecutar_tareas_segun_hora[pares={n}]", resultado, ordenes_enviadas=ordenes)
+
+    def bench_backtest(self, barras):
+        ruta = os.path.join(self.directorio_trabajo, f"SINTETICO_1H_{barras}.csv")
+        generar_csv_velas(ruta, barras)
+
+        def ejecutar():
+            backtest = self.BacktestEURUSD(csv_path=ruta, filas_muestra=0)
+            backtest.ejecutar_backtest()
+            return backtest
+
+        # Primera carga: parseo del CSV y creación de la caché binaria
+        self.registrar(f"backtest[{barras} velas, csv]", medir(ejecutar, 1, calentar=False))
+        with silencio():
+            trades = len(ejecutar().trades)
+        self.registrar(f"backtest[{barras} velas]", medir(ejecutar, self.repeticiones_backtest, calentar=False),
+                       trades=trades)
+
+    def ejecutar(self):
+        self.preparar()
+        try:
+            print("\n📈 Velas")
+            self.bench_velas()
+            print("\n🧭 Dirección y precisión")
+            for n in self.pares:
+                self.bench_direccion_precision(n)
+            print("\n💼 Órdenes")
+            self.bench_apertura()
+            print("\n🔁 Ciclo completo del bot")
+            for n in self.pares:
+                self.bench_ciclo(n)
+            print("\n🧪 Backtest")
+            for barras in self.barras_backtest:
+                self.bench_backtest(barras)
+        finally:
+            self.limpiar()
+        return self.resultados
+
+
+# ---------------- Resultados ----------------
+
+def info_maquina():
+    return {
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'procesador': platform.processor() or platform.machine(),
+        'nucleos': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+    }
+
+
+def ultimo_resultado(directorio=DIRECTORIO_RESULTADOS):
+    archivos = sorted(glob.glob(os.path.join(directorio, "benchmark_*.json")))
+    return archivos[-1] if archivos else None
+
+
+def guardar_resultados(resultados, config, directorio=DIRECTORIO_RESULTADOS):
+    os.makedirs(directorio, exist_ok=True)
+    fecha = datetime.now()
+    ruta = os.path.join(directorio, f"benchmark_{fecha.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump({
+            'fecha': fecha.isoformat(timespec='seconds'),
+            'maquina': info_maquina(),
+            'config': config,
+            'resultados': resultados,
+            'llamadas_mt5': dict(mt5_simulado.simulador.llamadas),
+        }, f, ensure_ascii=False, indent=2)
+    return ruta
+
+
+def comparar(resultados, ruta_anterior, umbral_pct=10.0):
+    """Compara medianas con una ejecución anterior; devuelve los benchmarks que empeoran más que el umbral"""
+    with open(ruta_anterior, 'r', encoding='utf-8') as f:
+        anteriores = json.load(f)['resultados']
+    regresiones = []
+    print(f"\n📊 Comparación con {os.path.basename(ruta_anterior)} (umbral {umbral_pct:g}%)")
+    for nombre, actual in resultados.items():
+        previo = anteriores.get(nombre)
+        if previo is None or not previo['mediana_ms']:
+            continue
+        cambio = (actual['mediana_ms'] / previo['mediana_ms'] - 1) * 100
+        marca = "🔴" if cambio > umbral_pct else ("🟢" if cambio < -umbral_pct else "⚪")
+        print(f"   {marca} {nombre:<45} {previo['mediana_ms']:>10.3f} → {actual['mediana_ms']:>10.3f} ms ({cambio:+.1f}%)")
+        if cambio > umbral_pct:
+            regresiones.append(nombre)
+    return regresiones
+
+
+def main():
+    CONFIG = {
+        'repeticiones': 20,
+        'pares': [1, 10, 100],
+        'barras_backtest': [10_000, 100_000, 1_000_000],
+        'repeticiones_backtest': 3,
+        'comparar_con': None,  # Ruta a un JSON anterior (None = el último guardado)
+        'umbral_regresion_pct': 10.0,
+    }
+
+    print("=" * 80)
+    print("BENCHMARKS - MT5 SIMULADO")
+    print("=" * 80)
+
+    anterior = CONFIG['comparar_con'] or ultimo_resultado()
+    suite = SuiteBenchmarks(
+        repeticiones=CONFIG['repeticiones'],
+        pares=CONFIG['pares'],
+        barras_backtest=CONFIG['barras_backtest'],
+        repeticiones_backtest=CONFIG['repeticiones_backtest'],
+    )
+    resultados = suite.ejecutar()
+    ruta = guardar_resultados(resultados, CONFIG)
+    print(f"\n💾 Resultados guardados en {ruta}")
+
+    if anterior:
+        regresiones = comparar(resultados, anterior, CONFIG['umbral_regresion_pct'])
+        if regresiones:
+            print(f"\n⚠️  {len(regresiones)} regresión(es): {', '.join(regresiones)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
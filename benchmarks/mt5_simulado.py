@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SUSTITUTO LOCAL DEL PAQUETE MetaTrader5 PARA BENCHMARKS
+Sirve velas, ticks y resultados de órdenes sintéticos y deterministas (misma semilla por símbolo
+y temporalidad) para poder medir el bot en cualquier sistema operativo.
+Uso: llamar a instalar() antes de importar cualquier módulo del bot.
+"""
+import sys
+import time
+import zlib
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np
+
+# ---------------- Constantes (mismos valores que el paquete real) ----------------
+
+TIMEFRAME_M1 = 1
+TIMEFRAME_M5 = 5
+TIMEFRAME_M15 = 15
+TIMEFRAME_M30 = 30
+TIMEFRAME_H1 = 16385
+TIMEFRAME_H4 = 16388
+TIMEFRAME_D1 = 16408
+TIMEFRAME_W1 = 32769
+TIMEFRAME_MN1 = 49153
+
+ORDER_TYPE_BUY = 0
+ORDER_TYPE_SELL = 1
+TRADE_ACTION_DEAL = 1
+ORDER_TIME_GTC = 0
+ORDER_FILLING_FOK = 0
+ORDER_FILLING_IOC = 1
+ORDER_FILLING_RETURN = 2
+TRADE_RETCODE_DONE = 10009
+
+DEAL_TYPE_BUY = 0
+DEAL_TYPE_SELL = 1
+DEAL_ENTRY_IN = 0
+DEAL_ENTRY_OUT = 1
+DEAL_ENTRY_INOUT = 2
+DEAL_ENTRY_OUT_BY = 3
+DEAL_REASON_CLIENT = 0
+DEAL_REASON_EXPERT = 3
+DEAL_REASON_SL = 4
+DEAL_REASON_TP = 5
+
+SEGUNDOS_TIMEFRAME = {
+    TIMEFRAME_M1: 60,
+    TIMEFRAME_M5: 300,
+    TIMEFRAME_M15: 900,
+    TIMEFRAME_M30: 1800,
+    TIMEFRAME_H1: 3600,
+    TIMEFRAME_H4: 14400,
+    TIMEFRAME_D1: 86400,
+    TIMEFRAME_W1: 604800,
+    TIMEFRAME_MN1: 2592000,
+}
+
+DTYPE_RATES = np.dtype([
+    ('time', '<i8'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('tick_volume', '<u8'),
+    ('spread', '<i4'),
+    ('real_volume', '<u8'),
+])
+
+# Velas generadas por (símbolo, temporalidad) antes y después del instante inicial
+HISTORIA = 5000
+MARGEN_FUTURO = 5000
+SPREAD_PUNTOS = 10
+
+TerminalInfo = namedtuple('TerminalInfo', 'connected trade_allowed name path')
+AccountInfo = namedtuple('AccountInfo', 'login name server balance equity margin margin_free margin_level '
+                                        'leverage currency profit')
+SymbolInfo = namedtuple('SymbolInfo', 'name visible digits point trade_tick_size volume_min volume_max volume_step '
+                                      'trade_contract_size trade_tick_value trade_stops_level trade_calc_mode spread '
+                                      'filling_mode')
+Tick = namedtuple('Tick', 'time bid ask last volume time_msc')
+OrderCheckResult = namedtuple('OrderCheckResult', 'retcode balance equity margin margin_free comment request')
+OrderSendResult = namedtuple('OrderSendResult', 'retcode deal order volume price bid ask comment request_id request')
+
+
+class _Simulador:
+    """Estado del terminal simulado: reloj propio, series por símbolo y contadores de llamadas"""
+
+    def __init__(self):
+        self.reiniciar()
+
+    def reiniciar(self, ahora=None, balance=10000.0, latencia=0.0):
+        self.ahora = int(ahora if ahora is not None else time.time())
+        self.inicio = self.ahora
+        self.balance = balance
+        self.latencia = latencia  # Segundos añadidos a cada llamada (simula el IPC con el terminal)
+        self.cuenta = None
+        self.series = {}
+        self.ticket = 100000
+        self.llamadas = {}
+        self.error = (1, 'Success')
+
+    def contar(self, nombre):
+        self.llamadas[nombre] = self.llamadas.get(nombre, 0) + 1
+        if self.latencia:
+            time.sleep(self.latencia)
+
+    def serie(self, simbolo, timeframe):
+        """Velas completas del símbolo (alineadas a la duración de la temporalidad)"""
+        clave = (simbolo, timeframe)
+        serie = self.series.get(clave)
+        if serie is None:
+            duracion = SEGUNDOS_TIMEFRAME[timeframe]
+            rng = np.random.default_rng(zlib.crc32(f"{simbolo}|{timeframe}".encode()))
+            n = HISTORIA + MARGEN_FUTURO
+            base = precio_base(simbolo)
+            volatilidad = base * 0.0004 * np.sqrt(duracion / 300)
+            cierre = base + np.cumsum(rng.normal(0, volatilidad, n))
+            apertura = np.concatenate(([base], cierre[:-1]))
+            mechas = np.abs(rng.normal(0, volatilidad / 2, (2, n)))
+
+            serie = np.zeros(n, dtype=DTYPE_RATES)
+            origen = (self.inicio // duracion - HISTORIA + 1) * duracion
+            serie['time'] = origen + np.arange(n, dtype=np.int64) * duracion
+            serie['open'] = apertura
+            serie['close'] = cierre
+            serie['high'] = np.maximum(apertura, cierre) + mechas[0]
+            serie['low'] = np.minimum(apertura, cierre) - mechas[1]
+            serie['tick_volume'] = rng.integers(50, 5000, n)
+            serie['spread'] = SPREAD_PUNTOS
+            self.series[clave] = serie
+        return serie
+
+    def indice_actual(self, simbolo, timeframe):
+        """Posición de la vela en formación según el reloj simulado"""
+        serie = self.serie(simbolo, timeframe)
+        duracion = SEGUNDOS_TIMEFRAME[timeframe]
+        indice = int((self.ahora - serie['time'][0]) // duracion)
+        return min(indice, len(serie) - 1)
+
+    def siguiente_ticket(self):
+        self.ticket += 1
+        return self.ticket
+
+
+simulador = _Simulador()
+
+
+def precio_base(simbolo):
+    simbolo = simbolo.upper()
+    if "JPY" in simbolo:
+        return 150.0
+    if "XAU" in simbolo:
+        return 2000.0
+    return 1.1
+
+
+def _segundos(fecha):
+    if isinstance(fecha, datetime):
+        return int(fecha.timestamp()) if fecha.tzinfo else int((fecha - datetime(1970, 1, 1)).total_seconds())
+    return int(fecha)
+
+
+# ---------------- API del terminal ----------------
+
+def initialize(path=None, **kwargs):
+    simulador.contar('initialize')
+    return True
+
+
+def login(login, password=None, server=None, timeout=None):
+    simulador.contar('login')
+    simulador.cuenta = (login, server)
+    return True
+
+
+def shutdown():
+    simulador.contar('shutdown')
+    simulador.cuenta = None
+    return True
+
+
+def last_error():
+    return simulador.error
+
+
+def terminal_info():
+    simulador.contar('terminal_info')
+    return TerminalInfo(connected=True, trade_allowed=True, name='Simulado', path='')
+
+
+def account_info():
+    simulador.contar('account_info')
+    if simulador.cuenta is None:
+        return None
+    numero, servidor = simulador.cuenta
+    balance = simulador.balance
+    return AccountInfo(login=numero, name='Benchmark', server=servidor, balance=balance, equity=balance,
+                       margin=0.0, margin_free=balance, margin_level=0.0, leverage=100, currency='USD', profit=0.0)
+
+
+def symbol_info(simbolo):
+    simulador.contar('symbol_info')
+    digitos = 3 if "JPY" in simbolo.upper() else 5
+    punto = 10 ** -digitos
+    return SymbolInfo(name=simbolo, visible=True, digits=digitos, point=punto, trade_tick_size=punto,
+                      volume_min=0.01, volume_max=100.0, volume_step=0.01, trade_contract_size=100000.0,
+                      trade_tick_value=punto * 100000.0 / precio_base(simbolo) if "JPY" in simbolo.upper()
+                      else punto * 100000.0, trade_stops_level=0, trade_calc_mode=0,
+                      spread=SPREAD_PUNTOS, filling_mode=1 | 2)
+
+
+def symbol_select(simbolo, habilitar=True):
+    simulador.contar('symbol_select')
+    return True
+
+
+def symbol_info_tick(simbolo):
+    simulador.contar('symbol_info_tick')
+    # Precio de apertura de la vela M5 en formación (= cierre de la última cerrada)
+    serie = simulador.serie(simbolo, TIMEFRAME_M5)
+    bid = float(serie['open'][simulador.indice_actual(simbolo, TIMEFRAME_M5)])
+    ask = bid + SPREAD_PUNTOS * (0.001 if "JPY" in simbolo.upper() else 0.00001)
+    return Tick(time=simulador.ahora, bid=bid, ask=ask, last=bid, volume=0, time_msc=simulador.ahora * 1000)
+
+
+def copy_rates_from_pos(simbolo, timeframe, inicio, cantidad):
+    """Las 'cantidad' velas que terminan 'inicio' posiciones antes de la vela en formación"""
+    simulador.contar('copy_rates_from_pos')
+    serie = simulador.serie(simbolo, timeframe)
+    fin = simulador.indice_actual(simbolo, timeframe) - inicio + 1
+    if fin <= 0:
+        return None
+    return serie[max(0, fin - cantidad):fin].copy()
+
+
+def copy_rates_from(simbolo, timeframe, desde, cantidad):
+    simulador.contar('copy_rates_from')
+    serie = simulador.serie(simbolo, timeframe)
+    fin = min(int(np.searchsorted(serie['time'], _segundos(desde), side='right')),
+              simulador.indice_actual(simbolo, timeframe) + 1)
+    return serie[max(0, fin - cantidad):fin].copy()
+
+
+def copy_rates_range(simbolo, timeframe, desde, hasta):
+    simulador.contar('copy_rates_range')
+    serie = simulador.serie(simbolo, timeframe)
+    tiempos = serie['time']
+    inicio = int(np.searchsorted(tiempos, _segundos(desde), side='left'))
+    fin = min(int(np.searchsorted(tiempos, _segundos(hasta), side='right')),
+              simulador.indice_actual(simbolo, timeframe) + 1)
+    return serie[inicio:fin].copy()
+
+
+def positions_get(**kwargs):
+    """Las órdenes simuladas se ejecutan pero no dejan posiciones abiertas"""
+    simulador.contar('positions_get')
+    return ()
+
+
+def positions_total():
+    return 0
+
+
+def history_deals_get(*args, **kwargs):
+    simulador.contar('history_deals_get')
+    return ()
+
+
+def order_check(request):
+    simulador.contar('order_check')
+    balance = simulador.balance
+    return OrderCheckResult(retcode=0, balance=balance, equity=balance, margin=0.0, margin_free=balance,
+                            comment='Done', request=request)
+
+
+def order_send(request):
+    simulador.contar('order_send')
+    ticket = simulador.siguiente_ticket()
+    tick = symbol_info_tick(request['symbol'])
+    return OrderSendResult(retcode=TRADE_RETCODE_DONE, deal=ticket, order=ticket, volume=request['volume'],
+                           price=request.get('price', tick.ask), bid=tick.bid, ask=tick.ask,
+                           comment='Request executed', request_id=ticket, request=request)
+
+
+# ---------------- Control del simulador ----------------
+
+def avanzar(segundos):
+    """Adelanta el reloj simulado (nuevas velas pasan a estar disponibles)"""
+    simulador.ahora += int(segundos)
+
+
+def instalar(**kwargs):
+    """Registra este módulo como 'MetaTrader5' (antes de importar los módulos del bot)"""
+    simulador.reiniciar(**kwargs)
+    sys.modules['MetaTrader5'] = sys.modules[__name__]
+    return sys.modules[__name__]
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+COMPROBACIÓN DEL NOTIFICADOR CONTRA UN TELEGRAM LOCAL
+Levanta un servidor HTTP que imita sendMessage (429 con retry_after, caídas 5xx y 200) y verifica
+sobre NotificadorTelegram (url_base apuntando al servidor):
+- la ráfaga se agrupa en un solo mensaje y el 429 se reintenta tras retry_after
+- con Telegram caído lo no entregado queda en el archivo de pendientes al detener
+- un notificador nuevo (reinicio) reenvía los pendientes y borra el archivo
+Uso: python benchmarks/telegram_local.py
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+RAIZ = os.path.dirname(DIRECTORIO)
+
+# Segundos que pide esperar el 429 simulado
+RETRY_AFTER = 1
+
+
+class TelegramLocal:
+    """Servidor sendMessage local: respuestas programadas y registro de los textos recibidos"""
+
+    def __init__(self):
+        self.respuestas = []  # Códigos para las próximas peticiones (vacía = 200)
+        self.caido = False  # True = 500 en todas las peticiones
+        self.peticiones = []  # (código devuelto, texto)
+        servidor = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            def do_POST(self):
+                datos = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                codigo = 500 if servidor.caido else (servidor.respuestas.pop(0) if servidor.respuestas else 200)
+                servidor.peticiones.append((codigo, datos['text']))
+                cuerpo = {'ok': codigo == 200}
+                if codigo == 429:
+                    cuerpo['parameters'] = {'retry_after': RETRY_AFTER}
+                contenido = json.dumps(cuerpo).encode()
+                self.send_response(codigo)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(contenido)))
+                self.end_headers()
+                self.wfile.write(contenido)
+
+            def log_message(self, *args):
+                pass
+
+        self.http = ThreadingHTTPServer(('127.0.0.1', 0), Manejador)
+        self.url = f"http://127.0.0.1:{self.http.server_address[1]}"
+        threading.Thread(target=self.http.serve_forever, daemon=True).start()
+
+    def entregados(self):
+        return [texto for codigo, texto in self.peticiones if codigo == 200]
+
+    def cerrar(self):
+        self.http.shutdown()
+
+
+def esperar(condicion, timeout=15.0):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        if condicion():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def comprobar(notificacion, telegram, directorio):
+    pendientes = os.path.join(directorio, "pendientes.jsonl")
+
+    def nuevo():
+        return notificacion.NotificadorTelegram("token", "@canal", prefijo="BOT\n", url_base=telegram.url,
+                                                archivo_pendientes=pendientes, intervalo_agrupacion=0.2, timeout=5)
+
+    # 1) Ráfaga agrupada + 429 con retry_after
+    telegram.respuestas = [429]
+    notificador = nuevo()
+    inicio = time.monotonic()
+    for i in range(3):
+        notificador.encolar(f"<b>mensaje {i}</b>")
+    assert esperar(lambda: telegram.entregados()), "la ráfaga no se entregó"
+    espera = time.monotonic() - inicio
+    assert [codigo for codigo, _ in telegram.peticiones] == [429, 200], telegram.peticiones
+    assert telegram.entregados() == ["BOT\n<b>mensaje 0</b>\n<b>mensaje 1</b>\n<b>mensaje 2</b>"], telegram.entregados()
+    assert espera >= RETRY_AFTER, f"no se respetó retry_after ({espera:.2f}s)"
+    stats = notificador.estadisticas()
+    assert stats['enviados'] == 3 and stats['limitados'] == 1 and stats['mensajes_http'] == 2, stats
+    notificador.detener()
+    print(f"✅ Ráfaga agrupada en 1 mensaje, 429 reintentado tras {espera:.2f}s")
+
+    # 2) Telegram caído: lo no entregado queda en disco al detener
+    telegram.peticiones.clear()
+    telegram.caido = True
+    notificador = nuevo()
+    notificador.encolar("pendiente A")
+    notificador.encolar("pendiente B")
+    notificador.detener()
+    with open(pendientes, 'r', encoding='utf-8') as f:
+        guardados = [json.loads(linea)['texto'] for linea in f if linea.strip()]
+    assert guardados == ["BOT\npendiente A\npendiente B"], guardados
+    assert not telegram.entregados()
+    print(f"✅ Con Telegram caído: {len(guardados)} bloque(s) en pendientes tras "
+          f"{len(telegram.peticiones)} intentos")
+
+    # 3) Reinicio: los pendientes se reenvían (sin duplicar el prefijo) y el archivo desaparece
+    telegram.peticiones.clear()
+    telegram.caido = False
+    notificador = nuevo()
+    assert not os.path.exists(pendientes), "el archivo de pendientes sigue en disco"
+    assert esperar(lambda: telegram.entregados()), "los pendientes no se reenviaron"
+    assert telegram.entregados() == ["BOT\npendiente A\npendiente B"], telegram.entregados()
+    notificador.detener()
+    assert not os.path.exists(pendientes)
+    print("✅ Pendientes reenviados tras el reinicio")
+
+
+def main():
+    directorio = tempfile.mkdtemp(prefix="telegram_local_")
+    original = os.getcwd()
+    # config y notificacion leen y escriben archivos relativos: se trabaja en un directorio temporal
+    # para no tocar el estado ni los pendientes reales del bot
+    os.chdir(directorio)
+    sys.path.insert(0, RAIZ)
+    import notificacion
+
+    # Esperas cortas para las caídas 5xx (retry_after del 429 se respeta hasta ESPERA_MAXIMA)
+    notificacion.ESPERA_BASE = 0.01
+    notificacion.ESPERA_MAXIMA = 2.0
+    notificacion.PAUSA_ENTRE_ENVIOS = 0.0
+
+    telegram = TelegramLocal()
+    try:
+        comprobar(notificacion, telegram, directorio)
+    finally:
+        telegram.cerrar()
+        os.chdir(original)
+        shutil.rmtree(directorio, ignore_errors=True)
+    print("✅ Notificador verificado contra el Telegram local")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,20 +5,30 @@ BOT PRINCIPAL - MODO CONTINUO
 import time
 import threading
 from datetime import datetime
-from tiempo import obtener_hora_actual, convertir_a_hora_ny
+from tiempo import obtener_hora_actual, convertir_a_hora_ny, reloj
 from config import (
     TELEGRAM_TOKEN, TELEGRAM_CHANNEL, temporalidad_direccion, 
     temporalidad_precision, CUENTA_PRINCIPAL, CUENTAS_SECUNDARIAS,
     PORCENTAJE_RIESGO, MAX_OPERACIONES_SIMULTANEAS, MODO_OPERACION,
-    PARES,MAX_OPERACIONES_DIARIAS, hora_inicio, hora_fin
+    PARES,MAX_OPERACIONES_DIARIAS, hora_inicio, hora_fin, ESPERAR_PUBLICACION_VELA,
+    EJECUCION_PARALELA, STREAMING_TICKS, INTERVALO_SONDEO_TICKS, MAX_CPU_STREAMING, EVALUAR_VELA_EN_FORMACION
 )
 from direccion import verificar_direccion
-from precision import buscar_entradas
-from notificacion import enviar_mensaje
+from precision import buscar_entradas, evaluar_vela_en_formacion
+from notificacion import enviar_mensaje, notificador
 from data_metatrader5 import (
     conectar_mt5, obtener_estado_cuenta,
-    abrir_operacion_mercado, contar_operaciones_abiertas
+    abrir_operacion_mercado, contar_operaciones_abiertas, obtener_operaciones_cerradas
 )
+from sesion_mt5 import sesion
+from cache_velas import cache_velas
+from planificador import Planificador
+from streaming import FlujoTicks
+from ejecucion import EjecutorMultiCuenta
+from persistencia import cargar_estado_bot, guardar_estado_bot, obtener_almacen
+from metricas import AcumuladorMetricas
+from simbolos import registro_simbolos
+import instrumentacion_mt5
 import pytz
 
 # Lista de todas las cuentas a operar
@@ -27,18 +37,69 @@ if CUENTA_PRINCIPAL:
 else:
     TODAS_CUENTAS = CUENTAS_SECUNDARIAS
 
+# Planificador de cierres de vela para las temporalidades del bot
+planificador = Planificador(
+    [temporalidad_direccion, temporalidad_precision],
+    esperar_publicacion=ESPERAR_PUBLICACION_VELA,
+    simbolo_referencia=PARES[0]
+)
+
+# Detección de cierres por ticks (modo streaming)
+flujo_ticks = FlujoTicks(
+    PARES,
+    [temporalidad_direccion, temporalidad_precision],
+    intervalo_sondeo=INTERVALO_SONDEO_TICKS,
+    max_cpu_pct=MAX_CPU_STREAMING,
+    esperar_publicacion=ESPERAR_PUBLICACION_VELA,
+    simbolo_referencia=PARES[0]
+) if STREAMING_TICKS else None
+
+# Ejecutor paralelo (un proceso por cuenta); None = ejecución secuencial
+ejecutor = None
+
 # Lock para evitar ejecuciones simultáneas
 ejecucion_lock = threading.Lock()
 
 # Almacenar señales detectadas para evitar duplicados
 señales_detectadas = {}
-ULTIMA_SEÑAL_ID = None
+# Última señal provisional (vela en formación) avisada por par
+señales_provisionales = {}
 
+# Estado persistente (sobrevive a reinicios). Se carga en cargar_estado() y no al importar:
+# los trabajadores de ejecución (spawn) re-importan este módulo y no deben tocar el estado
+ULTIMA_SEÑAL_ID = None
 CANT_OPERACIONES = 0
-ULTIMO_DIA = 0
+ULTIMO_DIA = None  # Fecha NY (ISO) del contador diario
+
+# Métricas en vivo de la cuenta principal (instantánea en disco + cursor del último cierre)
+metricas_vivo = None
+_cursor_metricas = {}
+
+
+def cargar_estado():
+    """Carga el estado persistente y las métricas en vivo (solo en el proceso principal)"""
+    global ULTIMA_SEÑAL_ID, CANT_OPERACIONES, ULTIMO_DIA, metricas_vivo, _cursor_metricas
+    estado = cargar_estado_bot()
+    ULTIMA_SEÑAL_ID = estado.get('ultima_señal_id')
+    CANT_OPERACIONES = estado.get('cant_operaciones', 0)
+    # Los estados antiguos guardaban solo el día del mes: se ignoran
+    ULTIMO_DIA = estado.get('ultimo_dia')
+    if not isinstance(ULTIMO_DIA, str):
+        ULTIMO_DIA = None
+    metricas_vivo, _cursor_metricas = AcumuladorMetricas.cargar(
+        capital_inicial=(CUENTA_PRINCIPAL or {}).get('balance', 10000)
+    )
+
+
+def terminales_independientes(cuentas):
+    """Indica si cada cuenta tiene su propio terminal MT5"""
+    terminales = [cuenta.get('terminal') for cuenta in cuentas]
+    return all(terminales) and len(set(terminales)) == len(terminales)
+
 
 def inicializar():
     """Inicializa el bot"""
+    global ejecutor
     print("=" * 50)
     print("BOT DE TRADING - MODO CONTINUO")
     print("=" * 50)
@@ -51,6 +112,10 @@ def inicializar():
     print(f"Máx. operaciones por cuenta: {MAX_OPERACIONES_SIMULTANEAS}")
     if CUENTA_PRINCIPAL:
         conectar_mt5(servidor=CUENTA_PRINCIPAL['servidor'],numero_cuenta=CUENTA_PRINCIPAL['numero_cuenta'],contraseña=CUENTA_PRINCIPAL['contraseña'])
+        if reloj.sincronizar():
+            print(f"Reloj servidor: UTC{reloj.estado()['desfase_servidor_h']:+g}h")
+        leidos = registro_simbolos.cargar(PARES)
+        print(f"Símbolos del broker: {registro_simbolos.estadisticas()['desde_broker']} registrados ({leidos} leídos ahora)")
     if TODAS_CUENTAS:
         print("\n📋 Cuentas configuradas:")
         for i, cuenta in enumerate(TODAS_CUENTAS, 1):
@@ -62,6 +127,14 @@ def inicializar():
             print(f"     {num_cuenta}@{servidor}")
             print(f"     Balance: ${balance if isinstance(balance, (int, float)) else 'N/A'}")
         
+    if MODO_OPERACION == "REAL" and EJECUCION_PARALELA and TODAS_CUENTAS:
+        if terminales_independientes(TODAS_CUENTAS):
+            print("\n🧵 Iniciando trabajadores de ejecución por cuenta...")
+            ejecutor = EjecutorMultiCuenta(TODAS_CUENTAS, PORCENTAJE_RIESGO)
+            ejecutor.iniciar()
+        else:
+            print("\n⚠️  Ejecución paralela desactivada: cada cuenta necesita su propio 'terminal'")
+        
     if TELEGRAM_TOKEN and TELEGRAM_CHANNEL:
         enviar_mensaje(f"🤖 Bot iniciado\n⏰ {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
@@ -90,6 +163,7 @@ def ejecutar_señales_en_cuentas(señales):
             continue
         
         ULTIMA_SEÑAL_ID = señal_id
+        guardar_estado_bot(ultima_señal_id=ULTIMA_SEÑAL_ID)
         resultados[señal['par']] = {}
         
         print(f"\n   🎯 Procesando señal para {señal['par']}:")
@@ -100,6 +174,13 @@ def ejecutar_señales_en_cuentas(señales):
         print(f"      Pips SL: {señal['pips_sl']}")
         print(f"      Ratio: {señal['ratio']}:1")
         
+        # Ejecutar en todas las cuentas a la vez
+        if ejecutor is not None and MODO_OPERACION == "REAL":
+            resultados[señal['par']] = ejecutor.ejecutar(señal)
+            print(f"\n      ⏱️  Latencia por cuenta:")
+            ejecutor.mostrar_latencias(resultados[señal['par']])
+            continue
+        
         # Ejecutar en cada cuenta
         for cuenta_config in TODAS_CUENTAS:
             nombre_cuenta = cuenta_config.get('nombre', f"Cuenta {cuenta_config['numero_cuenta']}")
@@ -125,6 +206,7 @@ def ejecutar_señales_en_cuentas(señales):
                     precio_tp=señal['tp'],
                     tipo_operacion=tipo_operacion,
                     porcentaje_riesgo=PORCENTAJE_RIESGO,
+                    detectada=señal.get('detectada'),
                 )
                                 
                 if resultado:
@@ -142,42 +224,55 @@ def ejecutar_señales_en_cuentas(señales):
     return resultados
 
 
-def ejecutar_tareas_segun_hora(ahora):
-    """Ejecuta las tareas correspondientes según la hora actual"""
+def actualizar_metricas_vivo():
+    """Incorpora a las métricas en vivo las operaciones del bot cerradas desde la última revisión"""
+    if MODO_OPERACION != 'REAL' or not CUENTA_PRINCIPAL:
+        return 0
+    conectar_mt5(servidor=CUENTA_PRINCIPAL['servidor'], numero_cuenta=CUENTA_PRINCIPAL['numero_cuenta'], contraseña=CUENTA_PRINCIPAL['contraseña'])
+    ultimo = (_cursor_metricas.get('tiempo', 0), _cursor_metricas.get('ticket', 0))
+    nuevas = [op for op in obtener_operaciones_cerradas(ultimo[0]) if (op['tiempo'], op['ticket']) > ultimo]
+    if not nuevas:
+        return 0
+    for op in nuevas:
+        metricas_vivo.registrar(op['pnl'], op['pnl_pips'], op['direccion'], op['razon_salida'])
+    _cursor_metricas.update(tiempo=nuevas[-1]['tiempo'], ticket=nuevas[-1]['ticket'])
+    metricas_vivo.guardar(**_cursor_metricas)
+    m = metricas_vivo.metricas()
+    print(f"📈 {len(nuevas)} operación(es) cerrada(s) | Trades: {m['Total Trades']} | "
+          f"Win Rate: {m['% Win Rate']:.1f}% | Factor: {m['Factor de Beneficio']:.2f} | DD: {m['Drawdown Máximo']:.2f}%")
+    return len(nuevas)
+
+
+def reiniciar_contador_diario(fecha_ny):
+    """Pone a cero el contador de operaciones si cambió el día NY (también tras reiniciar el bot)"""
     global ULTIMO_DIA, CANT_OPERACIONES
+    dia = fecha_ny.date().isoformat()
+    if ULTIMO_DIA != dia:
+        ULTIMO_DIA = dia
+        CANT_OPERACIONES = 0
+        guardar_estado_bot(ultimo_dia=ULTIMO_DIA, cant_operaciones=CANT_OPERACIONES)
+
+
+def ejecutar_tareas_segun_hora(ahora, temporalidades=None):
+    """
+    Ejecuta las tareas de las temporalidades cuya vela acaba de cerrar.
+    Si no se indican, se deducen de la hora 'ahora' (cierre de vela en hora NY).
+    """
+    global CANT_OPERACIONES
     with ejecucion_lock:
-        minuto_actual = ahora.minute
-        hora_actual = ahora.hour
+        if temporalidades is None:
+            ts = ahora.timestamp()
+            temporalidades = [tf for tf in planificador.temporalidades if planificador.cierra_en(tf, ts)]
         
         print(f"\n[{ahora.strftime('%H:%M:%S')}] 🔄 Verificando tareas...")
         
-        # Siempre en orden: 1H → 15M → 5M
-        
-        # 1. Verificar si toca ejecutar 1H (cada hora en minuto 0)
-        acceso_direccion = False
-        if temporalidad_direccion == "1hour" and minuto_actual == 0:
-            acceso_direccion = True
-        elif temporalidad_direccion == "15min" and minuto_actual % 15 == 0:
-            acceso_direccion = True
-        elif temporalidad_direccion == "5min" and minuto_actual % 5 == 0:
-            acceso_direccion = True
-            
-        if acceso_direccion:
+        # Siempre en orden: dirección → precisión
+        if temporalidad_direccion in temporalidades:
             print(f"[{ahora.strftime('%H:%M:%S')}] 📊 Ejecutando Verificación {temporalidad_direccion}...")
             verificar_direccion(temporalidad=temporalidad_direccion)
             print(f"[{ahora.strftime('%H:%M:%S')}] ✅ Verificación {temporalidad_direccion} completada")
         
-        
-        
-        acceso_precision = False
-        if temporalidad_precision == "1hour" and minuto_actual == 0:
-            acceso_precision = True
-        elif temporalidad_precision == "15min" and minuto_actual % 15 == 0:
-            acceso_precision = True
-        elif temporalidad_precision == "5min" and minuto_actual % 5 == 0:
-            acceso_precision = True
-        
-        if acceso_precision:
+        if temporalidad_precision in temporalidades:
             print(f"[{ahora.strftime('%H:%M:%S')}] 🔍 Ejecutando Búsqueda {temporalidad_precision}...")
             señales = buscar_entradas(intervalo=temporalidad_precision)
             print(f"[{ahora.strftime('%H:%M:%S')}] ✅ Búsqueda {temporalidad_precision} completada")
@@ -188,15 +283,14 @@ def ejecutar_tareas_segun_hora(ahora):
             #hora_ny = datetime.now(ny_tz).hour
             
             date = convertir_a_hora_ny(obtener_hora_actual())
-            if ULTIMO_DIA != date.day:
-                ULTIMO_DIA = date.day
-                CANT_OPERACIONES = 0
+            reiniciar_contador_diario(date)
                 
             hora_ny = date.hour
             if señales and MODO_OPERACION == 'REAL' and hora_inicio <= hora_ny < hora_fin and CANT_OPERACIONES < MAX_OPERACIONES_DIARIAS:
                 print(f"\n[{ahora.strftime('%H:%M:%S')}] 🚀 Ejecutando señales encontradas...")
                 resultados = ejecutar_señales_en_cuentas(señales)
                 CANT_OPERACIONES += 1
+                guardar_estado_bot(cant_operaciones=CANT_OPERACIONES)
                 # Resumen de resultados
                 print(f"\n[{ahora.strftime('%H:%M:%S')}] 📊 Resumen de ejecución:")
                 for par, cuentas in resultados.items():
@@ -210,24 +304,54 @@ def ejecutar_tareas_segun_hora(ahora):
                                 print(f"     {cuenta}: ✅ REAL (Ticket: {ticket})")
                         else:
                             print(f"     {cuenta}: ❌ FALLÓ")
+                sesion.mostrar_estadisticas()
                 
             else:
                 print(f"\n[{ahora.strftime('%H:%M:%S')}] ⚠️  No se encontraron señales válidas")
         
-        # 3. Verificar si toca ejecutar 5M (cada 5 minutos)
-        #if minuto_actual % 5 == 0:
-        #    print(f"[{ahora.strftime('%H:%M:%S')}] 🔎 Ejecutando Búsqueda 5M...")
-        #    buscar_entradas(intervalo=temporalidad_precision)
-        #    print(f"[{ahora.strftime('%H:%M:%S')}] ✅ Búsqueda 5M completada")
+        actualizar_metricas_vivo()
+        
+        ciclo_mt5 = instrumentacion_mt5.cerrar_ciclo(','.join(temporalidades))
+        if ciclo_mt5 is not None:
+            print(f"[{ahora.strftime('%H:%M:%S')}] 📡 MT5: {ciclo_mt5['llamadas']} llamadas en "
+                  f"{ciclo_mt5['tiempo_mt5_ms']:.0f} ms ({ciclo_mt5['redundantes']} redundantes)")
         
         # Si no ejecutó nada, mostrar mensaje
-        if not (minuto_actual == 0 or minuto_actual % 15 == 0 or minuto_actual % 5 == 0):
-            print(f"[{ahora.strftime('%H:%M:%S')}] ⏭️  No hay tareas programadas para este minuto")
+        if not temporalidades:
+            print(f"[{ahora.strftime('%H:%M:%S')}] ⏭️  No hay tareas programadas para esta hora")
+
+
+def atender_cierre(evento):
+    """Ejecuta las tareas de un cierre de vela (evento del planificador o del streaming de ticks)"""
+    print(f"⏱️  Retraso vs cierre de vela: {evento['retraso_total_ms']:.0f} ms")
+    ejecutar_tareas_segun_hora(evento['hora_ny'], evento['temporalidades'])
+
+
+def evaluar_tick(par, tick):
+    """Evalúa la vela en formación del par con cada tick nuevo (avisa una vez por patrón y vela)"""
+    # Nunca en paralelo con las tareas de cierre de vela
+    if not ejecucion_lock.acquire(blocking=False):
+        return
+    try:
+        señal = evaluar_vela_en_formacion(par, temporalidad_precision)
+    except Exception as e:
+        print(f"  ❌ Error evaluando vela en formación {par}: {e}")
+        return
+    finally:
+        ejecucion_lock.release()
+    if not señal:
+        return
+    clave = (señal['tipo'], señal['apertura_vela'])
+    if señales_provisionales.get(par) != clave:
+        señales_provisionales[par] = clave
+        ajuste = " | SL ajustado (Forex)" if señal.get('sl_ajustado') else ""
+        print(f"🕒 {par}: {señal['tipo']} provisional en vela {señal['apertura_vela']} "
+              f"(entrada {señal['entrada']:.5f} | SL {señal['sl']:.5f} | TP {señal['tp']:.5f}{ajuste})")
 
 
 def ejecutar_primera_verificacion():
     """Ejecuta la primera verificación completa"""
-    global CANT_OPERACIONES, ULTIMO_DIA
+    global CANT_OPERACIONES
     with ejecucion_lock:
         ahora = datetime.now()
         print(f"\n[{ahora.strftime('%H:%M:%S')}] 🚀 Ejecutando primera verificación completa...")
@@ -241,11 +365,14 @@ def ejecutar_primera_verificacion():
         # Ejecutar señales si existen
         #ny_tz = pytz.timezone('America/New_York')
         #hora_ny = datetime.now(ny_tz).hour
-        hora_ny = convertir_a_hora_ny(obtener_hora_actual()).hour
+        date = convertir_a_hora_ny(obtener_hora_actual())
+        reiniciar_contador_diario(date)
+        hora_ny = date.hour
         if señales and MODO_OPERACION == 'REAL' and hora_inicio <= hora_ny < hora_fin and CANT_OPERACIONES < MAX_OPERACIONES_DIARIAS:
             print(f"\n[{ahora.strftime('%H:%M:%S')}] 🚀 Ejecutando señales de primera verificación...")
             resultados = ejecutar_señales_en_cuentas(señales)
             CANT_OPERACIONES += 1
+            guardar_estado_bot(cant_operaciones=CANT_OPERACIONES)
         else:
             print(f"\n[{ahora.strftime('%H:%M:%S')}] ⚠️  No se encontraron señales en primera verificación")
         
@@ -254,40 +381,29 @@ def ejecutar_primera_verificacion():
 
 def main():
     """Función principal"""
+    cargar_estado()
     inicializar()
     
-    print("\n⏰ Ejecutando en modo continuo (verificación cada minuto)...")
+    print("\n⏰ Ejecutando en modo continuo (alineado al cierre de vela)...")
     
     # Ejecutar primera verificación completa
     ejecutar_primera_verificacion()
     
-    # Bucle principal que verifica cada minuto
+    # Bucle principal: dormir hasta el próximo cierre de vela
     print("\n🔄 Entrando en modo continuo...")
     print("🛑 Presiona Ctrl+C para detener\n")
     
-    ultima_verificacion = convertir_a_hora_ny(obtener_hora_actual())
-    
     try:
-        while True:
-            #ahora = datetime.now()
-            ahora = convertir_a_hora_ny(obtener_hora_actual())
-            # Verificar si el minuto actual es diferente al de la última verificación
-            if ahora.minute != ultima_verificacion.minute:
-                ultima_verificacion = ahora
-                ejecutar_tareas_segun_hora(ahora)
-            
-            # Mostrar estado
-            segundos_restantes = 60 - (ahora - ultima_verificacion).seconds
-            minutos_restantes = segundos_restantes / 60
+        if flujo_ticks is not None:
+            print("⚡ Modo streaming: cierre de vela detectado con el primer tick de la vela nueva")
+            flujo_ticks.ejecutar(atender_cierre, al_tick=evaluar_tick if EVALUAR_VELA_EN_FORMACION else None)
+        while flujo_ticks is None:
+            cierre, temporalidades = planificador.siguiente_evento()
+            espera = cierre - reloj.timestamp()
+            hora_cierre = convertir_a_hora_ny(float(cierre))
+            print(f"⏰ Próximo cierre {', '.join(temporalidades)} a las {hora_cierre.strftime('%Y-%m-%d %H:%M')} NY (en {espera / 60:.1f} min)")
             
-            if ejecucion_lock.locked():
-                estado = "⏳ Ejecutando..."
-            else:
-                estado = "✅ Listo"
-            
-            print(f"⏰ Próxima verificación en {minutos_restantes:.1f} min | {estado}", end='\r')
-            
-            time.sleep(1)
+            atender_cierre(planificador.esperar_siguiente())
                         
     except KeyboardInterrupt:
         print("\n\n🛑 Bot detenido por usuario")
@@ -302,8 +418,25 @@ def main():
                 print(f"⏳ Esperando... {29-i}s restantes", end='\r')
                 time.sleep(1)
         
+        if ejecutor is not None:
+            ejecutor.detener()
+        sesion.mostrar_estadisticas()
+        instrumentacion_mt5.mostrar_estadisticas()
+        if metricas_vivo is not None and metricas_vivo.operaciones:
+            metricas_vivo.mostrar("MÉTRICAS EN VIVO - CUENTA PRINCIPAL")
+        sesion.cerrar()
+        obtener_almacen().cerrar()
+        print(f"📊 Planificador: {planificador.estadisticas()}")
+        if flujo_ticks is not None:
+            print(f"📊 Streaming de ticks: {flujo_ticks.estadisticas()}")
+        print(f"📊 Caché de velas: {cache_velas.estadisticas()}")
+        print(f"📊 Registro de símbolos: {registro_simbolos.estadisticas()}")
+        
         if TELEGRAM_TOKEN and TELEGRAM_CHANNEL:
             enviar_mensaje(f"🛑 Bot detenido\n⏰ {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        if notificador is not None:
+            notificador.detener()
+            print(f"📊 Notificaciones: {notificador.estadisticas()}")
 
 
 if __name__ == "__main__":
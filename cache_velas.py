@@ -0,0 +1,444 @@
+"""
+CACHÉ INCREMENTAL DE VELAS POR (SÍMBOLO, TEMPORALIDAD)
+"""
+import time
+import threading
+
+import numpy as np
+import pandas as pd
+from instrumentacion_mt5 import mt5
+from data_metatrader5 import conectar_mt5, INTERVALOS_MT5
+from planificador import SEGUNDOS_TEMPORALIDAD, apertura_vela, se_agrega_localmente
+from tiempo import reloj
+
+# Velas mínimas a mantener por buffer
+CAPACIDAD_MINIMA = 200
+# Velas ya cacheadas que se vuelven a pedir para detectar revisiones del broker
+SOLAPE = 3
+
+COLUMNAS_OHLC = ['open', 'high', 'low', 'close']
+
+# Velas M1 máximas que se piden al broker para agregar (~69 días)
+MAX_VELAS_M1 = 100_000
+
+
+class BufferVelas:
+    """
+    Buffer circular de velas en orden cronológico.
+    Usa un array del doble de capacidad para que las vistas sean siempre contiguas:
+    al llenarse se compacta copiando las últimas 'capacidad' velas al inicio (coste amortizado O(1)).
+    """
+
+    def __init__(self, capacidad, dtype):
+        self.capacidad = capacidad
+        self._datos = np.zeros(2 * capacidad, dtype=dtype)
+        self._inicio = 0
+        self._fin = 0
+
+    def __len__(self):
+        return self._fin - self._inicio
+
+    def reiniciar(self, rates):
+        rates = rates[-self.capacidad:]
+        self._datos[:len(rates)] = rates
+        self._inicio = 0
+        self._fin = len(rates)
+
+    def ultimo_tiempo(self):
+        return int(self._datos[self._fin - 1]['time']) if len(self) else None
+
+    def agregar(self, rates):
+        """Añade velas nuevas; la primera puede reemplazar a la última cacheada (vela en formación)"""
+        if len(rates) == 0:
+            return
+        if len(self) and int(rates[0]['time']) == self.ultimo_tiempo():
+            self._fin -= 1
+        n = len(rates)
+        if n >= self.capacidad:
+            self.reiniciar(rates)
+            return
+        if self._fin + n > len(self._datos):
+            conservar = min(len(self), self.capacidad - n)
+            self._datos[:conservar] = self._datos[self._fin - conservar:self._fin]
+            self._inicio, self._fin = 0, conservar
+        self._datos[self._fin:self._fin + n] = rates
+        self._fin += n
+        if len(self) > self.capacidad:
+            self._inicio = self._fin - self.capacidad
+
+    def vista(self, barras=None):
+        """Vista de solo lectura de las últimas 'barras' velas (orden cronológico)"""
+        inicio = self._inicio if barras is None else max(self._inicio, self._fin - barras)
+        vista = self._datos[inicio:self._fin]
+        vista.flags.writeable = False
+        return vista
+
+
+class AgregadorVelas:
+    """
+    Velas de cualquier temporalidad de un símbolo construidas desde sus velas M1.
+    Los límites se alinean al reloj de sesión de NY (velas diarias de 17:00 a 17:00 NY, sin velas de domingo),
+    los mismos que usa el planificador para sus cierres (planificador.apertura_vela),
+    y cada vela M1 cerrada actualiza cada temporalidad en O(1). La vela M1 en formación se combina al pedir la vista.
+    """
+
+    def __init__(self, dtype, generacion=0):
+        self.dtype = dtype
+        self.generacion = generacion  # Generación del buffer M1 del que se alimenta
+        self.buffers = {}  # temporalidad -> BufferVelas con las velas agregadas cerradas
+        self.actual = {}  # temporalidad -> vela agregada en curso (solo con velas M1 cerradas)
+        self.ultimo_m1 = None
+        self.m1_formacion = None
+        self.velas_m1 = 0
+
+    def apertura(self, temporalidad, t_servidor):
+        """Apertura (hora servidor) de la vela de la temporalidad que contiene t_servidor"""
+        return apertura_vela(temporalidad, t_servidor)
+
+    def _incorporar(self, temporalidad, vela):
+        """Suma una vela M1 cerrada a la vela agregada en curso (o la cierra y abre otra)"""
+        apertura = self.apertura(temporalidad, int(vela['time']))
+        actual = self.actual.get(temporalidad)
+        if actual is not None and int(actual['time']) == apertura:
+            actual['high'] = max(actual['high'], vela['high'])
+            actual['low'] = min(actual['low'], vela['low'])
+            actual['close'] = vela['close']
+            actual['tick_volume'] += vela['tick_volume']
+            actual['real_volume'] += vela['real_volume']
+            actual['spread'] = vela['spread']
+            return
+        if actual is not None:
+            self.buffers[temporalidad].agregar(actual.reshape(1))
+        actual = np.array(vela, dtype=self.dtype)
+        actual['time'] = apertura
+        self.actual[temporalidad] = actual
+
+    def asegurar(self, temporalidad, capacidad, historial_m1):
+        """Empieza a mantener la temporalidad reconstruyéndola desde el historial M1 (una sola vez)"""
+        buffer = self.buffers.get(temporalidad)
+        if buffer is not None and buffer.capacidad >= capacidad:
+            return
+        self.buffers[temporalidad] = BufferVelas(capacidad, self.dtype)
+        self.actual.pop(temporalidad, None)
+        if self.ultimo_m1 is None:
+            cerradas = historial_m1[:-1]
+            if len(cerradas):
+                self.ultimo_m1 = int(cerradas['time'][-1])
+                self.velas_m1 = len(cerradas)
+        else:
+            cerradas = historial_m1[:int(np.searchsorted(historial_m1['time'], self.ultimo_m1, side='right'))]
+        for vela in cerradas:
+            self._incorporar(temporalidad, vela)
+
+    def alimentar(self, rates_m1):
+        """Incorpora las velas M1 cerradas posteriores a la última vista (la última de rates_m1 está en formación)"""
+        if len(rates_m1) == 0:
+            return
+        tiempos = rates_m1['time']
+        desde = 0 if self.ultimo_m1 is None else int(np.searchsorted(tiempos, self.ultimo_m1, side='right'))
+        nuevas = rates_m1[desde:-1]
+        for vela in nuevas:
+            for temporalidad in self.buffers:
+                self._incorporar(temporalidad, vela)
+        self.velas_m1 += len(nuevas)
+        if len(rates_m1) > 1:
+            self.ultimo_m1 = max(self.ultimo_m1 or 0, int(tiempos[-2]))
+        self.m1_formacion = np.array(rates_m1[-1], dtype=self.dtype)
+
+    def vista(self, temporalidad, barras):
+        """Últimas 'barras' velas agregadas en orden cronológico (la última es la vela en formación)"""
+        partes = [self.buffers[temporalidad].vista(barras)]
+        actual = self.actual.get(temporalidad)
+        formacion = None
+        if self.m1_formacion is not None:
+            apertura = self.apertura(temporalidad, int(self.m1_formacion['time']))
+            if actual is not None and int(actual['time']) == apertura:
+                formacion = actual.copy()
+                formacion['high'] = max(formacion['high'], self.m1_formacion['high'])
+                formacion['low'] = min(formacion['low'], self.m1_formacion['low'])
+                formacion['close'] = self.m1_formacion['close']
+                formacion['tick_volume'] += self.m1_formacion['tick_volume']
+                formacion['real_volume'] += self.m1_formacion['real_volume']
+            else:
+                # La vela M1 en formación abre una vela nueva: la agregada en curso ya está completa
+                if actual is not None:
+                    partes.append(actual.reshape(1))
+                formacion = self.m1_formacion.copy()
+                formacion['time'] = apertura
+        elif actual is not None:
+            formacion = actual
+        if formacion is not None:
+            partes.append(formacion.reshape(1))
+        rates = np.concatenate(partes)[-barras:]
+        rates.flags.writeable = False
+        return rates
+
+
+class LoteVelas:
+    """
+    Velas de varios símbolos de una temporalidad en un único array preasignado (símbolo × vela × OHLC).
+    Cada fila está alineada a la derecha (la última columna es la vela más reciente); las filas con menos
+    velas se rellenan con NaN por la izquierda. Los símbolos que fallan quedan con longitud 0 y su error.
+    """
+
+    def __init__(self, pares, intervalo, barras):
+        self.pares = list(pares)
+        self.intervalo = intervalo
+        self.barras = barras
+        self.ohlc = np.full((len(self.pares), barras, len(COLUMNAS_OHLC)), np.nan)
+        self.tiempos = np.zeros((len(self.pares), barras), dtype=np.int64)
+        self.longitudes = np.zeros(len(self.pares), dtype=np.int64)
+        self.rates = [None] * len(self.pares)  # Vistas estructuradas de la caché por símbolo
+        self.errores = {}
+        self.duracion_ms = 0.0
+
+    def __len__(self):
+        return len(self.pares)
+
+    def cargar(self, i, rates):
+        """Copia las velas del símbolo i en su fila"""
+        n = min(len(rates), self.barras)
+        rates = rates[len(rates) - n:]
+        self.rates[i] = rates
+        self.longitudes[i] = n
+        if n:
+            self.tiempos[i, self.barras - n:] = rates['time']
+            for j, col in enumerate(COLUMNAS_OHLC):
+                self.ohlc[i, self.barras - n:, j] = rates[col]
+
+    def validos(self, minimo=1):
+        """Máscara de símbolos con al menos 'minimo' velas"""
+        return self.longitudes >= minimo
+
+    def informe_etapas(self, analisis_ms, salida_ms, resultados):
+        """Imprime y devuelve el tiempo de cada etapa del ciclo (adquisición, análisis y salida)"""
+        tiempos = {
+            'pares': len(self),
+            'fallidos': len(self.errores),
+            'adquisicion_ms': round(self.duracion_ms, 3),
+            'analisis_ms': round(analisis_ms, 3),
+            'salida_ms': round(salida_ms, 3),
+            'total_ms': round(self.duracion_ms + analisis_ms + salida_ms, 3),
+            'resultados': resultados,
+        }
+        print(f"  ⏱️  {tiempos['pares']} pares ({tiempos['fallidos']} con error) | "
+              f"adquisición {tiempos['adquisicion_ms']:.1f} ms | análisis {tiempos['analisis_ms']:.1f} ms | "
+              f"salida {tiempos['salida_ms']:.1f} ms | total {tiempos['total_ms']:.1f} ms")
+        return tiempos
+
+
+class CacheVelas:
+    """Mantiene un buffer por (símbolo, temporalidad) y solo descarga las velas nuevas"""
+
+    def __init__(self, capacidad_minima=CAPACIDAD_MINIMA, solape=SOLAPE):
+        self._lock = threading.RLock()
+        self.capacidad_minima = capacidad_minima
+        self.solape = solape
+        self.buffers = {}
+        self.generaciones = {}  # Se incrementa en cada siembra del buffer
+        self.agregadores = {}  # símbolo -> AgregadorVelas alimentado por su buffer M1
+
+        # Estadísticas
+        self.consultas = 0
+        self.aciertos = 0
+        self.sembrados = 0
+        self.resincronizaciones = 0
+        self.huecos = 0
+        self.revisiones = 0
+        self.velas_descargadas = 0
+        self.bytes_descargados = 0
+        self.agregadas = 0
+
+    def _descargar(self, par, intervalo, barras):
+        rates = mt5.copy_rates_from_pos(par, INTERVALOS_MT5[intervalo], 0, barras)
+        if rates is None or len(rates) == 0:
+            return None
+        self.velas_descargadas += len(rates)
+        self.bytes_descargados += rates.nbytes
+        return rates
+
+    def _sembrar(self, clave, capacidad):
+        par, intervalo = clave
+        rates = self._descargar(par, intervalo, capacidad)
+        if rates is None:
+            return None
+        buffer = BufferVelas(capacidad, rates.dtype)
+        buffer.reiniciar(rates)
+        self.buffers[clave] = buffer
+        self.generaciones[clave] = self.generaciones.get(clave, 0) + 1
+        self.sembrados += 1
+        return buffer
+
+    def _velas_pendientes(self, buffer, intervalo):
+        """Velas a pedir: las transcurridas desde la última cacheada más el solape"""
+        duracion = SEGUNDOS_TEMPORALIDAD.get(intervalo, 3600)
+        ahora_servidor = reloj.timestamp() + (reloj.desfase_servidor or 0)
+        transcurridas = max(0, int((ahora_servidor - buffer.ultimo_tiempo()) // duracion))
+        return min(buffer.capacidad, transcurridas + self.solape)
+
+    def _actualizar(self, clave, buffer):
+        """Descarga el delta; devuelve False si hay que resincronizar"""
+        par, intervalo = clave
+        rates = self._descargar(par, intervalo, self._velas_pendientes(buffer, intervalo))
+        if rates is None:
+            return True
+
+        cacheado = buffer.vista()
+        tiempos_cache = cacheado['time']
+        primera = int(rates[0]['time'])
+
+        # Hueco: el delta no alcanza a solapar con lo cacheado
+        if primera > int(tiempos_cache[-1]):
+            self.huecos += 1
+            return False
+
+        # Revisión: alguna vela cerrada del solape cambió en el broker
+        pos = int(np.searchsorted(tiempos_cache, primera))
+        if pos >= len(tiempos_cache) or int(tiempos_cache[pos]) != primera:
+            self.huecos += 1
+            return False
+        cerradas = min(len(tiempos_cache) - 1 - pos, len(rates))
+        if cerradas > 0:
+            solape_cache = cacheado[pos:pos + cerradas]
+            solape_nuevo = rates[:cerradas]
+            if not np.array_equal(solape_cache['time'], solape_nuevo['time']):
+                self.huecos += 1
+                return False
+            for col in COLUMNAS_OHLC:
+                if not np.array_equal(solape_cache[col], solape_nuevo[col]):
+                    self.revisiones += 1
+                    return False
+
+        buffer.agregar(rates[cerradas:])
+        return True
+
+    def usa_agregador(self, intervalo):
+        """Las temporalidades sin equivalente en MT5 (o todas con config.AGREGADOR_LOCAL) se agregan desde M1"""
+        return se_agrega_localmente(intervalo)
+
+    def _obtener_agregado(self, par, intervalo, barras):
+        """Velas de la temporalidad agregadas localmente desde el buffer M1 del símbolo"""
+        minutos = min(MAX_VELAS_M1, barras * SEGUNDOS_TEMPORALIDAD[intervalo] // 60 + 1)
+        if self.obtener_rates(par, '1min', minutos) is None:
+            return None
+        historial = self.buffers[(par, '1min')].vista()
+        generacion = self.generacion(par, '1min')
+
+        agregador = self.agregadores.get(par)
+        if agregador is None or agregador.generacion != generacion:
+            # Primera vez o el buffer M1 se resembró (hueco o revisión): reconstruir
+            agregador = AgregadorVelas(historial.dtype, generacion)
+            self.agregadores[par] = agregador
+        agregador.asegurar(intervalo, max(self.capacidad_minima, barras), historial)
+        agregador.alimentar(historial)
+        self.agregadas += 1
+        return agregador.vista(intervalo, barras)
+
+    def obtener_rates(self, par, intervalo, barras):
+        """Vista de solo lectura con las últimas 'barras' velas (incluye la vela en formación)"""
+        if self.usa_agregador(intervalo):
+            with self._lock:
+                return self._obtener_agregado(par, intervalo, barras)
+        with self._lock:
+            self.consultas += 1
+            clave = (par, intervalo)
+            capacidad = max(self.capacidad_minima, barras + self.solape)
+            buffer = self.buffers.get(clave)
+
+            if buffer is None or buffer.capacidad < capacidad or len(buffer) == 0:
+                buffer = self._sembrar(clave, capacidad)
+            elif self._actualizar(clave, buffer):
+                self.aciertos += 1
+            else:
+                self.resincronizaciones += 1
+                buffer = self._sembrar(clave, buffer.capacidad)
+
+            if buffer is None:
+                return None
+            return buffer.vista(barras)
+
+    def obtener_lote(self, pares, intervalo, barras):
+        """
+        Velas de todos los símbolos en una sola pasada por la sesión activa (sin reconectar por símbolo).
+        Un fallo en un símbolo solo afecta a su fila.
+        Returns:
+            LoteVelas con las últimas 'barras' velas de cada símbolo (incluye la vela en formación)
+        """
+        inicio = time.perf_counter()
+        lote = LoteVelas(pares, intervalo, barras)
+        with self._lock:
+            for i, par in enumerate(lote.pares):
+                try:
+                    rates = self.obtener_rates(par, intervalo, barras)
+                except Exception as e:
+                    lote.errores[par] = str(e)
+                    continue
+                if rates is None or len(rates) == 0:
+                    lote.errores[par] = "sin datos"
+                    continue
+                lote.cargar(i, rates)
+        lote.duracion_ms = (time.perf_counter() - inicio) * 1000
+        return lote
+
+    def generacion(self, par, intervalo):
+        """Número de siembras del buffer; cambia cuando se descartan los datos cacheados"""
+        return self.generaciones.get((par, intervalo), 0)
+
+    def invalidar(self, par=None, intervalo=None):
+        """Descarta buffers para forzar una nueva siembra"""
+        with self._lock:
+            for clave in list(self.buffers):
+                if (par is None or clave[0] == par) and (intervalo is None or clave[1] == intervalo):
+                    del self.buffers[clave]
+            for simbolo in list(self.agregadores):
+                if par is None or simbolo == par:
+                    del self.agregadores[simbolo]
+
+    def estadisticas(self):
+        """Tasa de acierto y volumen descargado"""
+        return {
+            'consultas': self.consultas,
+            'aciertos': self.aciertos,
+            'tasa_acierto': round(self.aciertos / self.consultas * 100, 2) if self.consultas else 0.0,
+            'sembrados': self.sembrados,
+            'resincronizaciones': self.resincronizaciones,
+            'huecos': self.huecos,
+            'revisiones': self.revisiones,
+            'velas_descargadas': self.velas_descargadas,
+            'bytes_descargados': self.bytes_descargados,
+            'buffers': len(self.buffers),
+            'consultas_agregadas': self.agregadas,
+            'agregadores': len(self.agregadores),
+        }
+
+
+# Instancia única compartida por dirección y precisión
+cache_velas = CacheVelas()
+
+
+def rates_a_dataframe(rates):
+    """Convierte velas (orden cronológico) al DataFrame que usan los módulos: más reciente primero"""
+    invertido = rates[::-1]
+    df = pd.DataFrame({col: invertido[col] for col in COLUMNAS_OHLC},
+                      index=pd.to_datetime(invertido['time'], unit='s'))
+    df.index.name = 'time'
+    return df
+
+
+def obtener_velas_cache(par, intervalo, barras, numero_cuenta, servidor, contraseña, incluir_precio_actual=False):
+    """Mismo contrato que obtener_velas_mt5 pero servido desde la caché incremental"""
+    if not conectar_mt5(servidor, numero_cuenta, contraseña):
+        print(f"❌ Error conectando a cuenta {numero_cuenta}")
+        return None, None
+
+    rates = cache_velas.obtener_rates(par, intervalo, barras)
+    if rates is None or len(rates) == 0:
+        return None, None
+
+    tick = mt5.symbol_info_tick(par)
+    precio_actual = tick.ask if tick else float(rates[-1]['close'])
+
+    if not incluir_precio_actual:
+        rates = rates[:-1]
+
+    return rates_a_dataframe(rates), precio_actual
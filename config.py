@@ -2,6 +2,7 @@
 CONFIGURACIÓN SIMPLE
 """
 import os
+import multiprocessing
 from persistencia import cargar_direcciones, guardar_direcciones
 from dotenv import load_dotenv
 
@@ -15,6 +16,7 @@ TELEGRAM_CHANNEL = "@trades_liranza"
 NOMBRE_BOT = 'ABRAHAM SCALPER 1H + 5min.\n'
 
 # Cuenta principal
+# Cada cuenta puede indicar 'terminal': ruta a su propio terminal64.exe para ejecución paralela
 CUENTA_PRINCIPAL = {
     'nombre':'Elias_5000',
     'servidor': 'MetaQuotes-Demo',
@@ -46,6 +48,11 @@ CUENTAS_SECUNDARIAS = [
 PORCENTAJE_RIESGO = 1.0  # 1% del balance por operación
 MAX_OPERACIONES_SIMULTANEAS = 1  # Máximo de operaciones por cuenta
 MAX_OPERACIONES_DIARIAS = 1
+# Ejecutar en todas las cuentas a la vez (un proceso por cuenta; requiere un 'terminal' distinto por cuenta)
+EJECUCION_PARALELA = True
+# Órdenes de baja latencia: reintento por tick y la señal caduca pasados PLAZO_ORDEN_MS
+EJECUCION_RAPIDA = True
+PLAZO_ORDEN_MS = 3000
 # Modo de operación
 MODO_OPERACION = "ANALISIS"  # "ANALISIS" o "REAL"
 
@@ -65,6 +72,20 @@ temporalidad_precision = '5min'
 
 hora_inicio = 0
 hora_fin = 24
+
+# Esperar a que el broker publique la vela nueva antes de analizar
+ESPERAR_PUBLICACION_VELA = True
+
+# Modo streaming: detectar el cierre de vela con el primer tick de la vela nueva (en lugar del planificador)
+STREAMING_TICKS = False
+INTERVALO_SONDEO_TICKS = 0.05  # Pausa mínima (s) entre pasadas por los pares
+MAX_CPU_STREAMING = 25.0  # % máximo de un núcleo dedicado al sondeo
+# Evaluar el patrón sobre la vela en formación en cada tick (solo aviso, no opera)
+EVALUAR_VELA_EN_FORMACION = False
+
+# Construir todas las temporalidades desde una sola descarga M1 por par (límites de sesión de NY).
+# Las temporalidades sin equivalente en MT5 (3min, 2hour, 6hour, 12hour, 3day) siempre se agregan localmente
+AGREGADOR_LOCAL = False
 '''
 ["1min", "3min", "5min", "15min", "30min", "1hour", "2hour", "4hour", "6hour", "12hour" , "1day", "3day", "1week"]
 '''
@@ -96,8 +117,8 @@ def inicializar_direcciones(temporalidad_direccion=temporalidad_direccion):
             direcciones[par] = None
             print(f"🔧 {par}: Sin dirección previa, inicializado como None")
     
-    # Si no existe archivo o hay pares nuevos, guardar configuración actual
-    if not os.path.exists("direccion.json") or set(PARES) != set(direcciones_guardadas.keys()):
+    # Si no hay direcciones guardadas o hay pares nuevos, guardar configuración actual
+    if set(PARES) != set(direcciones_guardadas.keys()):
         # Crear archivo con todos los pares actuales
         datos_guardar = {}
         for par in PARES:
@@ -106,8 +127,9 @@ def inicializar_direcciones(temporalidad_direccion=temporalidad_direccion):
     
     return direcciones
 
-# Inicializar variable global
-direccion_global = inicializar_direcciones()
+# Inicializar variable global (los trabajadores de ejecución, procesos hijos, no usan las direcciones)
+if multiprocessing.parent_process() is None:
+    direccion_global = inicializar_direcciones()
 
 
 def actualizar_direccion_global(par: str, direccion: str, temporalidad=temporalidad_direccion):
@@ -1,20 +1,26 @@
 import pandas as pd
-import MetaTrader5 as mt5
+from instrumentacion_mt5 import mt5
 import time
 import config
+from sesion_mt5 import sesion
+from simbolos import registro_simbolos
+
+# Mapeo de temporalidades de config a constantes MT5
+INTERVALOS_MT5 = {
+    '1min': mt5.TIMEFRAME_M1,
+    '5min': mt5.TIMEFRAME_M5,
+    '15min': mt5.TIMEFRAME_M15,
+    '30min': mt5.TIMEFRAME_M30,
+    '1hour': mt5.TIMEFRAME_H1,
+    '4hour': mt5.TIMEFRAME_H4,
+    '1day': mt5.TIMEFRAME_D1,
+    '1week': mt5.TIMEFRAME_W1,
+    '1month': mt5.TIMEFRAME_MN1
+}
 
 def conectar_mt5(servidor, numero_cuenta, contraseña):
-    """Conecta a una cuenta MT5 específica"""
-    if not mt5.initialize():
-        print("Error al inicializar MT5:", mt5.last_error())
-        return False
-    
-    autorizado = mt5.login(numero_cuenta, contraseña=contraseña, server=servidor)
-    if not autorizado:
-        print("Error de login:", mt5.last_error())
-        mt5.shutdown()
-        return False
-    return True
+    """Conecta a una cuenta MT5 específica reutilizando la sesión activa si es posible"""
+    return sesion.asegurar(servidor, numero_cuenta, contraseña)
 
 def obtener_estado_cuenta():
     """Obtiene el estado actual de la cuenta conectada"""
@@ -38,26 +44,17 @@ def obtener_estado_cuenta():
 
 def obtener_velas_mt5(par, intervalo, barras, numero_cuenta, servidor, contraseña, incluir_precio_actual=False):
     """Obtiene velas históricas de MT5"""
-    limpiar_conexiones_mt5()
-    print(f"\n🔗 Conectando a cuenta {numero_cuenta}@{servidor}...")
-    
-    # Conectar a la cuenta específica
+    # Conectar a la cuenta específica (sin login si la sesión ya está activa)
     if not conectar_mt5(servidor, numero_cuenta, contraseña):
         print(f"❌ Error conectando a cuenta {numero_cuenta}")
-        return None
+        return None, None
     
-    intervalos = {
-        '1min': mt5.TIMEFRAME_M1,
-        '5min': mt5.TIMEFRAME_M5,
-        '15min': mt5.TIMEFRAME_M15,
-        '30min': mt5.TIMEFRAME_M30,
-        '1hour': mt5.TIMEFRAME_H1,
-        '4hour': mt5.TIMEFRAME_H4,
-        '1day': mt5.TIMEFRAME_D1,
-        '1week': mt5.TIMEFRAME_W1,
-        '1month': mt5.TIMEFRAME_MN1
-    }
-    timeframe = intervalos.get(intervalo, mt5.TIMEFRAME_H1)
+    if intervalo not in INTERVALOS_MT5:
+        # Sin temporalidad nativa en MT5: se agrega localmente desde M1 (importar aquí evita el ciclo)
+        from cache_velas import obtener_velas_cache
+        return obtener_velas_cache(par, intervalo, barras, numero_cuenta, servidor, contraseña, incluir_precio_actual)
+    
+    timeframe = INTERVALOS_MT5[intervalo]
     
     rates = mt5.copy_rates_from_pos(par, timeframe, 0, barras)
     if rates is None or len(rates) == 0:
@@ -78,58 +75,175 @@ def obtener_velas_mt5(par, intervalo, barras, numero_cuenta, servidor, contrase
     return df[['open', 'high', 'low', 'close']], precio_actual
 
 def calcular_lote_estandar(simbolo, precio_entrada, precio_stop, balance_cuenta, porcentaje_riesgo, apalancamiento):
-    """Calcula el tamaño de lote basado en el balance y riesgo"""
+    """Calcula el tamaño de lote basado en el balance y riesgo (especificación del registro de símbolos)"""
     # Riesgo monetario
     riesgo_dinero = balance_cuenta * (porcentaje_riesgo / 100)
     
-    # Obtener información del símbolo
-    info_simbolo = mt5.symbol_info(simbolo)
-    if info_simbolo is None:
-        print(f"❌ No se encontró información para {simbolo}")
-        return 0.0
-    
-    # Parámetros del símbolo
-    volumen_min = info_simbolo.volume_min
-    volumen_max = info_simbolo.volume_max
-    volumen_step = info_simbolo.volume_step
-    
-    # Determinar valor del pip
-    if "JPY" in simbolo:
-        pip_value = 0.01
-    elif "XAUUSD" in simbolo or "XAGUSD" in simbolo:
-        pip_value = 0.1
-    else:
-        pip_value = 0.0001
+    # Especificación del símbolo (O(1), leída del broker una sola vez)
+    espec = registro_simbolos.obtener(simbolo)
     
-    # Calcular distancia en pips
-    distancia_pips = abs(precio_entrada - precio_stop) / pip_value
-    valor_pip_por_lote = 10.0  # $10 por pip por lote estándar
+    # Calcular distancia en pips y valor del pip por lote según el broker
+    distancia_pips = abs(precio_entrada - precio_stop) / espec.tamaño_pip
     
-    if distancia_pips > 0:
-        lotes = riesgo_dinero / (distancia_pips * valor_pip_por_lote)
+    if distancia_pips > 0 and espec.valor_pip_lote > 0:
+        lotes = riesgo_dinero / (distancia_pips * espec.valor_pip_lote)
     else:
         lotes = 0.0
     
     # Validar límites de margen
-    margen_requerido = (lotes * 100000 * precio_entrada) / apalancamiento
+    margen_requerido = (lotes * espec.tamaño_contrato * precio_entrada) / apalancamiento
     if margen_requerido > balance_cuenta * 0.8:
-        lotes = (balance_cuenta * 0.8 * apalancamiento) / (100000 * precio_entrada)
+        lotes = (balance_cuenta * 0.8 * apalancamiento) / (espec.tamaño_contrato * precio_entrada)
     
     # Ajustar a límites y step del broker
-    lotes = max(volumen_min, min(volumen_max, lotes))
-    if volumen_step > 0:
-        lotes = round(lotes / volumen_step) * volumen_step
+    lotes = max(espec.volumen_min, min(espec.volumen_max, lotes))
+    if espec.volumen_paso > 0:
+        lotes = round(lotes / espec.volumen_paso) * espec.volumen_paso
     
     return round(lotes, 2)
 
 
 
+# Modo rápido: códigos que se reintentan con el siguiente tick (requote, rechazo, timeout,
+# precio cambiado, sin cotización, demasiadas peticiones, sin conexión)
+RETCODES_REINTENTO = {10004, 10006, 10012, 10020, 10021, 10024, 10031}
+# Modo de relleno no admitido por el símbolo
+RETCODE_RELLENO_INVALIDO = 10030
+# Pausa entre consultas de tick mientras se espera una cotización nueva
+PAUSA_TICK = 0.001
+
+
+def modos_relleno(simbolo_info):
+    """Modos de relleno admitidos por el símbolo, en orden de preferencia (FOK, IOC y RETURN como último recurso)"""
+    bits = getattr(simbolo_info, 'filling_mode', 0) or 0
+    modos = []
+    if bits & 1:  # SYMBOL_FILLING_FOK
+        modos.append(mt5.ORDER_FILLING_FOK)
+    if bits & 2:  # SYMBOL_FILLING_IOC
+        modos.append(mt5.ORDER_FILLING_IOC)
+    modos.append(mt5.ORDER_FILLING_RETURN)
+    return modos
+
+
+def esperar_tick_nuevo(simbolo, tick_anterior, limite):
+    """
+    Espera un tick distinto de 'tick_anterior' (por time_msc) sin pasar del instante 'limite' (perf_counter).
+    Returns:
+        El tick nuevo o None si se agota el plazo
+    """
+    anterior = tick_anterior.time_msc if tick_anterior is not None else None
+    while time.perf_counter() < limite:
+        tick = mt5.symbol_info_tick(simbolo)
+        if tick is not None and tick.time_msc != anterior:
+            return tick
+        time.sleep(PAUSA_TICK)
+    return None
+
+
+def enviar_orden_rapida(simbolo, simbolo_info, order_type, tipo_operacion, precio_sl, precio_tp,
+                        balance_cuenta, porcentaje_riesgo, apalancamiento, plazo_ms, detectada=None):
+    """
+    Envía una orden de mercado con la mínima latencia:
+    - lote y metadatos del símbolo calculados una sola vez por señal
+    - order_check solo cuando cambia la solicitud (sin contar el precio)
+    - reintentos al llegar un tick nuevo en lugar de pausas fijas
+    - recorre los modos de relleno admitidos por el símbolo
+    - la señal caduca al superar plazo_ms desde 'detectada' (time.time() de la señal; si falta, desde ahora)
+    
+    Returns:
+        Resultado de order_send o None si falla o caduca
+    """
+    inicio = time.perf_counter()
+    # El plazo cuenta desde la detección: en modo secuencial cada cuenta hereda lo que ya consumieron las anteriores
+    transcurrido = max(0.0, time.time() - detectada) if detectada is not None else 0.0
+    limite = inicio + plazo_ms / 1000 - transcurrido
+    if transcurrido * 1000 >= plazo_ms:
+        print(f"   ⌛ Señal caducada: detectada hace {transcurrido * 1000:.0f} ms (plazo {plazo_ms} ms)")
+        return None
+    compra = tipo_operacion == "COMPRA"
+    modos = modos_relleno(simbolo_info)
+    modo = 0
+    volumen = None
+    clave_validada = None
+    intento = 0
+    tick = mt5.symbol_info_tick(simbolo)
+    
+    while True:
+        if tick is None:
+            print(f"   ⌛ Señal caducada: plazo de {plazo_ms} ms agotado ({intento} envíos)")
+            return None
+        
+        precio = tick.ask if compra else tick.bid
+        # SL/TP del lado correcto del precio; si no, esperar la siguiente cotización
+        if (compra and not precio_sl < precio < precio_tp) or (not compra and not precio_tp < precio < precio_sl):
+            tick = esperar_tick_nuevo(simbolo, tick, limite)
+            continue
+        
+        if volumen is None:
+            volumen = calcular_lote_estandar(simbolo, precio, precio_sl, balance_cuenta, porcentaje_riesgo,
+                                             apalancamiento)
+            if volumen <= 0:
+                print(f"   ❌ Volumen calculado inválido: {volumen}")
+                return None
+        
+        request = {
+            "action": mt5.TRADE_ACTION_DEAL,
+            "symbol": simbolo,
+            "volume": volumen,
+            "type": order_type,
+            "price": precio,
+            "sl": precio_sl,
+            "tp": precio_tp,
+            "deviation": 10,
+            "magic": 234000,
+            "comment": f"Python {tipo_operacion} Risk {porcentaje_riesgo}",
+            "type_time": mt5.ORDER_TIME_GTC,
+            "type_filling": modos[modo],
+        }
+        
+        # El precio cambia con cada tick y lo cubre 'deviation': no obliga a validar de nuevo
+        clave = tuple(valor for campo, valor in request.items() if campo != "price")
+        if clave != clave_validada:
+            validacion = mt5.order_check(request)
+            if validacion is None:
+                print(f"   ❌ Validación fallida. Último error: {mt5.last_error()}")
+                tick = esperar_tick_nuevo(simbolo, tick, limite)
+                continue
+            if validacion.retcode == RETCODE_RELLENO_INVALIDO and modo + 1 < len(modos):
+                modo += 1
+                continue
+            clave_validada = clave
+        
+        intento += 1
+        resultado = mt5.order_send(request)
+        if resultado is not None and resultado.retcode == mt5.TRADE_RETCODE_DONE:
+            print(f"\n⚡ Operación ejecutada en {(time.perf_counter() - inicio) * 1000:.1f} ms "
+                  f"(envío #{intento}) - Ticket {resultado.order}")
+            print(f"   Volumen: {resultado.volume} | Precio: {resultado.price:.5f} | "
+                  f"SL: {precio_sl:.5f} | TP: {precio_tp:.5f}")
+            return resultado
+        
+        if resultado is None:
+            print(f"   ❌ Envío #{intento} sin respuesta: {mt5.last_error()}")
+        else:
+            print(f"   ❌ Envío #{intento}: {resultado.retcode} - {obtener_mensaje_error(resultado.retcode)}")
+            if resultado.retcode == RETCODE_RELLENO_INVALIDO and modo + 1 < len(modos):
+                modo += 1
+                continue
+            if resultado.retcode not in RETCODES_REINTENTO:
+                return None
+        
+        tick = esperar_tick_nuevo(simbolo, tick, limite)
+
+
 def abrir_operacion_mercado(servidor, numero_cuenta, contraseña, simbolo, 
                            balance_cuenta, precio_sl, precio_tp, 
-                           tipo_operacion, porcentaje_riesgo=2.0, max_reintentos=1000):
+                           tipo_operacion, porcentaje_riesgo=2.0, max_reintentos=1000, rapida=None,
+                           detectada=None):
     """
     Conecta a una cuenta y abre una operación calculando volumen automáticamente
     con reintentos infinitos hasta que se ejecute o se alcance el máximo.
+    En modo rápido (config.EJECUCION_RAPIDA) reintenta por tick hasta config.PLAZO_ORDEN_MS.
     
     Args:
         servidor: Servidor de la cuenta (ej: 'ICMarkets-Demo')
@@ -142,12 +256,14 @@ def abrir_operacion_mercado(servidor, numero_cuenta, contraseña, simbolo,
         tipo_operacion: "COMPRA" o "VENTA"
         porcentaje_riesgo: Porcentaje a arriesgar (default: 2%)
         max_reintentos: Máximo número de reintentos (default: 1000)
+        rapida: Usar el modo rápido (None = config.EJECUCION_RAPIDA)
+        detectada: time.time() de la detección de la señal; el plazo del modo rápido cuenta desde ahí
     
     Returns:
         Resultado de la operación o None si hay error
     """
-    limpiar_conexiones_mt5()
-    print(f"\n🔗 Conectando a cuenta {numero_cuenta}@{servidor}...")
+    # Antes de operar siempre se valida la salud de la sesión
+    sesion.invalidar()
     
     # Conectar a la cuenta específica
     if not conectar_mt5(servidor, numero_cuenta, contraseña):
@@ -196,6 +312,11 @@ def abrir_operacion_mercado(servidor, numero_cuenta, contraseña, simbolo,
         print("❌ Tipo de operación no válido. Use 'COMPRA' o 'VENTA'")
         return None
     
+    if config.EJECUCION_RAPIDA if rapida is None else rapida:
+        return enviar_orden_rapida(simbolo, simbolo_info, order_type, tipo_operacion, precio_sl, precio_tp,
+                                   balance_cuenta, porcentaje_riesgo, apalancamiento, config.PLAZO_ORDEN_MS,
+                                   detectada=detectada)
+    
     # Variables para reintentos
     intento = 0
     resultado = None
@@ -389,10 +510,52 @@ def obtener_operaciones_abiertas():
         })
     return operaciones
 
+def obtener_operaciones_cerradas(desde, hasta=None, magic=234000):
+    """
+    Operaciones del bot cerradas en [desde, hasta] (timestamps), en orden de cierre.
+    Cada cierre (deal de salida) se devuelve con su resultado neto y la razón de salida.
+    """
+    hasta = hasta if hasta is not None else time.time() + 86400
+    deals = mt5.history_deals_get(int(desde), int(hasta))
+    if deals is None or len(deals) == 0:
+        return []
+    
+    operaciones = []
+    for deal in sorted(deals, key=lambda d: (d.time_msc, d.ticket)):
+        if deal.entry not in (mt5.DEAL_ENTRY_OUT, mt5.DEAL_ENTRY_OUT_BY) or deal.magic != magic:
+            continue
+        # El deal de salida va en sentido contrario a la posición
+        direccion = 'BUY' if deal.type == mt5.DEAL_TYPE_SELL else 'SELL'
+        if deal.reason == mt5.DEAL_REASON_SL:
+            razon = 'SL'
+        elif deal.reason == mt5.DEAL_REASON_TP:
+            razon = 'TP'
+        else:
+            razon = 'OTRO'
+        
+        pnl_pips = 0.0
+        entradas = mt5.history_deals_get(position=deal.position_id)
+        entrada = next((d for d in entradas or () if d.entry == mt5.DEAL_ENTRY_IN), None)
+        if entrada is not None:
+            signo = 1 if direccion == 'BUY' else -1
+            pnl_pips = round((deal.price - entrada.price) * signo * registro_simbolos.multiplicador_pips(deal.symbol), 2)
+        
+        operaciones.append({
+            'ticket': deal.ticket,
+            'posicion': deal.position_id,
+            'simbolo': deal.symbol,
+            'tiempo': deal.time,
+            'direccion': direccion,
+            'razon_salida': razon,
+            'pnl': deal.profit + deal.commission + deal.swap + getattr(deal, 'fee', 0.0),
+            'pnl_pips': pnl_pips,
+        })
+    return operaciones
+
 def limpiar_conexiones_mt5():
     """Limpia todas las conexiones MT5 existentes"""
     try:
-        mt5.shutdown()
+        sesion.cerrar()
         print("🔄 Conexiones MT5 limpiadas")
         return True
     except:
@@ -400,16 +563,7 @@ def limpiar_conexiones_mt5():
     
 def calcular_pips(simbolo, precio1, precio2):
     """Calcula la diferencia en pips entre dos precios"""
-    simbolo_upper = simbolo.upper()
-    if "JPY" in simbolo_upper:
-        multiplicador = 100
-    elif "XAU" in simbolo_upper or "XAG" in simbolo_upper:
-        multiplicador = 10
-    elif "BTC" in simbolo_upper or "ETH" in simbolo_upper:
-        multiplicador = 1
-    else:
-        multiplicador = 10000
-    return round(abs(precio1 - precio2) * multiplicador, 2)
+    return round(abs(precio1 - precio2) * registro_simbolos.multiplicador_pips(simbolo), 2)
 
 
 
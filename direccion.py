@@ -3,82 +3,113 @@ MÓDULO DE DIRECCIÓN (1H) - VENTANA DESLIZANTE
 """
 import time
 from datetime import datetime
-from data_metatrader5 import obtener_velas_mt5
+from cache_velas import cache_velas
+from data_metatrader5 import conectar_mt5
 from config import direccion_global, PARES, actualizar_direccion_global, CUENTA_PRINCIPAL
 from notificacion import notificar_direccion
+from patrones import SeguidorDireccion, NOMBRES_DIRECCION, SIN_DIRECCION, DIRECCION_A_CODIGO
+
+# Seguidores incrementales por (par, temporalidad)
+seguidores = {}
+# Tiempos por etapa de la última verificación
+tiempos_etapas = {}
+
+
+def procesar_cambio_direccion(evento):
+    """Consume un evento de cambio de dirección: actualiza la dirección global y notifica"""
+    par = evento['par']
+    direccion = evento['direccion']
+    if actualizar_direccion_global(par, direccion, evento['temporalidad']):
+        notificar_direccion(par, direccion, evento['vela'])
+        print(f"  ✅ {par}: {direccion} - Guardado en archivo")
+        return True
+    print(f"  ⚠️  {par}: {direccion} - Error guardando")
+    return False
+
+
+def obtener_seguidor(par, temporalidad):
+    """Seguidor del par; se reinicia si la caché resembró el buffer (hueco o revisión)"""
+    clave = (par, temporalidad)
+    generacion = cache_velas.generacion(par, temporalidad)
+    entrada = seguidores.get(clave)
+    if entrada is None or entrada[1] != generacion:
+        inicial = DIRECCION_A_CODIGO.get(direccion_global.get(par), SIN_DIRECCION)
+        entrada = (SeguidorDireccion(inicial), generacion)
+        seguidores[clave] = entrada
+    return entrada[0]
+
 
 def verificar_direccion(temporalidad):
-    """Verifica dirección cada 1 hora con ventana deslizante de 3 velas"""
+    """
+    Verifica dirección con ventana deslizante de 3 velas.
+    Las velas de todos los pares se obtienen en una sola pasada por la sesión (LoteVelas);
+    solo las velas cerradas nuevas se evalúan (O(1) por vela) y el reescaneo completo
+    se hace en el arranque en frío o tras un hueco en los datos.
+    """
     print(f"\n[{datetime.now().strftime('%H:%M:%S')}] 🔍 Revisando dirección {temporalidad} (Ventana: 3 velas)")
     
-    for par in PARES:
+    if not conectar_mt5(CUENTA_PRINCIPAL['servidor'], CUENTA_PRINCIPAL['numero_cuenta'], CUENTA_PRINCIPAL['contraseña']):
+        print(f"  ❌ Error conectando a cuenta {CUENTA_PRINCIPAL['numero_cuenta']}")
+        return
+    
+    # Adquisición: 50 velas de cada par para asegurar la ventana deslizante
+    lote = cache_velas.obtener_lote(PARES, temporalidad, 50)
+    for par, error in lote.errores.items():
+        print(f"  ❌ Error {par}: {error}")
+    
+    # Análisis (sin la vela en formación)
+    inicio = time.perf_counter()
+    eventos = []
+    for i, par in enumerate(lote.pares):
+        if par in lote.errores:
+            continue
+        if lote.longitudes[i] < 4:
+            print(f"  ⚠️  {par}: Datos insuficientes")
+            continue
         try:
-            # Obtener más datos para asegurar ventana deslizante
-            data = obtener_velas_mt5(par,temporalidad, 50, CUENTA_PRINCIPAL['numero_cuenta'], CUENTA_PRINCIPAL['servidor'], CUENTA_PRINCIPAL['contraseña'])  # Más datos para analizar
-            df = data[0]
-            
-            if df is None or len(df) < 3:
-                print(f"  ⚠️  {par}: Datos insuficientes")
-                continue
-            
-            # Buscar dirección desde la vela más reciente hacia atrás
-            direccion_encontrada = None
+            cerradas = lote.rates[i][:-1]
+            seguidor = obtener_seguidor(par, temporalidad)
+            _, reescaneado = seguidor.alimentar(cerradas)
+            direccion_encontrada = NOMBRES_DIRECCION[seguidor.direccion]
             
-            # Iterar desde la vela más reciente hacia atrás
-            for i in range(len(df) - 2):  # -2 porque necesitamos al menos 3 velas
-                # Obtener ventana de 3 velas: i (más reciente), i+1, i+2 (más antigua)
-                vela_actual = df.iloc[i]
-                vela_anterior1 = df.iloc[i + 1]
-                vela_anterior2 = df.iloc[i + 2]
-                
-                # Determinar dirección de la vela actual
-                es_alcista = vela_actual['close'] > vela_actual['open']
-                es_bajista = vela_actual['close'] < vela_actual['open']
-                
-                # Calcular máximos y mínimos de las velas anteriores
-                max_anterior = max(vela_anterior1['high'], vela_anterior2['high'])
-                min_anterior = min(vela_anterior1['low'], vela_anterior2['low'])
-                
-                # Verificar condiciones de dirección
-                if es_alcista and vela_actual['close'] >= max_anterior:
-                    direccion_encontrada = "LONG"
-                    break  # Salir al encontrar primera dirección
-                    
-                elif es_bajista and vela_actual['close'] <= min_anterior:
-                    direccion_encontrada = "SHORT"
-                    break  # Salir al encontrar primera dirección
-            
-            # Si no se encontró dirección en ninguna ventana
             if direccion_encontrada is None:
                 print(f"  ⚪ {par}: Sin dirección clara")
                 continue
             
             # Obtener dirección actual desde la variable global
-            direccion_actual = direccion_global.get(par)
-            
-            # Actualizar si hay cambio o si no hay dirección previa
-            if direccion_encontrada and direccion_actual != direccion_encontrada:
-                # Obtener vela actual para notificación
-                vela_actual = df.iloc[0]
-                
-                # Actualizar dirección global y guardar en archivo
-                if actualizar_direccion_global(par, direccion_encontrada):
-                    notificar_direccion(par, direccion_encontrada, {
-                        'close': vela_actual['close'],
-                        'open': vela_actual['open'],
-                        'high': vela_actual['high'],
-                        'low': vela_actual['low'],
+            if direccion_global.get(par) != direccion_encontrada:
+                vela_actual = cerradas[-1]
+                eventos.append({
+                    'par': par,
+                    'temporalidad': temporalidad,
+                    'direccion': direccion_encontrada,
+                    'reescaneado': reescaneado,
+                    'vela': {
+                        'close': float(vela_actual['close']),
+                        'open': float(vela_actual['open']),
+                        'high': float(vela_actual['high']),
+                        'low': float(vela_actual['low']),
                         'ventana_velas': 3,
-                        'posicion_ventana': i,  # Posición donde se encontró la dirección
                         'timestamp': datetime.now().isoformat()
-                    })
-                    print(f"  ✅ {par}: {direccion_encontrada} (en ventana {i}) - Guardado en archivo")
-                else:
-                    print(f"  ⚠️  {par}: {direccion_encontrada} (en ventana {i}) - Error guardando")
-            elif direccion_actual == direccion_encontrada:
+                    }
+                })
+            else:
                 print(f"  🔄 {par}: Mantiene {direccion_encontrada}")
                 
         except Exception as e:
             print(f"  ❌ Error {par}: {e}")
             import traceback
-            traceback.print_exc()
\ No newline at end of file
+            traceback.print_exc()
+    analisis_ms = (time.perf_counter() - inicio) * 1000
+    
+    # Persistencia y notificación de los cambios
+    inicio = time.perf_counter()
+    for evento in eventos:
+        try:
+            procesar_cambio_direccion(evento)
+        except Exception as e:
+            print(f"  ❌ Error {evento['par']}: {e}")
+    cambios_ms = (time.perf_counter() - inicio) * 1000
+    
+    tiempos_etapas.update(lote.informe_etapas(analisis_ms, cambios_ms, len(eventos)))
+
@@ -0,0 +1,170 @@
+"""
+EJECUCIÓN PARALELA MULTI-CUENTA - UN PROCESO (Y TERMINAL MT5) POR CUENTA
+"""
+import time
+import queue
+import multiprocessing as mp
+
+# Espera máxima por los resultados de todas las cuentas
+TIMEOUT_RESULTADOS = 120
+# Espera máxima a que un trabajador quede conectado al arrancar
+TIMEOUT_ARRANQUE = 60
+
+
+def _resultado_a_dict(resultado):
+    """El resultado de order_send no siempre es serializable entre procesos"""
+    if not resultado:
+        return {'exito': False}
+    return {
+        'exito': True,
+        'ticket': resultado.order,
+        'volumen': resultado.volume,
+        'precio_ejecutado': resultado.price,
+    }
+
+
+def _bucle_trabajador(cuenta, porcentaje_riesgo, cola_señales, cola_resultados):
+    """
+    Proceso de una cuenta: mantiene su propia sesión MT5 (terminal propio)
+    y ejecuta cada señal recibida por la cola.
+    """
+    # Importar dentro del proceso hijo: cada uno tiene su propio módulo MT5 y su propia sesión
+    from sesion_mt5 import sesion
+    from data_metatrader5 import abrir_operacion_mercado
+
+    nombre = cuenta.get('nombre', f"Cuenta {cuenta['numero_cuenta']}")
+    sesion.ruta_terminal = cuenta.get('terminal')
+    conectado = sesion.asegurar_cuenta(cuenta)
+    cola_resultados.put({'tipo': 'arranque', 'cuenta': nombre, 'conectado': conectado})
+
+    while True:
+        mensaje = cola_señales.get()
+        if mensaje is None:
+            break
+
+        señal = mensaje['señal']
+        inicio = time.perf_counter()
+        try:
+            resultado = abrir_operacion_mercado(
+                servidor=cuenta['servidor'],
+                numero_cuenta=cuenta['numero_cuenta'],
+                contraseña=cuenta['contraseña'],
+                simbolo=señal['par'],
+                balance_cuenta=cuenta.get('balance', 0),
+                precio_sl=señal['sl'],
+                precio_tp=señal['tp'],
+                tipo_operacion="COMPRA" if "LONG" in señal['tipo'] else "VENTA",
+                porcentaje_riesgo=porcentaje_riesgo,
+                detectada=señal.get('detectada'),
+            )
+            datos = _resultado_a_dict(resultado)
+        except Exception as e:
+            datos = {'exito': False, 'error': str(e)}
+
+        datos.update({
+            'tipo': 'resultado',
+            'id': mensaje['id'],
+            'cuenta': nombre,
+            'par': señal['par'],
+            'duracion_ms': (time.perf_counter() - inicio) * 1000,
+            # Latencia desde el envío de la señal hasta la ejecución (reloj de pared, común a procesos)
+            'latencia_ms': (time.time() - mensaje['enviado']) * 1000,
+        })
+        cola_resultados.put(datos)
+
+    sesion.cerrar()
+
+
+class EjecutorMultiCuenta:
+    """Reparte cada señal a un trabajador por cuenta para que todas operen a la vez"""
+
+    def __init__(self, cuentas, porcentaje_riesgo):
+        self.cuentas = cuentas
+        self.porcentaje_riesgo = porcentaje_riesgo
+        self._contexto = mp.get_context('spawn')
+        self._cola_resultados = self._contexto.Queue()
+        self._trabajadores = {}
+        self._siguiente_id = 0
+
+    @staticmethod
+    def _nombre(cuenta):
+        return cuenta.get('nombre', f"Cuenta {cuenta['numero_cuenta']}")
+
+    def iniciar(self):
+        """Arranca un proceso por cuenta y espera a que cada uno conecte"""
+        for cuenta in self.cuentas:
+            cola = self._contexto.Queue()
+            proceso = self._contexto.Process(
+                target=_bucle_trabajador,
+                args=(cuenta, self.porcentaje_riesgo, cola, self._cola_resultados),
+                name=f"mt5-{cuenta['numero_cuenta']}",
+                daemon=True,
+            )
+            proceso.start()
+            self._trabajadores[self._nombre(cuenta)] = (proceso, cola)
+
+        pendientes = set(self._trabajadores)
+        limite = time.monotonic() + TIMEOUT_ARRANQUE
+        while pendientes and time.monotonic() < limite:
+            try:
+                mensaje = self._cola_resultados.get(timeout=max(0.1, limite - time.monotonic()))
+            except queue.Empty:
+                break
+            if mensaje.get('tipo') == 'arranque':
+                pendientes.discard(mensaje['cuenta'])
+                estado = "✅ conectado" if mensaje['conectado'] else "❌ sin conexión"
+                print(f"   🧵 Trabajador {mensaje['cuenta']}: {estado}")
+        for nombre in pendientes:
+            print(f"   ⚠️  Trabajador {nombre}: sin respuesta al arrancar")
+        return not pendientes
+
+    def ejecutar(self, señal, timeout=TIMEOUT_RESULTADOS):
+        """
+        Envía la señal a todas las cuentas a la vez y agrega los resultados.
+
+        Returns:
+            dict {nombre_cuenta: resultado} con latencia por cuenta
+        """
+        self._siguiente_id += 1
+        id_señal = self._siguiente_id
+        mensaje = {'id': id_señal, 'señal': dict(señal), 'enviado': time.time()}
+        for _, cola in self._trabajadores.values():
+            cola.put(mensaje)
+
+        resultados = {}
+        limite = time.monotonic() + timeout
+        while len(resultados) < len(self._trabajadores):
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                datos = self._cola_resultados.get(timeout=restante)
+            except queue.Empty:
+                break
+            if datos.get('tipo') != 'resultado' or datos['id'] != id_señal:
+                continue
+            resultados[datos['cuenta']] = datos
+
+        for nombre in self._trabajadores:
+            if nombre not in resultados:
+                resultados[nombre] = {'exito': False, 'timeout': True}
+        return resultados
+
+    def detener(self, timeout=10):
+        """Cierra los trabajadores"""
+        for _, cola in self._trabajadores.values():
+            cola.put(None)
+        for proceso, _ in self._trabajadores.values():
+            proceso.join(timeout)
+            if proceso.is_alive():
+                proceso.terminate()
+        self._trabajadores.clear()
+
+    @staticmethod
+    def mostrar_latencias(resultados):
+        """Imprime la latencia de ejecución por cuenta"""
+        for nombre, datos in resultados.items():
+            if 'latencia_ms' in datos:
+                print(f"     {nombre}: {datos['latencia_ms']:.0f} ms hasta ejecución ({datos['duracion_ms']:.0f} ms en orden)")
+            else:
+                print(f"     {nombre}: sin resultado")
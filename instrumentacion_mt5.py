@@ -0,0 +1,242 @@
+"""
+INSTRUMENTACIÓN DE LLAMADAS A MT5
+Proxy transparente sobre el módulo MetaTrader5: cuenta llamadas, mide latencias (histograma),
+registra los códigos de last_error() y detecta llamadas idénticas repetidas dentro de un ciclo.
+Se activa con la variable de entorno INSTRUMENTAR_MT5=1; desactivado, 'mt5' es el módulo real.
+"""
+import os
+import json
+import time
+import bisect
+import threading
+from datetime import datetime
+
+import MetaTrader5
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ACTIVA = os.getenv('INSTRUMENTAR_MT5', '').strip().lower() in ('1', 'true', 'si', 'sí')
+# Volcado de cada ciclo (una línea JSON por ciclo); vacío = no volcar
+ARCHIVO_CICLOS = os.getenv('INSTRUMENTAR_MT5_ARCHIVO', 'instrumentacion_mt5.jsonl')
+
+# Límites superiores (ms) de los cubos del histograma; el último cubo recoge el resto
+LIMITES_HISTOGRAMA_MS = (0.1, 0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# Funciones que no se instrumentan (last_error la usa el propio proxy)
+NO_INSTRUMENTADAS = {'last_error'}
+
+
+def _firma(valor):
+    """Clave hashable de los argumentos de una llamada (los dicts de order_send/order_check incluidos)"""
+    if isinstance(valor, dict):
+        return tuple(sorted((k, _firma(v)) for k, v in valor.items()))
+    if isinstance(valor, (list, tuple)):
+        return tuple(_firma(v) for v in valor)
+    try:
+        hash(valor)
+        return valor
+    except TypeError:
+        return repr(valor)
+
+
+class _EstadisticaLlamada:
+    """Contador, tiempo acumulado e histograma de latencias de una función de MT5"""
+
+    __slots__ = ('llamadas', 'fallos', 'tiempo', 'maximo', 'histograma')
+
+    def __init__(self):
+        self.llamadas = 0
+        self.fallos = 0
+        self.tiempo = 0.0
+        self.maximo = 0.0
+        self.histograma = [0] * (len(LIMITES_HISTOGRAMA_MS) + 1)
+
+    def registrar(self, duracion_ms, fallo):
+        self.llamadas += 1
+        self.fallos += fallo
+        self.tiempo += duracion_ms
+        if duracion_ms > self.maximo:
+            self.maximo = duracion_ms
+        self.histograma[bisect.bisect_left(LIMITES_HISTOGRAMA_MS, duracion_ms)] += 1
+
+    def percentil(self, p):
+        """Límite superior del cubo que contiene el percentil p (aproximado por el histograma)"""
+        objetivo = self.llamadas * p / 100
+        acumulado = 0
+        for i, cantidad in enumerate(self.histograma):
+            acumulado += cantidad
+            if cantidad and acumulado >= objetivo:
+                return LIMITES_HISTOGRAMA_MS[i] if i < len(LIMITES_HISTOGRAMA_MS) else round(self.maximo, 3)
+        return 0.0
+
+    def a_dict(self):
+        histograma = {}
+        for i, cantidad in enumerate(self.histograma):
+            if cantidad:
+                etiqueta = f"<={LIMITES_HISTOGRAMA_MS[i]:g}ms" if i < len(LIMITES_HISTOGRAMA_MS) \
+                    else f">{LIMITES_HISTOGRAMA_MS[-1]:g}ms"
+                histograma[etiqueta] = cantidad
+        return {
+            'llamadas': self.llamadas,
+            'fallos': self.fallos,
+            'tiempo_ms': round(self.tiempo, 3),
+            'media_ms': round(self.tiempo / self.llamadas, 3) if self.llamadas else 0.0,
+            'p50_ms': self.percentil(50),
+            'p95_ms': self.percentil(95),
+            'max_ms': round(self.maximo, 3),
+            'histograma': histograma,
+        }
+
+
+class ProxyMT5:
+    """Se usa como el módulo MetaTrader5; las funciones se envuelven la primera vez que se piden"""
+
+    def __init__(self, modulo, archivo_ciclos=ARCHIVO_CICLOS):
+        self._modulo = modulo
+        self._lock = threading.Lock()
+        self._archivo_ciclos = archivo_ciclos
+        self._inicio = time.time()
+        self._total = {}
+        self._errores = {}
+        self._ciclos = 0
+        self._redundantes_total = 0
+        self._reiniciar_ciclo()
+
+    def _reiniciar_ciclo(self):
+        self._ciclo = {}
+        self._firmas_ciclo = {}
+        self._errores_ciclo = {}
+        self._inicio_ciclo = time.perf_counter()
+
+    def __getattr__(self, nombre):
+        # Solo se llega aquí la primera vez: el resultado queda como atributo del proxy
+        if nombre.startswith('_'):
+            raise AttributeError(nombre)
+        valor = getattr(self._modulo, nombre)
+        if callable(valor) and not isinstance(valor, type) and nombre not in NO_INSTRUMENTADAS:
+            valor = self._envolver(nombre, valor)
+        self.__dict__[nombre] = valor
+        return valor
+
+    def _envolver(self, nombre, funcion):
+        def llamada(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                resultado = funcion(*args, **kwargs)
+            except Exception as e:
+                self._registrar(nombre, (time.perf_counter() - inicio) * 1000, args, kwargs, ('excepcion', type(e).__name__))
+                raise
+            duracion_ms = (time.perf_counter() - inicio) * 1000
+
+            error = None
+            if resultado is None or resultado is False:
+                error = self._modulo.last_error()
+            elif nombre == 'order_send' and resultado.retcode != self._modulo.TRADE_RETCODE_DONE:
+                error = (resultado.retcode, resultado.comment)
+            self._registrar(nombre, duracion_ms, args, kwargs, error)
+            return resultado
+
+        llamada.__name__ = nombre
+        llamada.__doc__ = getattr(funcion, '__doc__', None)
+        return llamada
+
+    def _registrar(self, nombre, duracion_ms, args, kwargs, error):
+        firma = (nombre, _firma(args), _firma(kwargs))
+        with self._lock:
+            fallo = error is not None
+            for estadisticas in (self._total, self._ciclo):
+                estadistica = estadisticas.get(nombre)
+                if estadistica is None:
+                    estadistica = estadisticas[nombre] = _EstadisticaLlamada()
+                estadistica.registrar(duracion_ms, fallo)
+            self._firmas_ciclo[firma] = self._firmas_ciclo.get(firma, 0) + 1
+            if fallo:
+                clave = f"{nombre}: {error[0]} {error[1]}" if isinstance(error, tuple) else f"{nombre}: {error}"
+                self._errores[clave] = self._errores.get(clave, 0) + 1
+                self._errores_ciclo[clave] = self._errores_ciclo.get(clave, 0) + 1
+
+    # ---------------- Ciclos ----------------
+
+    def cerrar_ciclo(self, etiqueta=None):
+        """
+        Cierra el ciclo actual (llamadas desde el anterior cierre), lo vuelca al archivo de ciclos
+        y empieza uno nuevo.
+        Returns:
+            dict con las llamadas, tiempo y redundancias del ciclo
+        """
+        with self._lock:
+            redundantes = {}
+            for (nombre, _, _), cantidad in self._firmas_ciclo.items():
+                if cantidad > 1:
+                    redundantes[nombre] = redundantes.get(nombre, 0) + cantidad - 1
+            ciclo = {
+                'fecha': datetime.now().isoformat(timespec='seconds'),
+                'etiqueta': etiqueta,
+                'duracion_ms': round((time.perf_counter() - self._inicio_ciclo) * 1000, 3),
+                'llamadas': sum(e.llamadas for e in self._ciclo.values()),
+                'tiempo_mt5_ms': round(sum(e.tiempo for e in self._ciclo.values()), 3),
+                'redundantes': sum(redundantes.values()),
+                'por_funcion': {nombre: e.a_dict() for nombre, e in sorted(self._ciclo.items())},
+                'redundantes_por_funcion': redundantes,
+                'errores': dict(self._errores_ciclo),
+            }
+            self._ciclos += 1
+            self._redundantes_total += ciclo['redundantes']
+            self._reiniciar_ciclo()
+
+        if self._archivo_ciclos:
+            try:
+                with open(self._archivo_ciclos, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(ciclo, ensure_ascii=False) + "\n")
+            except OSError as e:
+                print(f"⚠️  No se pudo volcar el ciclo de MT5: {e}")
+        return ciclo
+
+    # ---------------- Resumen ----------------
+
+    def estadisticas(self):
+        """Totales desde el arranque por función de MT5"""
+        with self._lock:
+            return {
+                'segundos_activa': round(time.time() - self._inicio, 1),
+                'ciclos': self._ciclos,
+                'llamadas': sum(e.llamadas for e in self._total.values()),
+                'tiempo_mt5_ms': round(sum(e.tiempo for e in self._total.values()), 3),
+                'redundantes': self._redundantes_total,
+                'por_funcion': {nombre: e.a_dict() for nombre, e in sorted(self._total.items())},
+                'errores': dict(self._errores),
+            }
+
+    def mostrar_estadisticas(self):
+        """Imprime un resumen de las llamadas a MT5"""
+        stats = self.estadisticas()
+        print("\n📊 Llamadas a MT5:")
+        print(f"   Total: {stats['llamadas']} en {stats['ciclos']} ciclo(s) | "
+              f"Tiempo en MT5: {stats['tiempo_mt5_ms']:.1f} ms | Redundantes: {stats['redundantes']}")
+        for nombre, e in sorted(stats['por_funcion'].items(), key=lambda x: -x[1]['tiempo_ms']):
+            print(f"   {nombre:<22} {e['llamadas']:>6} llamadas | media {e['media_ms']:>8.3f} ms | "
+                  f"p95 {e['p95_ms']:>8g} ms | max {e['max_ms']:>8.3f} ms | fallos {e['fallos']}")
+        for clave, cantidad in stats['errores'].items():
+            print(f"   ❌ {clave} (x{cantidad})")
+
+
+def instrumentar(modulo, archivo_ciclos=ARCHIVO_CICLOS):
+    """Envuelve 'modulo' en un ProxyMT5 (para activar la instrumentación desde código)"""
+    return ProxyMT5(modulo, archivo_ciclos=archivo_ciclos)
+
+
+# Módulo compartido por el bot: proxy si la instrumentación está activa, el módulo real si no
+proxy = instrumentar(MetaTrader5) if ACTIVA else None
+mt5 = proxy if proxy is not None else MetaTrader5
+
+
+def cerrar_ciclo(etiqueta=None):
+    """Cierra el ciclo del proxy compartido (None si la instrumentación está desactivada)"""
+    return proxy.cerrar_ciclo(etiqueta) if proxy is not None else None
+
+
+def mostrar_estadisticas():
+    """Imprime el resumen del proxy compartido si la instrumentación está activa"""
+    if proxy is not None:
+        proxy.mostrar_estadisticas()
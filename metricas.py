@@ -0,0 +1,211 @@
+"""
+MÉTRICAS DE RENDIMIENTO EN STREAMING (BACKTEST Y EN VIVO)
+Cada operación cerrada actualiza los acumuladores en O(1); las métricas se derivan al pedirlas.
+"""
+import os
+import json
+import math
+import time
+
+ARCHIVO_METRICAS = "metricas_vivo.json"
+
+
+class _Grupo:
+    """Contadores de un subconjunto de operaciones (por dirección o razón de salida)"""
+
+    __slots__ = ('operaciones', 'ganadoras', 'pnl')
+
+    def __init__(self, operaciones=0, ganadoras=0, pnl=0.0):
+        self.operaciones = operaciones
+        self.ganadoras = ganadoras
+        self.pnl = pnl
+
+    def registrar(self, pnl):
+        self.operaciones += 1
+        self.ganadoras += pnl > 0
+        self.pnl += pnl
+
+    def win_rate(self):
+        return self.ganadoras / self.operaciones * 100 if self.operaciones else 0
+
+    def a_dict(self):
+        return {'operaciones': self.operaciones, 'ganadoras': self.ganadoras, 'pnl': self.pnl}
+
+
+class AcumuladorMetricas:
+    """Win rate, profit factor, drawdown, Sharpe y desgloses actualizados operación a operación"""
+
+    def __init__(self, capital_inicial=10000):
+        self.capital_inicial = capital_inicial
+        self.operaciones = 0
+
+        # Ganadoras / perdedoras
+        self.ganadoras = 0
+        self.perdedoras = 0
+        self.suma_ganancias = 0.0
+        self.suma_perdidas = 0.0
+        self.pips_ganadoras = 0.0
+        self.pips_perdedoras = 0.0
+
+        # Totales
+        self.pnl_total = 0.0
+        self.pips_total = 0.0
+        self.mayor_ganancia = None
+        self.mayor_perdida = None
+        self.velas_total = 0
+        self.operaciones_con_velas = 0
+
+        # Media y varianza del pnl (Welford)
+        self.media_pnl = 0.0
+        self.m2_pnl = 0.0
+
+        # Curva de capital: el máximo se toma sobre el capital tras cada operación
+        self.capital = capital_inicial
+        self.maximo_capital = None
+        self.drawdown_max = 0.0
+
+        self.por_direccion = {}
+        self.por_razon = {}
+        self.ultima_actualizacion = None
+
+    def registrar(self, pnl, pnl_pips=0.0, direccion=None, razon_salida=None, velas_hold=None):
+        """Incorpora una operación cerrada (O(1))"""
+        pnl = float(pnl)
+        pnl_pips = float(pnl_pips)
+        self.operaciones += 1
+        self.pnl_total += pnl
+        self.pips_total += pnl_pips
+
+        if pnl > 0:
+            self.ganadoras += 1
+            self.suma_ganancias += pnl
+            self.pips_ganadoras += pnl_pips
+        elif pnl < 0:
+            self.perdedoras += 1
+            self.suma_perdidas += pnl
+            self.pips_perdedoras += pnl_pips
+
+        self.mayor_ganancia = pnl if self.mayor_ganancia is None else max(self.mayor_ganancia, pnl)
+        self.mayor_perdida = pnl if self.mayor_perdida is None else min(self.mayor_perdida, pnl)
+        if velas_hold is not None:
+            self.velas_total += velas_hold
+            self.operaciones_con_velas += 1
+
+        delta = pnl - self.media_pnl
+        self.media_pnl += delta / self.operaciones
+        self.m2_pnl += delta * (pnl - self.media_pnl)
+
+        self.capital += pnl
+        if self.maximo_capital is None or self.capital > self.maximo_capital:
+            self.maximo_capital = self.capital
+        drawdown = (self.capital - self.maximo_capital) / self.maximo_capital * 100
+        self.drawdown_max = min(self.drawdown_max, drawdown)
+
+        if direccion is not None:
+            self.por_direccion.setdefault(direccion, _Grupo()).registrar(pnl)
+        if razon_salida is not None:
+            self.por_razon.setdefault(razon_salida, _Grupo()).registrar(pnl)
+        self.ultima_actualizacion = time.time()
+
+    def registrar_trades(self, trades):
+        """Una sola pasada sobre un DataFrame de trades del backtest"""
+        columnas = [trades[c].tolist() if c in trades.columns else [None] * len(trades)
+                    for c in ('pnl', 'pnl_pips', 'direccion', 'razon_salida', 'velas_hold')]
+        for pnl, pips, direccion, razon, velas in zip(*columnas):
+            self.registrar(pnl, pips or 0.0, direccion, razon, velas)
+        return self
+
+    # ---------------- Métricas derivadas ----------------
+
+    def desviacion(self):
+        """Desviación estándar muestral del pnl"""
+        return math.sqrt(self.m2_pnl / (self.operaciones - 1)) if self.operaciones > 1 else float('nan')
+
+    def metricas(self):
+        """Mismo diccionario que BacktestEURUSD.calcular_metricas"""
+        n = self.operaciones
+        desviacion = self.desviacion()
+        avg_ganancia = self.suma_ganancias / self.ganadoras if self.ganadoras else 0
+        avg_perdida = self.suma_perdidas / self.perdedoras if self.perdedoras else 0
+        compras = self.por_direccion.get('BUY', _Grupo())
+        ventas = self.por_direccion.get('SELL', _Grupo())
+        tp = self.por_razon.get('TP', _Grupo()).operaciones
+        sl = self.por_razon.get('SL', _Grupo()).operaciones
+        return {
+            'Total Trades': n,
+            'Trades Ganadores': self.ganadoras,
+            'Trades Perdedores': self.perdedoras,
+            '% Win Rate': self.ganadoras / n * 100 if n else 0,
+            'Capital Inicial': self.capital_inicial,
+            'Capital Final': self.capital_inicial + self.pnl_total,
+            'Net Profit': self.pnl_total,
+            'Net Profit %': (self.pnl_total / self.capital_inicial) * 100,
+            'Total Pips': self.pips_total,
+            'Avg Pips por Trade': self.pips_total / n if n else 0,
+            'Avg Pips Ganador': self.pips_ganadoras / self.ganadoras if self.ganadoras else 0,
+            'Avg Pips Perdedor': self.pips_perdedoras / self.perdedoras if self.perdedoras else 0,
+            'Avg Ganancia': avg_ganancia,
+            'Avg Pérdida': avg_perdida,
+            'Ratio Ganancia/Pérdida': abs(avg_ganancia / avg_perdida) if self.perdedoras and avg_perdida != 0 else 0,
+            'Mayor Ganancia': self.mayor_ganancia,
+            'Mayor Pérdida': self.mayor_perdida,
+            'Desviación Estándar': desviacion,
+            'Sharpe Ratio': self.media_pnl / desviacion if desviacion != 0 else 0,
+            'Trades TP': tp,
+            'Trades SL': sl,
+            '% TP': tp / n * 100 if n else 0,
+            'Avg Velas por Trade': self.velas_total / self.operaciones_con_velas if self.operaciones_con_velas else 0,
+            'Buy Trades': compras.operaciones,
+            'Sell Trades': ventas.operaciones,
+            'Buy Win Rate': compras.win_rate(),
+            'Sell Win Rate': ventas.win_rate(),
+            'Drawdown Máximo': self.drawdown_max,
+            'Factor de Beneficio': abs(self.suma_ganancias / self.suma_perdidas) if self.perdedoras and self.suma_perdidas != 0 else 0,
+        }
+
+    # ---------------- Instantáneas ----------------
+
+    def a_dict(self):
+        estado = {k: v for k, v in self.__dict__.items() if k not in ('por_direccion', 'por_razon')}
+        estado['por_direccion'] = {k: g.a_dict() for k, g in self.por_direccion.items()}
+        estado['por_razon'] = {k: g.a_dict() for k, g in self.por_razon.items()}
+        return estado
+
+    @classmethod
+    def desde_dict(cls, estado):
+        acumulador = cls(estado.get('capital_inicial', 10000))
+        for clave, valor in estado.items():
+            if clave in ('por_direccion', 'por_razon'):
+                setattr(acumulador, clave, {k: _Grupo(**g) for k, g in valor.items()})
+            elif hasattr(acumulador, clave):
+                setattr(acumulador, clave, valor)
+        return acumulador
+
+    def guardar(self, ruta=ARCHIVO_METRICAS, **extra):
+        """Escribe la instantánea de forma atómica (extra: datos adicionales del llamador)"""
+        temporal = ruta + ".tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump({**self.a_dict(), 'extra': extra}, f, ensure_ascii=False)
+        os.replace(temporal, ruta)
+
+    @classmethod
+    def cargar(cls, ruta=ARCHIVO_METRICAS, capital_inicial=10000):
+        """Carga la instantánea o crea un acumulador vacío; devuelve (acumulador, extra)"""
+        if not os.path.exists(ruta):
+            return cls(capital_inicial), {}
+        try:
+            with open(ruta, 'r', encoding='utf-8') as f:
+                estado = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"❌ Error cargando métricas: {e}")
+            return cls(capital_inicial), {}
+        extra = estado.pop('extra', {})
+        return cls.desde_dict(estado), extra
+
+    def mostrar(self, titulo="MÉTRICAS"):
+        print("\n" + "=" * 80)
+        print(titulo)
+        print("=" * 80)
+        for k, v in self.metricas().items():
+            print(f"{k}: {v}")
+        print("=" * 80)
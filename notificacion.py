@@ -1,33 +1,281 @@
 """
 MÓDULO DE NOTIFICACIONES SIMPLE
+Los mensajes se encolan en O(1) y un hilo en segundo plano los agrupa y envía a Telegram.
 """
-import requests
+import os
+import re
+import json
 import time
+import atexit
+import threading
+import multiprocessing
+from collections import deque
 from datetime import datetime
+
+import requests
 from config import TELEGRAM_TOKEN, TELEGRAM_CHANNEL, NOMBRE_BOT
 
+URL_TELEGRAM = "https://api.telegram.org"
+# Mensajes no entregados que sobreviven a reinicios
+ARCHIVO_PENDIENTES = "notificaciones_pendientes.jsonl"
+# Segundos que se esperan para agrupar una ráfaga en un solo mensaje
+INTERVALO_AGRUPACION = 1.0
+# Límite de caracteres de un mensaje de Telegram
+MAX_CARACTERES = 4096
+# Reintentos con espera exponencial antes de guardar en disco
+MAX_REINTENTOS = 5
+ESPERA_BASE = 1.0
+ESPERA_MAXIMA = 60.0
+# Pausa mínima entre envíos al mismo chat (Telegram admite ~1 mensaje/s por chat)
+PAUSA_ENTRE_ENVIOS = 1.0
+
+# Etiquetas HTML de los mensajes (para recortar sin dejar etiquetas partidas ni abiertas)
+PATRON_ETIQUETA = re.compile(r'<(/?)([a-zA-Z0-9-]+)[^>]*>')
+SUFIJO_RECORTE = "…"
+
+
+def recortar_html(texto, limite):
+    """Recorta un mensaje HTML a 'limite' caracteres sin cortar etiquetas ni entidades y cerrando las abiertas"""
+    if len(texto) <= limite:
+        return texto
+    corte = limite - len(SUFIJO_RECORTE)
+    while corte > 0:
+        parte = texto[:corte]
+        # No dejar una etiqueta (<b ...) ni una entidad (&amp;) a medias
+        if parte.rfind('<') > parte.rfind('>'):
+            parte = parte[:parte.rfind('<')]
+        if parte.rfind('&') > parte.rfind(';'):
+            parte = parte[:parte.rfind('&')]
+        abiertas = []
+        for m in PATRON_ETIQUETA.finditer(parte):
+            if not m.group(1):
+                abiertas.append(m.group(2))
+            elif abiertas and abiertas[-1] == m.group(2):
+                abiertas.pop()
+        resultado = parte + SUFIJO_RECORTE + ''.join(f"</{etiqueta}>" for etiqueta in reversed(abiertas))
+        if len(resultado) <= limite:
+            return resultado
+        corte -= len(resultado) - limite
+    return ""
+
+
+class NotificadorTelegram:
+    """Cola de mensajes con envío en segundo plano, sesión HTTP reutilizada y respaldo en disco"""
+
+    def __init__(self, token, canal, prefijo="", url_base=URL_TELEGRAM, archivo_pendientes=ARCHIVO_PENDIENTES,
+                 intervalo_agrupacion=INTERVALO_AGRUPACION, timeout=10):
+        self.token = token
+        self.canal = canal
+        self.prefijo = prefijo
+        self.url = f"{url_base}/bot{token}/sendMessage"
+        self.archivo_pendientes = archivo_pendientes
+        self.intervalo_agrupacion = intervalo_agrupacion
+        self.timeout = timeout
+
+        self._cola = deque()
+        self._evento = threading.Event()
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._detener = False
+        self._sesion = requests.Session()
+        self._ultimo_envio = 0.0
+
+        # Estadísticas
+        self.encolados = 0
+        self.enviados = 0
+        self.mensajes_http = 0
+        self.fallidos = 0
+        self.limitados = 0
+
+        self._cargar_pendientes()
+
+    # ---------------- Camino rápido (llamado desde el trading) ----------------
+
+    def encolar(self, texto):
+        """Encola un mensaje sin bloquear (O(1))"""
+        self._cola.append(texto)
+        self.encolados += 1
+        self._evento.set()
+        if self._hilo is None:
+            self.iniciar()
+        return True
+
+    # ---------------- Hilo de envío ----------------
+
+    def iniciar(self):
+        with self._lock:
+            if self._hilo is None:
+                self._detener = False
+                self._hilo = threading.Thread(target=self._bucle, name="notificador-telegram", daemon=True)
+                self._hilo.start()
+
+    def _bucle(self):
+        while not self._detener:
+            self._evento.wait()
+            self._evento.clear()
+            if self._detener:
+                break
+            # Dejar que se acumule la ráfaga
+            time.sleep(self.intervalo_agrupacion)
+            self._vaciar()
+        self._vaciar()
+
+    def _tomar_lote(self):
+        mensajes = []
+        while self._cola:
+            mensajes.append(self._cola.popleft())
+        return mensajes
+
+    def _agrupar(self, mensajes):
+        """
+        Une los mensajes en bloques que respetan el límite de Telegram.
+        Returns: lista de (mensajes del bloque, texto con prefijo)
+        """
+        bloques = []
+        actual = []
+        longitud = 0
+        limite = MAX_CARACTERES - len(self.prefijo)
+        for mensaje in mensajes:
+            mensaje = recortar_html(mensaje, limite)
+            if actual and longitud + 1 + len(mensaje) > limite:
+                bloques.append(actual)
+                actual, longitud = [], 0
+            longitud += len(mensaje) + (1 if actual else 0)
+            actual.append(mensaje)
+        if actual:
+            bloques.append(actual)
+        return [(bloque, self.prefijo + "\n".join(bloque)) for bloque in bloques]
+
+    def _vaciar(self):
+        mensajes = self._tomar_lote()
+        if not mensajes:
+            return
+        bloques = self._agrupar(mensajes)
+        for i, (partes, bloque) in enumerate(bloques):
+            resultado = self._enviar_con_reintentos(bloque)
+            if resultado is None and len(partes) > 1:
+                # Telegram rechaza el bloque (4xx, p. ej. un HTML mal formado): enviar uno a uno
+                # para que un solo mensaje defectuoso no arrastre al resto
+                for j, parte in enumerate(partes):
+                    individual = self._enviar_con_reintentos(self.prefijo + parte)
+                    if individual is None:
+                        self.fallidos += 1
+                    elif not individual:
+                        self._guardar_pendientes([self.prefijo + p for p in partes[j:]] + [b for _, b in bloques[i + 1:]])
+                        self.fallidos += len(partes) - j + sum(len(p) for p, _ in bloques[i + 1:])
+                        return
+                    else:
+                        self.enviados += 1
+            elif resultado is None:
+                # Rechazo definitivo de Telegram (4xx): reintentar no sirve
+                self.fallidos += 1
+            elif not resultado:
+                # Guardar lo no entregado (el resto del lote incluido) para el próximo arranque
+                self._guardar_pendientes([b for _, b in bloques[i:]])
+                self.fallidos += sum(len(p) for p, _ in bloques[i:])
+                return
+            else:
+                self.enviados += len(partes)
+
+    def _enviar_con_reintentos(self, texto):
+        """True si se entregó, False si se agotaron los reintentos, None si Telegram lo rechaza"""
+        espera = ESPERA_BASE
+        for _ in range(MAX_REINTENTOS):
+            pausa = PAUSA_ENTRE_ENVIOS - (time.monotonic() - self._ultimo_envio)
+            if pausa > 0:
+                time.sleep(pausa)
+
+            datos = {"chat_id": self.canal, "text": texto, "parse_mode": "HTML"}
+            try:
+                respuesta = self._sesion.post(self.url, json=datos, timeout=self.timeout)
+                self._ultimo_envio = time.monotonic()
+                self.mensajes_http += 1
+                if respuesta.status_code == 200:
+                    return True
+                if respuesta.status_code == 429:
+                    # Telegram indica cuánto esperar
+                    self.limitados += 1
+                    try:
+                        espera = float(respuesta.json().get('parameters', {}).get('retry_after', espera))
+                    except ValueError:
+                        pass
+                elif 400 <= respuesta.status_code < 500:
+                    print(respuesta)
+                    return None
+            except Exception as e:
+                print(e)
+            time.sleep(min(espera, ESPERA_MAXIMA))
+            espera = min(espera * 2, ESPERA_MAXIMA)
+        return False
+
+    # ---------------- Respaldo en disco ----------------
+
+    def _guardar_pendientes(self, textos):
+        try:
+            with open(self.archivo_pendientes, 'a', encoding='utf-8') as f:
+                for texto in textos:
+                    f.write(json.dumps({'texto': texto, 'hora': datetime.now().isoformat()}, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        except Exception as e:
+            print(f"❌ Error guardando notificaciones pendientes: {e}")
+
+    def _cargar_pendientes(self):
+        """Reencola los mensajes que quedaron sin entregar (ya llevan el prefijo)"""
+        if not self.archivo_pendientes or not os.path.exists(self.archivo_pendientes):
+            return
+        try:
+            with open(self.archivo_pendientes, 'r', encoding='utf-8') as f:
+                textos = [json.loads(linea)['texto'] for linea in f if linea.strip()]
+            os.remove(self.archivo_pendientes)
+        except Exception as e:
+            print(f"❌ Error cargando notificaciones pendientes: {e}")
+            return
+        prefijo = self.prefijo
+        for texto in textos:
+            self._cola.append(texto[len(prefijo):] if prefijo and texto.startswith(prefijo) else texto)
+        if textos:
+            print(f"📨 {len(textos)} notificaciones pendientes recuperadas")
+            self._evento.set()
+            self.iniciar()
+
+    def detener(self, timeout=30):
+        """Envía lo pendiente y detiene el hilo; lo que no se entregue queda en disco"""
+        with self._lock:
+            hilo = self._hilo
+            self._detener = True
+            self._evento.set()
+        if hilo is not None:
+            hilo.join(timeout)
+        if self._cola:
+            self._guardar_pendientes([self.prefijo + texto for texto in self._tomar_lote()])
+        self._hilo = None
+
+    def estadisticas(self):
+        return {
+            'encolados': self.encolados,
+            'enviados': self.enviados,
+            'mensajes_http': self.mensajes_http,
+            'fallidos': self.fallidos,
+            'limitados': self.limitados,
+            'en_cola': len(self._cola),
+        }
+
+
+# Solo el proceso principal envía: los trabajadores de ejecución (spawn) re-importan este módulo
+# y no deben recoger (ni borrar) los pendientes del principal ni escribir su propio respaldo
+notificador = NotificadorTelegram(TELEGRAM_TOKEN, TELEGRAM_CHANNEL, prefijo=NOMBRE_BOT) \
+    if TELEGRAM_TOKEN and TELEGRAM_CHANNEL and multiprocessing.parent_process() is None else None
+if notificador is not None:
+    atexit.register(notificador.detener)
+
+
 def enviar_mensaje(texto):
-    """Envía mensaje simple a Telegram"""
-    if not TELEGRAM_TOKEN or not TELEGRAM_CHANNEL:
+    """Encola un mensaje para Telegram (no bloquea)"""
+    if notificador is None:
         print("⚠️ Telegram no configurado")
         return False
-    
-    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-    datos = {
-        "chat_id": TELEGRAM_CHANNEL,
-        "text": NOMBRE_BOT + texto,
-        "parse_mode": "HTML"
-    }
-    
-    try:
-        respuesta = requests.post(url, json=datos, timeout=10)
-        if respuesta.status_code == 200:
-            return True
-        print(respuesta)
-    except Exception as e:
-        print(e)
-        pass
-    return False
+    return notificador.encolar(texto)
 
 def notificar_direccion(par, direccion, datos):
     """Notifica cambio de dirección"""
@@ -53,10 +301,10 @@ def notificar_entrada(señal):
 • Ratio: 1:{señal['ratio']}
 """
     enviar_mensaje(mensaje)
-    
-    
-    
-    
+
+
+
+
 #enviar_mensaje("ESTO ES UN MENSAJE DE PRUEBA DEL NUEVO BOT")
 
 
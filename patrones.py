@@ -0,0 +1,306 @@
+"""
+NÚCLEOS VECTORIZADOS DE LA ESTRATEGIA (SIN DEPENDENCIAS DE MT5)
+"""
+import numpy as np
+
+# Códigos de dirección
+SIN_DIRECCION = 0
+LONG = 1
+SHORT = -1
+
+NOMBRES_DIRECCION = {LONG: "LONG", SHORT: "SHORT", SIN_DIRECCION: None}
+DIRECCION_A_CODIGO = {"LONG": LONG, "SHORT": SHORT, None: SIN_DIRECCION}
+
+
+def mascaras_direccion(open_, high, low, close):
+    """
+    Máscaras de ruptura de 3 velas sobre arrays ordenados de más reciente a más antigua.
+    Acepta 1D (velas) o 2D (símbolos x velas). La posición i compara la vela i con las i+1 e i+2.
+
+    Returns:
+        (alcista, bajista): arrays booleanos con N-2 posiciones en el último eje
+    """
+    open_, high, low, close = (np.asarray(a, dtype=np.float64) for a in (open_, high, low, close))
+    actual_open = open_[..., :-2]
+    actual_close = close[..., :-2]
+
+    max_anterior = np.maximum(high[..., 1:-1], high[..., 2:])
+    min_anterior = np.minimum(low[..., 1:-1], low[..., 2:])
+
+    alcista = (actual_close > actual_open) & (actual_close >= max_anterior)
+    bajista = (actual_close < actual_open) & (actual_close <= min_anterior)
+    return alcista, bajista
+
+
+def detectar_direccion(open_, high, low, close):
+    """
+    Primera ruptura de 3 velas empezando por la más reciente.
+    Mismo resultado que el bucle original de verificar_direccion.
+
+    Returns:
+        (direccion, posicion): códigos LONG/SHORT/SIN_DIRECCION y posición de la vela
+        (-1 si no hay dirección). Escalares para 1D, arrays por símbolo para 2D.
+    """
+    alcista, bajista = mascaras_direccion(open_, high, low, close)
+    if alcista.shape[-1] == 0:
+        forma = alcista.shape[:-1]
+        if not forma:
+            return SIN_DIRECCION, -1
+        return np.zeros(forma, dtype=np.int8), np.full(forma, -1, dtype=np.int64)
+
+    acierto = alcista | bajista
+    posicion = np.argmax(acierto, axis=-1)
+    encontrado = np.take_along_axis(acierto, np.expand_dims(posicion, -1), axis=-1)[..., 0]
+    es_alcista = np.take_along_axis(alcista, np.expand_dims(posicion, -1), axis=-1)[..., 0]
+
+    direccion = np.where(encontrado, np.where(es_alcista, LONG, SHORT), SIN_DIRECCION).astype(np.int8)
+    posicion = np.where(encontrado, posicion, -1)
+
+    if direccion.ndim == 0:
+        return int(direccion), int(posicion)
+    return direccion, posicion
+
+
+class SeguidorDireccion:
+    """
+    Seguimiento incremental de la dirección (ruptura de 3 velas) por símbolo y temporalidad.
+    Cada vela cerrada nueva se evalúa en O(1) contra las dos anteriores; el reescaneo
+    completo solo ocurre en el arranque en frío o cuando se detecta un hueco.
+    """
+
+    def __init__(self, direccion_inicial=SIN_DIRECCION):
+        self.direccion = direccion_inicial
+        self.ultimo_tiempo = None
+        self._altos = []  # Máximos de las dos últimas velas (más antigua primero)
+        self._bajos = []  # Mínimos de las dos últimas velas
+        self.reescaneos = 0
+        self.actualizaciones = 0
+
+    @property
+    def sembrado(self):
+        return self.ultimo_tiempo is not None
+
+    def sembrar(self, rates):
+        """
+        Reescaneo completo sobre velas cerradas en orden cronológico (array estructurado de MT5).
+        Returns:
+            posición de la ruptura (desde la más reciente) o -1
+        """
+        self.reescaneos += 1
+        if len(rates) == 0:
+            return -1
+        invertido = rates[::-1]
+        codigo, posicion = detectar_direccion(invertido['open'], invertido['high'], invertido['low'], invertido['close'])
+        if codigo != SIN_DIRECCION:
+            self.direccion = codigo
+        self.ultimo_tiempo = int(rates[-1]['time'])
+        self._altos = [float(x) for x in rates['high'][-2:]]
+        self._bajos = [float(x) for x in rates['low'][-2:]]
+        return posicion
+
+    def actualizar(self, tiempo, open_, high, low, close):
+        """
+        Incorpora una vela cerrada. Devuelve el nuevo código si la dirección cambió, si no None.
+        """
+        self.actualizaciones += 1
+        cambio = None
+        if len(self._altos) == 2:
+            if close > open_ and close >= max(self._altos):
+                nueva = LONG
+            elif close < open_ and close <= min(self._bajos):
+                nueva = SHORT
+            else:
+                nueva = self.direccion
+            if nueva != self.direccion:
+                self.direccion = nueva
+                cambio = nueva
+
+        self._altos = (self._altos + [high])[-2:]
+        self._bajos = (self._bajos + [low])[-2:]
+        self.ultimo_tiempo = int(tiempo)
+        return cambio
+
+    def alimentar(self, rates):
+        """
+        Incorpora las velas cerradas posteriores a la última vista.
+        Si la vela previa a las nuevas no es la última procesada hay un hueco y se reescanea.
+
+        Returns:
+            (cambio, reescaneado): último código de cambio (o None) y si hubo reescaneo
+        """
+        if not self.sembrado:
+            direccion_previa = self.direccion
+            self.sembrar(rates)
+            return (self.direccion if self.direccion != direccion_previa else None), True
+
+        tiempos = rates['time']
+        desde = int(np.searchsorted(tiempos, self.ultimo_tiempo, side='right'))
+        if desde == len(rates):
+            return None, False
+        if desde == 0 or int(tiempos[desde - 1]) != self.ultimo_tiempo:
+            direccion_previa = self.direccion
+            self.sembrar(rates)
+            return (self.direccion if self.direccion != direccion_previa else None), True
+
+        cambio = None
+        for vela in rates[desde:]:
+            nuevo = self.actualizar(vela['time'], float(vela['open']), float(vela['high']),
+                                    float(vela['low']), float(vela['close']))
+            if nuevo is not None:
+                cambio = nuevo
+        return cambio, False
+
+
+# ============ PATRONES DE ENTRADA (1 y 2 velas) ============
+
+# Códigos de patrón por vela de entrada
+LONG_2VELAS = 2
+LONG_1VELA = 1
+SHORT_1VELA = -1
+SHORT_2VELAS = -2
+
+NOMBRES_PATRON = {
+    LONG_2VELAS: 'LONG_2VELAS',
+    LONG_1VELA: 'LONG_1VELA',
+    SHORT_1VELA: 'SHORT_1VELA',
+    SHORT_2VELAS: 'SHORT_2VELAS',
+}
+
+# Divisas que identifican un par Forex
+DIVISAS_FOREX = ("EUR", "USD", "GBP", "JPY", "CHF", "AUD", "CAD", "NZD")
+
+# Distancia máxima entre entrada y SL en pares Forex (0.00100 en pares de 5 dígitos)
+LIMITE_SL_FOREX_PIPS = 10
+LIMITE_SL_FOREX = 0.00100
+
+
+def multiplicador_pips(simbolo):
+    """Pips por unidad de precio del símbolo"""
+    simbolo_upper = simbolo.upper()
+    if "JPY" in simbolo_upper:
+        return 100
+    elif "XAU" in simbolo_upper or "XAG" in simbolo_upper:
+        return 10
+    elif "BTC" in simbolo_upper or "ETH" in simbolo_upper:
+        return 1
+    return 10000
+
+
+def es_par_forex(par):
+    """Un par es Forex si contiene alguna de las divisas principales"""
+    par_upper = par.upper()
+    return any(divisa in par_upper for divisa in DIVISAS_FOREX)
+
+
+def parametros_stops(simbolo):
+    """
+    (es_forex, multiplicador_pips, limite_forex) de calcular_stops para un símbolo sin terminal.
+    Mismas cuentas que EspecSimbolo.heuristica, para que el replay y el barrido calculen los stops
+    igual que crear_señal (tope Forex de LIMITE_SL_FOREX_PIPS en el tamaño de pip del símbolo).
+    """
+    tamaño_pip = 1 / multiplicador_pips(simbolo)
+    return es_par_forex(simbolo), 1 / tamaño_pip, LIMITE_SL_FOREX_PIPS * tamaño_pip
+
+
+def escanear_patrones(open_, high, low, close):
+    """
+    Evalúa los patrones de 1 y 2 velas en todas las velas a la vez.
+    Arrays en orden cronológico: la vela t es la de entrada y t-1, t-2 las anteriores.
+
+    Returns:
+        array int8 con el código de patrón por vela (0 si no hay patrón; las 2 primeras siempre 0)
+    """
+    open_, high, low, close = (np.asarray(a, dtype=np.float64) for a in (open_, high, low, close))
+    codigo = np.zeros(close.shape, dtype=np.int8)
+    if close.shape[-1] < 3:
+        return codigo
+
+    alcista = close > open_
+    bajista = close < open_
+
+    a1, a2, a3 = alcista[..., :-2], alcista[..., 1:-1], alcista[..., 2:]
+    b1, b2, b3 = bajista[..., :-2], bajista[..., 1:-1], bajista[..., 2:]
+    c3 = close[..., 2:]
+
+    # LONG: la vela anterior bajista y la de entrada alcista cerrando sobre el máximo anterior
+    ruptura_long = b2 & a3 & (c3 >= high[..., 1:-1])
+    # SHORT: la vela anterior alcista y la de entrada bajista cerrando bajo el mínimo anterior
+    ruptura_short = a2 & b3 & (c3 <= low[..., 1:-1])
+
+    cuerpo = codigo[..., 2:]
+    cuerpo[ruptura_long] = np.where(b1, LONG_2VELAS, LONG_1VELA)[ruptura_long]
+    cuerpo[ruptura_short] = np.where(a1, SHORT_2VELAS, SHORT_1VELA)[ruptura_short]
+    return codigo
+
+
+def calcular_stops(entrada, extremo, es_long, ratio, es_forex, multiplicador_pips, max_pips_sl,
+                   limite_forex=LIMITE_SL_FOREX):
+    """
+    SL/TP de crear_señal vectorizado (escalares o arrays).
+    extremo: mínimo de las 3 velas para LONG, máximo para SHORT.
+
+    Returns:
+        dict con sl, tp, pips_sl y las máscaras ajustado_forex / tope_pips
+    """
+    entrada = np.asarray(entrada, dtype=np.float64)
+    sl = np.asarray(extremo, dtype=np.float64).copy()
+    es_long = np.asarray(es_long, dtype=bool)
+    signo = np.where(es_long, 1.0, -1.0)
+
+    # Restricción de distancia máxima para pares Forex
+    ajustado_forex = np.zeros(entrada.shape, dtype=bool)
+    if es_forex:
+        ajustado_forex = np.abs(entrada - sl) > limite_forex
+        sl = np.where(ajustado_forex, entrada - signo * limite_forex, sl)
+
+    # Ajustar SL por pips máximos (configuración general), en el tamaño de pip del símbolo
+    pips = np.round(np.abs(entrada - sl) * multiplicador_pips, 2)
+    tope_pips = pips > max_pips_sl
+    sl = np.where(tope_pips, entrada - signo * (max_pips_sl / multiplicador_pips), sl)
+    pips = np.where(tope_pips, float(max_pips_sl), pips)
+
+    riesgo = np.abs(entrada - sl)
+    tp = entrada + signo * riesgo * np.asarray(ratio, dtype=np.float64)
+
+    return {
+        'sl': sl,
+        'tp': tp,
+        'pips_sl': pips,
+        'ajustado_forex': ajustado_forex,
+        'tope_pips': tope_pips,
+    }
+
+
+def escanear_señales(open_, high, low, close, ratio_2velas, ratio_1vela, es_forex,
+                     multiplicador_pips, max_pips_sl, limite_forex=LIMITE_SL_FOREX):
+    """
+    Patrones y SL/TP de todas las velas en una sola pasada (orden cronológico).
+
+    Returns:
+        dict de arrays: codigo, entrada, sl, tp, pips_sl, ratio (NaN donde no hay patrón)
+    """
+    open_, high, low, close = (np.asarray(a, dtype=np.float64) for a in (open_, high, low, close))
+    codigo = escanear_patrones(open_, high, low, close)
+
+    # Extremos de la ventana de 3 velas que termina en cada vela
+    minimo3 = np.full(close.shape, np.nan)
+    maximo3 = np.full(close.shape, np.nan)
+    if close.shape[-1] >= 3:
+        minimo3[..., 2:] = np.minimum(np.minimum(low[..., :-2], low[..., 1:-1]), low[..., 2:])
+        maximo3[..., 2:] = np.maximum(np.maximum(high[..., :-2], high[..., 1:-1]), high[..., 2:])
+
+    es_long = codigo > 0
+    extremo = np.where(es_long, minimo3, maximo3)
+    ratio = np.where(np.abs(codigo) == 2, float(ratio_2velas), float(ratio_1vela))
+    stops = calcular_stops(close, extremo, es_long, ratio, es_forex, multiplicador_pips, max_pips_sl,
+                           limite_forex=limite_forex)
+
+    hay = codigo != 0
+    return {
+        'codigo': codigo,
+        'entrada': np.where(hay, close, np.nan),
+        'sl': np.where(hay, stops['sl'], np.nan),
+        'tp': np.where(hay, stops['tp'], np.nan),
+        'pips_sl': np.where(hay, stops['pips_sl'], np.nan),
+        'ratio': np.where(hay, ratio, np.nan),
+    }
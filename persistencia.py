@@ -1,50 +1,154 @@
 """
-MÓDULO DE PERSISTENCIA DE DIRECCIONES
+MÓDULO DE PERSISTENCIA DE DIRECCIONES Y ESTADO DEL BOT
+Todo el estado vive en memoria y se persiste fila a fila en SQLite (modo WAL):
+cada actualización es una transacción pequeña y segura ante caídas, sin reescribir archivos completos.
 """
 import json
 import os
+import sqlite3
+import threading
 from typing import Dict, Optional
 
 ARCHIVO_DIRECCIONES = "direccion.json"
+ARCHIVO_ESTADO = "estado_bot.db"
+
+
+class AlmacenEstado:
+    """Estado del bot en memoria respaldado por SQLite en modo WAL"""
+
+    def __init__(self, ruta=ARCHIVO_ESTADO):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False, isolation_level=None)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute("PRAGMA synchronous=FULL")
+        self._conexion.execute(
+            "CREATE TABLE IF NOT EXISTS estado ("
+            " seccion TEXT NOT NULL,"
+            " clave TEXT NOT NULL,"
+            " valor TEXT,"
+            " PRIMARY KEY (seccion, clave))"
+        )
+        self.datos = {}
+        for seccion, clave, valor in self._conexion.execute("SELECT seccion, clave, valor FROM estado"):
+            self.datos.setdefault(seccion, {})[clave] = json.loads(valor)
+
+    def tiene_seccion(self, seccion):
+        return seccion in self.datos
+
+    def seccion(self, seccion) -> Dict:
+        """Copia del contenido de una sección"""
+        with self._lock:
+            return dict(self.datos.get(seccion, {}))
+
+    def obtener(self, seccion, clave, defecto=None):
+        return self.datos.get(seccion, {}).get(clave, defecto)
+
+    def guardar(self, seccion, clave, valor):
+        """Actualiza un valor en memoria y lo persiste en una transacción"""
+        self.guardar_varios(seccion, {clave: valor})
+
+    def guardar_varios(self, seccion, valores: Dict):
+        """Actualiza varios valores de una sección en una sola transacción"""
+        filas = [(seccion, clave, json.dumps(valor, ensure_ascii=False)) for clave, valor in valores.items()]
+        with self._lock:
+            with self._conexion:
+                self._conexion.execute("BEGIN")
+                self._conexion.executemany(
+                    "INSERT INTO estado (seccion, clave, valor) VALUES (?, ?, ?) "
+                    "ON CONFLICT(seccion, clave) DO UPDATE SET valor = excluded.valor",
+                    filas
+                )
+            self.datos.setdefault(seccion, {}).update(valores)
+
+    def compactar(self):
+        """Vuelca el WAL a la base de datos y lo trunca"""
+        with self._lock:
+            self._conexion.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def cerrar(self):
+        with self._lock:
+            self._conexion.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._conexion.close()
+
+
+_almacen: Optional[AlmacenEstado] = None
+_almacen_lock = threading.Lock()
+
+
+def obtener_almacen() -> AlmacenEstado:
+    """Almacén único del proceso (se abre en el primer uso)"""
+    global _almacen
+    with _almacen_lock:
+        if _almacen is None:
+            _almacen = AlmacenEstado()
+        return _almacen
+
+
+def _seccion_direcciones(temporalidad):
+    return f"direccion_{temporalidad}"
+
+
+def _migrar_json(temporalidad):
+    """Importa una sola vez el antiguo <temporalidad>_direccion.json"""
+    archivo = f"{temporalidad}_{ARCHIVO_DIRECCIONES}"
+    if not os.path.exists(archivo):
+        return {}
+    with open(archivo, 'r', encoding='utf-8') as f:
+        datos = json.load(f)
+    obtener_almacen().guardar_varios(_seccion_direcciones(temporalidad), datos)
+    print(f"📦 Direcciones migradas desde {archivo}")
+    return datos
+
 
 def cargar_direcciones(temporalidad) -> Dict[str, str]:
-    """Carga las direcciones desde el archivo JSON"""
+    """Carga las direcciones desde el almacén de estado"""
     try:
-        if os.path.exists(f"{temporalidad}_{ARCHIVO_DIRECCIONES}"):
-            with open(f"{temporalidad}_{ARCHIVO_DIRECCIONES}", 'r', encoding='utf-8') as f:
-                datos = json.load(f)
-                print(f"✅ Direcciones cargadas desde {temporalidad}_{ARCHIVO_DIRECCIONES}")
-                return datos
-        else:
-            print(f"⚠️  Archivo {temporalidad}_{ARCHIVO_DIRECCIONES} no encontrado, se creará con valores por defecto")
-            return {}
+        almacen = obtener_almacen()
+        seccion = _seccion_direcciones(temporalidad)
+        if almacen.tiene_seccion(seccion):
+            print(f"✅ Direcciones cargadas desde {almacen.ruta} ({temporalidad})")
+            return almacen.seccion(seccion)
+        datos = _migrar_json(temporalidad)
+        if not datos:
+            print(f"⚠️  Sin direcciones guardadas para {temporalidad}, se crearán con valores por defecto")
+        return datos
     except Exception as e:
         print(f"❌ Error cargando direcciones: {e}")
         return {}
 
 def guardar_direcciones(direcciones: Dict[str, str], temporalidad:str):
-    """Guarda las direcciones en el archivo JSON"""
+    """Guarda las direcciones en el almacén de estado (una transacción)"""
     try:
-        with open(f"{temporalidad}_{ARCHIVO_DIRECCIONES}", 'w', encoding='utf-8') as f:
-            json.dump(direcciones, f, indent=2, ensure_ascii=False)
-        print(f"💾 Direcciones guardadas en {temporalidad}_{ARCHIVO_DIRECCIONES}")
+        obtener_almacen().guardar_varios(_seccion_direcciones(temporalidad), direcciones)
+        print(f"💾 Direcciones guardadas ({temporalidad})")
     except Exception as e:
         print(f"❌ Error guardando direcciones: {e}")
 
 def actualizar_direccion(par: str, direccion: str, temporalidad: str):
-    """Actualiza la dirección de un par específico"""
+    """Actualiza la dirección de un par específico (solo se escribe esa fila)"""
     try:
-        # Cargar direcciones existentes
-        direcciones = cargar_direcciones(temporalidad=temporalidad)
-        
-        # Actualizar el par
-        direcciones[par] = direccion
-        
-        # Guardar cambios
-        guardar_direcciones(direcciones, temporalidad)
-        
+        obtener_almacen().guardar(_seccion_direcciones(temporalidad), par, direccion)
         print(f"📝 {par}: Dirección actualizada a {direccion}")
         return True
     except Exception as e:
         print(f"❌ Error actualizando dirección para {par}: {e}")
-        return False
\ No newline at end of file
+        return False
+
+
+def cargar_estado_bot() -> Dict:
+    """Contadores diarios y última señal del bot"""
+    try:
+        return obtener_almacen().seccion("bot")
+    except Exception as e:
+        print(f"❌ Error cargando estado del bot: {e}")
+        return {}
+
+def guardar_estado_bot(**valores):
+    """Persiste contadores del bot en una transacción"""
+    try:
+        obtener_almacen().guardar_varios("bot", valores)
+        return True
+    except Exception as e:
+        print(f"❌ Error guardando estado del bot: {e}")
+        return False
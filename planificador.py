@@ -0,0 +1,228 @@
+"""
+PLANIFICADOR ALINEADO AL CIERRE DE VELA
+"""
+import time
+from collections import deque
+from datetime import datetime
+
+import pytz
+import config
+from instrumentacion_mt5 import mt5
+from tiempo import reloj, convertir_a_hora_ny, _tz_ny_por_hora
+from sesion_mt5 import sesion
+from data_metatrader5 import INTERVALOS_MT5
+
+# Duración en segundos de cada temporalidad de config
+SEGUNDOS_TEMPORALIDAD = {
+    '1min': 60,
+    '3min': 180,
+    '5min': 300,
+    '15min': 900,
+    '30min': 1800,
+    '1hour': 3600,
+    '2hour': 7200,
+    '4hour': 14400,
+    '6hour': 21600,
+    '12hour': 43200,
+    '1day': 86400,
+    '3day': 259200,
+    '1week': 604800,
+}
+
+# Origen de alineación (epoch en hora servidor, o en reloj de sesión para las velas agregadas).
+# Las velas semanales de MT5 abren el domingo y el 1970-01-04 fue domingo.
+ORIGEN_TEMPORALIDAD = {
+    '1week': 3 * 86400,
+}
+
+# Reloj de sesión de las velas agregadas desde M1: hora de NY + 7 h
+# (el día de trading empieza a las 17:00 NY, a las 00:00 de este reloj, como en un servidor NY+7)
+DESFASE_SESION = 7 * 3600
+
+# Horario del mercado forex en hora de NY: cierra viernes 17:00, abre domingo 17:00
+HORA_CIERRE_VIERNES_NY = 17
+HORA_APERTURA_DOMINGO_NY = 17
+
+# Espera máxima (s) a que el broker publique la vela nueva y pausa entre consultas
+MAX_ESPERA_PUBLICACION = 10.0
+PAUSA_PUBLICACION = 0.05
+
+# Tramo máximo de sueño para reevaluar el reloj (cambios de hora, resincronizaciones)
+MAX_TRAMO_SUEÑO = 30.0
+
+
+def mercado_abierto(ts_utc):
+    """Indica si el mercado forex está abierto en el epoch UTC dado"""
+    ahora_ny = convertir_a_hora_ny(float(ts_utc))
+    dia = ahora_ny.weekday()
+    if dia == 5:
+        return False
+    if dia == 4 and ahora_ny.hour >= HORA_CIERRE_VIERNES_NY:
+        return False
+    if dia == 6 and ahora_ny.hour < HORA_APERTURA_DOMINGO_NY:
+        return False
+    return True
+
+
+def se_agrega_localmente(temporalidad):
+    """Temporalidades que cache_velas construye desde M1: sin equivalente en MT5, o todas con AGREGADOR_LOCAL"""
+    if temporalidad == '1min' or temporalidad not in SEGUNDOS_TEMPORALIDAD:
+        return False
+    return config.AGREGADOR_LOCAL or temporalidad not in INTERVALOS_MT5
+
+
+def apertura_vela(temporalidad, t_servidor):
+    """
+    Apertura (hora servidor) de la vela que contiene t_servidor.
+    Las velas de MT5 se alinean a la hora del servidor; las agregadas desde M1, al reloj de sesión de NY.
+    """
+    duracion = SEGUNDOS_TEMPORALIDAD[temporalidad]
+    origen = ORIGEN_TEMPORALIDAD.get(temporalidad, 0)
+    t_alineado = t_servidor
+    if se_agrega_localmente(temporalidad):
+        ts_utc = t_servidor - (reloj.desfase_servidor or 0)
+        desfase_ny, _ = _tz_ny_por_hora(int(ts_utc // 3600))
+        t_alineado = ts_utc + int(desfase_ny.total_seconds()) + DESFASE_SESION
+    return t_servidor - (t_alineado - origen) % duracion
+
+
+def vela_con_mercado(temporalidad, cierre_utc):
+    """
+    Indica si la vela que cierra en cierre_utc tuvo algún tramo con mercado abierto.
+    El cierre semanal dura menos de 5 días, así que una vela corta solo queda vacía
+    si su apertura y su cierre caen en el mismo fin de semana.
+    """
+    duracion = SEGUNDOS_TEMPORALIDAD[temporalidad]
+    if duracion >= 5 * 86400:
+        return True
+    return mercado_abierto(cierre_utc - duracion) or mercado_abierto(cierre_utc - 1)
+
+
+def esperar_publicacion(simbolo, temporalidades, apertura_servidor, max_espera=MAX_ESPERA_PUBLICACION):
+    """
+    Espera a que el broker publique la vela que abre en apertura_servidor (hora servidor).
+    Las temporalidades agregadas desde M1 esperan a la vela M1 de esa apertura: hasta entonces
+    la última M1 pertenece a la vela anterior y la agregada recién cerrada seguiría "en formación".
+    Returns: ms esperados (None sin sesión MT5)
+    """
+    if not sesion.inicializado:
+        return None
+    inicio = time.perf_counter()
+    pendientes = list(dict.fromkeys(
+        '1min' if se_agrega_localmente(tf) else tf for tf in temporalidades if tf in SEGUNDOS_TEMPORALIDAD
+    ))
+    pendientes = [tf for tf in pendientes if tf in INTERVALOS_MT5]
+    while pendientes and time.perf_counter() - inicio < max_espera:
+        tf = pendientes[0]
+        rates = mt5.copy_rates_from_pos(simbolo, INTERVALOS_MT5[tf], 0, 1)
+        if rates is not None and len(rates) > 0 and int(rates[0]['time']) >= apertura_servidor:
+            pendientes.pop(0)
+            continue
+        time.sleep(PAUSA_PUBLICACION)
+    if pendientes:
+        print(f"⚠️  Vela nueva {pendientes} no publicada tras {max_espera:.0f}s")
+    return (time.perf_counter() - inicio) * 1000
+
+
+class Planificador:
+    """
+    Calcula el próximo cierre de vela de cada temporalidad y duerme hasta él.
+    Los cierres se alinean a la hora del servidor MT5, igual que sus velas.
+    """
+
+    def __init__(self, temporalidades, esperar_publicacion=False, simbolo_referencia="EURUSD",
+                 max_espera_publicacion=MAX_ESPERA_PUBLICACION, historial=500):
+        desconocidas = [tf for tf in temporalidades if tf not in SEGUNDOS_TEMPORALIDAD]
+        if desconocidas:
+            raise ValueError(f"Temporalidades no soportadas: {desconocidas}")
+
+        self.temporalidades = list(dict.fromkeys(temporalidades))
+        self.esperar_publicacion = esperar_publicacion
+        self.simbolo_referencia = simbolo_referencia
+        self.max_espera_publicacion = max_espera_publicacion
+        self.retrasos = deque(maxlen=historial)  # (cierre_utc, retraso_despertar_ms, retraso_publicacion_ms)
+
+    def _desfase(self):
+        return reloj.desfase_servidor or 0
+
+    def proximo_cierre(self, temporalidad, ts_utc):
+        """Epoch UTC del próximo cierre (estrictamente posterior a ts_utc) de la temporalidad"""
+        ts_servidor = ts_utc + self._desfase()
+        apertura = apertura_vela(temporalidad, ts_servidor)
+        siguiente = apertura + SEGUNDOS_TEMPORALIDAD[temporalidad]
+        if se_agrega_localmente(temporalidad):
+            # En reloj de sesión un cambio de horario de NY acorta o alarga la vela una hora
+            real = apertura_vela(temporalidad, siguiente)
+            siguiente = real if real > apertura else apertura_vela(temporalidad, siguiente + 3600)
+        return siguiente - self._desfase()
+
+    def siguiente_evento(self, ts_utc=None):
+        """
+        Devuelve (cierre_utc, temporalidades) del próximo cierre de una vela con mercado.
+        Se saltan las velas que caen por completo en el fin de semana.
+        """
+        if ts_utc is None:
+            ts_utc = reloj.timestamp()
+
+        cursor = ts_utc
+        while True:
+            cierres = {tf: self.proximo_cierre(tf, cursor) for tf in self.temporalidades}
+            cierre = min(cierres.values())
+            con_mercado = [tf for tf, ts in cierres.items() if ts == cierre and vela_con_mercado(tf, cierre)]
+            if con_mercado:
+                return cierre, con_mercado
+            cursor = cierre
+
+    def cierra_en(self, temporalidad, ts_utc):
+        """Indica si ts_utc coincide (al segundo) con un cierre de la temporalidad"""
+        cierre = self.proximo_cierre(temporalidad, ts_utc - 1)
+        return int(cierre) == int(ts_utc)
+
+    def _dormir_hasta(self, objetivo_utc):
+        while True:
+            restante = objetivo_utc - reloj.timestamp()
+            if restante <= 0:
+                return
+            time.sleep(min(restante, MAX_TRAMO_SUEÑO))
+
+    def _esperar_publicacion(self, temporalidades, cierre_utc):
+        """Espera a que el broker publique la vela que abre en cierre_utc"""
+        return esperar_publicacion(self.simbolo_referencia, temporalidades, int(cierre_utc + self._desfase()),
+                                   self.max_espera_publicacion)
+
+    def esperar_siguiente(self):
+        """
+        Duerme hasta el próximo cierre y devuelve un evento con:
+        hora_ny, temporalidades que cerraron y retrasos respecto al cierre real.
+        """
+        cierre, temporalidades = self.siguiente_evento()
+        self._dormir_hasta(cierre)
+        retraso_despertar = (reloj.timestamp() - cierre) * 1000
+
+        retraso_publicacion = None
+        if self.esperar_publicacion:
+            retraso_publicacion = self._esperar_publicacion(temporalidades, cierre)
+
+        self.retrasos.append((cierre, retraso_despertar, retraso_publicacion))
+        return {
+            'cierre_utc': datetime.fromtimestamp(cierre, pytz.UTC),
+            'hora_ny': convertir_a_hora_ny(float(cierre)),
+            'temporalidades': temporalidades,
+            'retraso_ms': retraso_despertar,
+            'retraso_publicacion_ms': retraso_publicacion,
+            'retraso_total_ms': (reloj.timestamp() - cierre) * 1000,
+        }
+
+    def estadisticas(self):
+        """Retrasos de despertar (ms) respecto al cierre real de la vela"""
+        if not self.retrasos:
+            return {'eventos': 0}
+        despertar = sorted(r[1] for r in self.retrasos)
+        publicacion = [r[2] for r in self.retrasos if r[2] is not None]
+        return {
+            'eventos': len(despertar),
+            'retraso_medio_ms': round(sum(despertar) / len(despertar), 2),
+            'retraso_p95_ms': round(despertar[int(0.95 * (len(despertar) - 1))], 2),
+            'retraso_max_ms': round(despertar[-1], 2),
+            'publicacion_media_ms': round(sum(publicacion) / len(publicacion), 2) if publicacion else None,
+        }
@@ -3,164 +3,170 @@ MÓDULO DE PRECISIÓN (15M y 5M)
 """
 import time
 from datetime import datetime
-from data_metatrader5 import obtener_velas_mt5, calcular_pips
+import numpy as np
+from cache_velas import cache_velas, rates_a_dataframe, obtener_velas_cache
+from data_metatrader5 import conectar_mt5
 from config import direccion_global, PARES, MAX_PIPS_SL, RATIO_2VELAS, RATIO_1VELA, CUENTA_PRINCIPAL
 from notificacion import notificar_entrada
+from patrones import (
+    escanear_patrones, calcular_stops, LIMITE_SL_FOREX_PIPS,
+    LONG_2VELAS, LONG_1VELA, SHORT_1VELA, SHORT_2VELAS, NOMBRES_PATRON
+)
+from simbolos import registro_simbolos
+
+# Tiempos por etapa de la última búsqueda
+tiempos_etapas = {}
 
 def buscar_entradas(intervalo):
-    """Busca entradas en el intervalo especificado"""
+    """
+    Busca entradas en el intervalo especificado.
+    Las velas de todos los pares con dirección se obtienen en un lote y el patrón de la última
+    vela cerrada se evalúa para todos a la vez; solo los pares con patrón construyen su señal.
+    """
     print(f"\n[{datetime.now().strftime('%H:%M:%S')}] 🔎 Buscando entradas {intervalo}")
     
     señales = []
-    
-    for par in PARES:
-        direccion = direccion_global[par]
-        if not direccion:
-            continue
-            
+    pares = [par for par in PARES if direccion_global.get(par)]
+    if not pares:
+        return señales
+    
+    if not conectar_mt5(CUENTA_PRINCIPAL['servidor'], CUENTA_PRINCIPAL['numero_cuenta'], CUENTA_PRINCIPAL['contraseña']):
+        print(f"  ❌ Error conectando a cuenta {CUENTA_PRINCIPAL['numero_cuenta']}")
+        return señales
+    
+    # Adquisición: 6 velas por par (al menos 4 cerradas más la vela en formación)
+    lote = cache_velas.obtener_lote(pares, intervalo, 6)
+    for par, error in lote.errores.items():
+        print(f"  ❌ Error {par}: {error}")
+    
+    # Análisis: patrón de la última vela cerrada de todos los pares (NaN = sin patrón)
+    inicio = time.perf_counter()
+    ventana = lote.ohlc[:, -4:-1, :]
+    codigos = escanear_patrones(ventana[..., 0], ventana[..., 1], ventana[..., 2], ventana[..., 3])[:, -1]
+    largos = np.array([direccion_global[par] == "LONG" for par in lote.pares], dtype=bool)
+    candidatos = lote.validos(5) & np.where(largos, codigos > 0, codigos < 0)
+    
+    for i in np.flatnonzero(candidatos):
+        par = lote.pares[i]
         try:
-            # Obtener velas
-            data = obtener_velas_mt5(par, intervalo, 6, CUENTA_PRINCIPAL['numero_cuenta'],CUENTA_PRINCIPAL['servidor'], CUENTA_PRINCIPAL['contraseña'])
-            df = data[0]
-            if df is None or len(df) < 4:
-                continue
-            
-            # Buscar según dirección
-            if direccion == "LONG":
-                señal = buscar_patron_long(df, par, intervalo)
-            elif direccion == "SHORT":
-                señal = buscar_patron_short(df, par, intervalo)
-                
-            if señal:
-                señales.append(señal)
-                notificar_entrada(señal)
-                print(f"  ✅ {par}: {señal['tipo']}")
-                
+            codigo = int(codigos[i])
+            df = rates_a_dataframe(lote.rates[i][:-1])
+            ratio = RATIO_2VELAS if abs(codigo) == 2 else RATIO_1VELA
+            señales.append(crear_señal(NOMBRES_PATRON[codigo], par, intervalo, df.iloc[0], df, len(df)-1, ratio, codigo > 0))
         except Exception as e:
             print(f"  ❌ Error {par}: {e}")
+    analisis_ms = (time.perf_counter() - inicio) * 1000
+    
+    # Notificación
+    inicio = time.perf_counter()
+    for señal in señales:
+        try:
+            notificar_entrada(señal)
+        except Exception as e:
+            print(f"  ❌ Error notificando {señal['par']}: {e}")
+        print(f"  ✅ {señal['par']}: {señal['tipo']}")
+    notificacion_ms = (time.perf_counter() - inicio) * 1000
     
+    tiempos_etapas.update(lote.informe_etapas(analisis_ms, notificacion_ms, len(señales)))
     return señales
 
-def buscar_patron_long(df, par, intervalo):
+def evaluar_vela_en_formacion(par, intervalo):
+    """
+    Evalúa el patrón con la vela en formación como vela de entrada (modo streaming).
+    La señal es provisional: se avisa pero solo se opera al cierre de la vela.
+    """
+    direccion = direccion_global.get(par)
+    if not direccion:
+        return None
+    df, _ = obtener_velas_cache(par, intervalo, 6, CUENTA_PRINCIPAL['numero_cuenta'], CUENTA_PRINCIPAL['servidor'],
+                                CUENTA_PRINCIPAL['contraseña'], incluir_precio_actual=True)
+    if df is None or len(df) < 4:
+        return None
+    buscar = buscar_patron_long if direccion == "LONG" else buscar_patron_short
+    señal = buscar(df, par, intervalo, provisional=True)
+    if señal:
+        señal['provisional'] = True
+        señal['apertura_vela'] = df.index[0].isoformat()
+    return señal
+
+
+def _patron_ultima_vela(df):
+    """Código de patrón de la vela más reciente (df ordenado de más reciente a más antigua)"""
+    ventana = df.iloc[2::-1]  # Últimas 3 velas en orden cronológico
+    codigo = escanear_patrones(
+        ventana['open'].to_numpy(), ventana['high'].to_numpy(),
+        ventana['low'].to_numpy(), ventana['close'].to_numpy()
+    )
+    return int(codigo[-1])
+
+
+def buscar_patron_long(df, par, intervalo, provisional=False):
     """Busca patrón LONG en las últimas velas"""
     # Verificar que hay suficientes velas
     if len(df) < 3:
         return None
     
-    # Tomar las últimas 3 velas
-    vela1 = df.iloc[2]  # Antepenúltima
-    vela2 = df.iloc[1]  # Penúltima
-    vela3 = df.iloc[0]  # Última
-    
-    # Patrón 1: Última vela alcista y 2 anteriores bajistas
-    if (vela1['close'] < vela1['open'] and  # Primera vela bajista
-        vela2['close'] < vela2['open'] and  # Segunda vela bajista
-        vela3['close'] > vela3['open']):    # Última vela alcista
-        # Verificar que la última vela cierra arriba del máximo anterior
-        if vela3['close'] >= vela2['high']:
-            return crear_señal('LONG_2VELAS', par, intervalo, vela3, df, len(df)-1, RATIO_2VELAS)
-    
-    # Patrón 2: Última vela alcista y la anterior bajista
-    elif (vela2['close'] < vela2['open'] and  # Vela anterior bajista
-          vela3['close'] > vela3['open']):    # Última vela alcista
-        # Verificar que la última vela cierra arriba del máximo de la vela anterior
-        if vela3['close'] >= vela2['high']:
-            return crear_señal('LONG_1VELA', par, intervalo, vela3, df, len(df)-1, RATIO_1VELA)
-    
+    # Patrón 1: Última vela alcista y 2 anteriores bajistas, cierre sobre el máximo anterior
+    # Patrón 2: Última vela alcista y la anterior bajista, cierre sobre el máximo anterior
+    codigo = _patron_ultima_vela(df)
+    if codigo == LONG_2VELAS:
+        return crear_señal('LONG_2VELAS', par, intervalo, df.iloc[0], df, len(df)-1, RATIO_2VELAS, provisional=provisional)
+    if codigo == LONG_1VELA:
+        return crear_señal('LONG_1VELA', par, intervalo, df.iloc[0], df, len(df)-1, RATIO_1VELA, provisional=provisional)
     return None
 
-def buscar_patron_short(df, par, intervalo):
+def buscar_patron_short(df, par, intervalo, provisional=False):
     """Busca patrón SHORT en las últimas velas"""
     # Verificar que hay suficientes velas
     if len(df) < 3:
         return None
     
-    # Tomar las últimas 3 velas
-    vela1 = df.iloc[2]  # Penúltima
-    vela2 = df.iloc[1]  # Antepenúltima
-    vela3 = df.iloc[0]  # Última
-    
-    # Patrón 1: Última vela bajista y 2 anteriores alcistas
-    if (vela1['close'] > vela1['open'] and  # Primera vela alcista
-        vela2['close'] > vela2['open'] and  # Segunda vela alcista
-        vela3['close'] < vela3['open']):    # Última vela bajista
-        
-        # Verificar que la última vela cierra abajo del mínimo anterior
-        if vela3['close'] <= vela2['low']:
-            return crear_señal('SHORT_2VELAS', par, intervalo, vela3, df, len(df)-1, RATIO_2VELAS, False)
-    
-    # Patrón 2: Última vela bajista y la anterior alcista
-    elif (vela2['close'] > vela2['open'] and  # Vela anterior alcista
-          vela3['close'] < vela3['open']):    # Última vela bajista
-        
-        # Verificar que la última vela cierra abajo del mínimo de la vela anterior
-        if vela3['close'] <= vela2['low']:
-            return crear_señal('SHORT_1VELA', par, intervalo, vela3, df, len(df)-1, RATIO_1VELA, False)
-    
+    # Patrón 1: Última vela bajista y 2 anteriores alcistas, cierre bajo el mínimo anterior
+    # Patrón 2: Última vela bajista y la anterior alcista, cierre bajo el mínimo anterior
+    codigo = _patron_ultima_vela(df)
+    if codigo == SHORT_2VELAS:
+        return crear_señal('SHORT_2VELAS', par, intervalo, df.iloc[0], df, len(df)-1, RATIO_2VELAS, False, provisional=provisional)
+    if codigo == SHORT_1VELA:
+        return crear_señal('SHORT_1VELA', par, intervalo, df.iloc[0], df, len(df)-1, RATIO_1VELA, False, provisional=provisional)
     return None
 
 
-def crear_señal(tipo, par, intervalo, vela_entrada, df, idx, ratio, es_long=True):
-    """Crea señal con todos los parámetros"""
+def crear_señal(tipo, par, intervalo, vela_entrada, df, idx, ratio, es_long=True, provisional=False):
+    """
+    Crea señal con todos los parámetros (mismo núcleo que el escáner histórico).
+    Las señales provisionales (vela en formación, una por tick) no imprimen el ajuste del SL:
+    lo indica 'sl_ajustado' y quien las avisa lo muestra una vez por vela.
+    """
     entrada = vela_entrada['close']
     
-    # Calcular SL
+    # Extremo de las 3 últimas velas para el SL
     if es_long:
-        sl_precio = min(df.iloc[0]['low'],df.iloc[1]['low'],df.iloc[2]['low'])
+        extremo = min(df.iloc[0]['low'],df.iloc[1]['low'],df.iloc[2]['low'])
     else:
-        sl_precio = max(df.iloc[0]['high'],df.iloc[1]['high'],df.iloc[2]['high'])
-        
-    
-    # ============ MODIFICACIÓN: AJUSTE SL PARA FOREX ============
-    # Verificar si es un par Forex
-    es_forex = any(major in par.upper() for major in [
-        "EUR", "USD", "GBP", "JPY", "CHF", "AUD", "CAD", "NZD"
-    ]) and any(divisa in par.upper() for divisa in [
-        "EUR", "USD", "GBP", "JPY", "CHF", "AUD", "CAD", "NZD"
-    ])
-    
-    # Aplicar restricción de máximo 0.00100 para pares Forex
-    if es_forex:
-        diferencia = abs(entrada - sl_precio)
-        
-        # Si la diferencia es mayor a 0.00100, ajustar el SL
-        if diferencia > 0.00100:
-            if es_long:
-                sl_precio = entrada - 0.00100
-            else:
-                sl_precio = entrada + 0.00100
-            
-            print(f"⚠️  SL ajustado para {par} (Forex): Diferencia reducida a 0.00100")
-    # ============ FIN DE MODIFICACIÓN ============
+        extremo = max(df.iloc[0]['high'],df.iloc[1]['high'],df.iloc[2]['high'])
     
-    # Ajustar SL por pips máximos (configuración general)
-    pips = calcular_pips(par, entrada, sl_precio)
-    if pips > MAX_PIPS_SL:
-        ajuste = MAX_PIPS_SL / 100000
-        if es_long:
-            sl_precio = entrada - ajuste
-        else:
-            sl_precio = entrada + ajuste
-        pips = MAX_PIPS_SL
+    espec = registro_simbolos.obtener(par)
+    limite_forex = LIMITE_SL_FOREX_PIPS * espec.tamaño_pip
+    stops = calcular_stops(entrada, extremo, es_long, ratio, espec.es_forex, espec.multiplicador_pips, MAX_PIPS_SL,
+                           limite_forex=limite_forex)
+    sl_precio = float(stops['sl'])
     
-    # Calcular TP
-    riesgo = abs(entrada - sl_precio)
-    if es_long:
-        tp = entrada + (riesgo * ratio)
-    else:
-        tp = entrada - (riesgo * ratio)
+    sl_ajustado = bool(stops['ajustado_forex'])
+    if sl_ajustado and not provisional:
+        print(f"⚠️  SL ajustado para {par} (Forex): Diferencia reducida a {limite_forex:.{espec.digitos}f}")
     
-    # Mostrar información de ajuste si fue necesario
-    if es_forex and abs(entrada - sl_precio) == 0.00100:
-        print(f"   📊 {par}: SL limitado a 0.00100 de diferencia ({abs(entrada - sl_precio):.5f})")
+    pips = MAX_PIPS_SL if bool(stops['tope_pips']) else float(stops['pips_sl'])
     
     return {
         'par': par,
         'tipo': tipo,
         'temporalidad': intervalo,
         'entrada': float(entrada),
-        'sl': float(sl_precio),
-        'tp': float(tp),
+        'sl': sl_precio,
+        'tp': float(stops['tp']),
         'pips_sl': pips,
-        'ratio': ratio
-    }
\ No newline at end of file
+        'ratio': ratio,
+        'sl_ajustado': sl_ajustado,
+        # Instante de detección (reloj de pared, común a procesos): el plazo de la orden cuenta desde aquí
+        'detectada': time.time()
+    }
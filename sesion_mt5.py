@@ -0,0 +1,161 @@
+"""
+GESTOR DE SESIÓN MT5 - UNA SOLA SESIÓN PERSISTENTE
+"""
+import time
+import threading
+from instrumentacion_mt5 import mt5
+
+# Segundos entre chequeos de salud de la sesión activa
+INTERVALO_SALUD = 30
+
+
+class GestorSesionMT5:
+    """Mantiene una única sesión MT5 viva y cambia de cuenta solo cuando hace falta"""
+
+    def __init__(self, intervalo_salud=INTERVALO_SALUD, ruta_terminal=None):
+        self._lock = threading.RLock()
+        self.intervalo_salud = intervalo_salud
+        self.ruta_terminal = ruta_terminal  # Ejecutable del terminal (None = el predeterminado)
+        self.inicializado = False
+        self.cuenta_activa = None  # (numero_cuenta, servidor)
+        self.ultimo_chequeo = 0.0
+
+        # Estadísticas
+        self.logins = 0
+        self.logins_fallidos = 0
+        self.tiempo_logins = 0.0
+        self.ultimo_login = 0.0
+        self.cambios_cuenta = 0
+        self.reconexiones = 0
+        self.reutilizaciones = 0
+
+    def _inicializar(self):
+        """Inicializa el terminal si aún no lo está"""
+        if self.inicializado:
+            return True
+        iniciado = mt5.initialize(path=self.ruta_terminal) if self.ruta_terminal else mt5.initialize()
+        if not iniciado:
+            print("Error al inicializar MT5:", mt5.last_error())
+            return False
+        self.inicializado = True
+        return True
+
+    def _sesion_saludable(self, numero_cuenta):
+        """Comprueba que el terminal sigue conectado a la cuenta esperada"""
+        try:
+            terminal = mt5.terminal_info()
+            cuenta = mt5.account_info()
+        except Exception:
+            return False
+        if terminal is None or cuenta is None:
+            return False
+        return bool(getattr(terminal, 'connected', True)) and cuenta.login == numero_cuenta
+
+    def _login(self, servidor, numero_cuenta, contraseña):
+        """Hace login midiendo tiempo y contando intentos"""
+        inicio = time.perf_counter()
+        autorizado = mt5.login(numero_cuenta, password=contraseña, server=servidor)
+        duracion = time.perf_counter() - inicio
+
+        self.logins += 1
+        self.tiempo_logins += duracion
+        self.ultimo_login = duracion
+
+        if not autorizado:
+            self.logins_fallidos += 1
+            self.cuenta_activa = None
+            print("Error de login:", mt5.last_error())
+            return False
+
+        if self.cuenta_activa is not None and self.cuenta_activa != (numero_cuenta, servidor):
+            self.cambios_cuenta += 1
+        self.cuenta_activa = (numero_cuenta, servidor)
+        self.ultimo_chequeo = time.monotonic()
+        print(f"🔗 Sesión MT5 activa en {numero_cuenta}@{servidor} ({duracion * 1000:.0f} ms)")
+        return True
+
+    def asegurar(self, servidor, numero_cuenta, contraseña):
+        """
+        Garantiza una sesión logueada en la cuenta indicada.
+        Reutiliza la sesión actual si ya está en esa cuenta y sigue sana.
+        """
+        with self._lock:
+            ahora = time.monotonic()
+
+            if self.inicializado and self.cuenta_activa == (numero_cuenta, servidor):
+                if ahora - self.ultimo_chequeo < self.intervalo_salud:
+                    self.reutilizaciones += 1
+                    return True
+                if self._sesion_saludable(numero_cuenta):
+                    self.ultimo_chequeo = ahora
+                    self.reutilizaciones += 1
+                    return True
+                print("⚠️  Sesión MT5 caída, reconectando...")
+                self.reconexiones += 1
+                self.cerrar()
+
+            if not self._inicializar():
+                return False
+
+            if self._login(servidor, numero_cuenta, contraseña):
+                return True
+
+            # Un login fallido puede dejar el terminal en mal estado: reiniciar una vez
+            self.cerrar()
+            if not self._inicializar():
+                return False
+            return self._login(servidor, numero_cuenta, contraseña)
+
+    def asegurar_cuenta(self, cuenta):
+        """Igual que asegurar() pero recibe el diccionario de cuenta de config"""
+        return self.asegurar(cuenta['servidor'], cuenta['numero_cuenta'], cuenta['contraseña'])
+
+    def invalidar(self):
+        """Fuerza un chequeo de salud en el próximo uso"""
+        with self._lock:
+            self.ultimo_chequeo = 0.0
+
+    def cerrar(self):
+        """Cierra la sesión y el terminal"""
+        with self._lock:
+            try:
+                mt5.shutdown()
+            except Exception:
+                pass
+            self.inicializado = False
+            self.cuenta_activa = None
+            self.ultimo_chequeo = 0.0
+
+    def estadisticas(self):
+        """Devuelve las estadísticas de logins de la sesión"""
+        with self._lock:
+            return {
+                'cuenta_activa': self.cuenta_activa[0] if self.cuenta_activa else None,
+                'logins': self.logins,
+                'logins_fallidos': self.logins_fallidos,
+                'tiempo_logins_s': round(self.tiempo_logins, 4),
+                'tiempo_medio_login_ms': round(self.tiempo_logins / self.logins * 1000, 2) if self.logins else 0.0,
+                'ultimo_login_ms': round(self.ultimo_login * 1000, 2),
+                'cambios_cuenta': self.cambios_cuenta,
+                'reconexiones': self.reconexiones,
+                'reutilizaciones': self.reutilizaciones,
+            }
+
+    def mostrar_estadisticas(self):
+        """Imprime un resumen de la sesión"""
+        stats = self.estadisticas()
+        print("\n📊 Sesión MT5:")
+        print(f"   Cuenta activa: {stats['cuenta_activa']}")
+        print(f"   Logins: {stats['logins']} (fallidos: {stats['logins_fallidos']})")
+        print(f"   Tiempo en logins: {stats['tiempo_logins_s']:.3f}s (medio: {stats['tiempo_medio_login_ms']:.0f} ms)")
+        print(f"   Cambios de cuenta: {stats['cambios_cuenta']} | Reconexiones: {stats['reconexiones']}")
+        print(f"   Sesiones reutilizadas: {stats['reutilizaciones']}")
+
+
+# Instancia única compartida por todo el bot
+sesion = GestorSesionMT5()
+
+
+def asegurar_sesion(servidor, numero_cuenta, contraseña):
+    """Atajo para sesion.asegurar()"""
+    return sesion.asegurar(servidor, numero_cuenta, contraseña)
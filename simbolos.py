@@ -0,0 +1,265 @@
+"""
+REGISTRO DE SÍMBOLOS DEL BROKER
+Especificaciones de cada símbolo (dígitos, punto, tick, contrato, volumen, nivel de stops) leídas
+de symbol_info y cacheadas por cuenta (número@servidor) en memoria y en disco con caducidad.
+Las consultas de los caminos críticos son O(1); sin terminal se usan las heurísticas de patrones.py.
+"""
+import os
+import re
+import json
+import math
+import time
+import threading
+
+from instrumentacion_mt5 import mt5
+from sesion_mt5 import sesion
+from patrones import multiplicador_pips as multiplicador_heuristico, es_par_forex
+
+# Prefijo de los archivos del registro: uno por cuenta (simbolos_broker_<número>_<servidor>.json)
+ARCHIVO_SIMBOLOS = "simbolos_broker"
+# Las especificaciones (sobre todo el valor del tick) se refrescan cada 6 horas
+TTL_SIMBOLOS = 6 * 3600
+
+# Modos de cálculo de Forex en symbol_info.trade_calc_mode (SYMBOL_CALC_MODE_FOREX y _FOREX_NO_LEVERAGE)
+MODOS_CALCULO_FOREX = (0, 5)
+
+CAMPOS = ('nombre', 'digitos', 'punto', 'tamaño_tick', 'valor_tick', 'tamaño_contrato', 'volumen_min',
+          'volumen_max', 'volumen_paso', 'nivel_stops', 'es_forex', 'tamaño_pip', 'desde_broker')
+
+
+class EspecSimbolo:
+    """Especificación de un símbolo y sus derivados de pips precalculados"""
+
+    __slots__ = CAMPOS + ('multiplicador_pips', 'valor_pip_lote')
+
+    def __init__(self, nombre, digitos, punto, tamaño_tick, valor_tick, tamaño_contrato, volumen_min,
+                 volumen_max, volumen_paso, nivel_stops, es_forex, tamaño_pip, desde_broker=True):
+        self.nombre = nombre
+        self.digitos = digitos
+        self.punto = punto
+        self.tamaño_tick = tamaño_tick
+        self.valor_tick = valor_tick
+        self.tamaño_contrato = tamaño_contrato
+        self.volumen_min = volumen_min
+        self.volumen_max = volumen_max
+        self.volumen_paso = volumen_paso
+        self.nivel_stops = nivel_stops
+        self.es_forex = es_forex
+        self.tamaño_pip = tamaño_pip
+        self.desde_broker = desde_broker
+        self.multiplicador_pips = 1 / tamaño_pip
+        # Valor en la divisa de la cuenta de 1 pip con 1 lote
+        self.valor_pip_lote = valor_tick * tamaño_pip / tamaño_tick if tamaño_tick else 0.0
+
+    @classmethod
+    def desde_symbol_info(cls, info):
+        """Construye la especificación a partir del resultado de mt5.symbol_info"""
+        digitos = int(info.digits)
+        punto = float(info.point)
+        modo = getattr(info, 'trade_calc_mode', None)
+        es_forex = modo in MODOS_CALCULO_FOREX if modo is not None else es_par_forex(info.name)
+        # Cotización fraccional (5/3 dígitos en Forex, cualquier decimal fuera de Forex): 1 pip = 10 puntos
+        if digitos == 0 or (es_forex and digitos % 2 == 0):
+            tamaño_pip = punto
+        else:
+            tamaño_pip = round(punto * 10, digitos)
+        tamaño_tick = float(getattr(info, 'trade_tick_size', 0.0) or punto)
+        tamaño_contrato = float(getattr(info, 'trade_contract_size', 0.0) or 100000.0)
+        # Sin cotización el broker devuelve valor de tick 0: se aproxima en la divisa cotizada
+        valor_tick = float(getattr(info, 'trade_tick_value', 0.0) or tamaño_tick * tamaño_contrato)
+        return cls(
+            nombre=info.name,
+            digitos=digitos,
+            punto=punto,
+            tamaño_tick=tamaño_tick,
+            valor_tick=valor_tick,
+            tamaño_contrato=tamaño_contrato,
+            volumen_min=float(info.volume_min),
+            volumen_max=float(info.volume_max),
+            volumen_paso=float(info.volume_step),
+            nivel_stops=int(getattr(info, 'trade_stops_level', 0)),
+            es_forex=es_forex,
+            tamaño_pip=tamaño_pip,
+        )
+
+    @classmethod
+    def heuristica(cls, simbolo):
+        """Especificación aproximada sin terminal (mismas reglas de siempre: $10 por pip y lote)"""
+        tamaño_pip = 1 / multiplicador_heuristico(simbolo)
+        punto = tamaño_pip / 10
+        return cls(
+            nombre=simbolo,
+            digitos=max(0, round(-math.log10(punto))),
+            punto=punto,
+            tamaño_tick=punto,
+            valor_tick=1.0,
+            tamaño_contrato=100000.0,
+            volumen_min=0.01,
+            volumen_max=100.0,
+            volumen_paso=0.01,
+            nivel_stops=0,
+            es_forex=es_par_forex(simbolo),
+            tamaño_pip=tamaño_pip,
+            desde_broker=False,
+        )
+
+    def a_dict(self):
+        return {campo: getattr(self, campo) for campo in CAMPOS}
+
+
+class RegistroSimbolos:
+    """
+    Especificaciones por (cuenta, símbolo) en memoria (dict) con copia en disco por cuenta y caducidad.
+    La cuenta es la de la sesión MT5 activa: cada broker/divisa de depósito tiene su propio valor de tick.
+    """
+
+    def __init__(self, archivo=ARCHIVO_SIMBOLOS, ttl=TTL_SIMBOLOS):
+        self._lock = threading.Lock()
+        self.archivo = archivo
+        self.ttl = ttl
+        self._simbolos = {}  # (cuenta, símbolo) -> EspecSimbolo
+        self._actualizado = {}  # (cuenta, símbolo) -> timestamp de la lectura del broker
+        self._cuentas_cargadas = set()
+        self.consultas_broker = 0
+        self.aproximaciones = 0
+
+    @staticmethod
+    def _cuenta_activa():
+        """Clave 'número@servidor' de la sesión activa (None sin sesión)"""
+        cuenta = sesion.cuenta_activa
+        if cuenta is None:
+            return None
+        numero_cuenta, servidor = cuenta
+        return f"{numero_cuenta}@{servidor}"
+
+    # ---------------- Disco ----------------
+
+    def _ruta(self, cuenta):
+        if not self.archivo or cuenta is None:
+            return None
+        numero_cuenta, servidor = cuenta.split('@', 1)
+        return f"{self.archivo}_{numero_cuenta}_{re.sub(r'[^A-Za-z0-9]+', '_', servidor)}.json"
+
+    def _cargar_disco(self, cuenta):
+        """Carga (una vez por cuenta) las especificaciones no caducadas guardadas en disco"""
+        if cuenta in self._cuentas_cargadas:
+            return
+        self._cuentas_cargadas.add(cuenta)
+        ruta = self._ruta(cuenta)
+        if ruta is None or not os.path.exists(ruta):
+            return
+        try:
+            with open(ruta, 'r', encoding='utf-8') as f:
+                datos = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"❌ Error cargando registro de símbolos: {e}")
+            return
+        ahora = time.time()
+        with self._lock:
+            for nombre, fila in datos.items():
+                actualizado = fila.pop('actualizado', 0)
+                if ahora - actualizado < self.ttl:
+                    self._simbolos.setdefault((cuenta, nombre), EspecSimbolo(**fila))
+                    self._actualizado.setdefault((cuenta, nombre), actualizado)
+
+    def _guardar_disco(self, cuenta):
+        ruta = self._ruta(cuenta)
+        if ruta is None:
+            return
+        with self._lock:
+            datos = {nombre: {**espec.a_dict(), 'actualizado': self._actualizado[(c, nombre)]}
+                     for (c, nombre), espec in self._simbolos.items() if c == cuenta}
+        # Temporal propio del proceso: los trabajadores de ejecución pueden escribir a la vez
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        try:
+            with open(temporal, 'w', encoding='utf-8') as f:
+                json.dump(datos, f, ensure_ascii=False, indent=2)
+            os.replace(temporal, ruta)
+        except OSError as e:
+            print(f"❌ Error guardando registro de símbolos: {e}")
+
+    # ---------------- Broker ----------------
+
+    def _leer_broker(self, simbolo):
+        self.consultas_broker += 1
+        try:
+            info = mt5.symbol_info(simbolo)
+        except Exception:
+            info = None
+        return EspecSimbolo.desde_symbol_info(info) if info is not None else None
+
+    def _registrar(self, cuenta, simbolo, espec, ahora):
+        with self._lock:
+            self._simbolos[(cuenta, simbolo)] = espec
+            self._actualizado[(cuenta, simbolo)] = ahora
+
+    def cargar(self, simbolos, forzar=False):
+        """
+        Lee del broker los símbolos ausentes o caducados (todos si 'forzar') y guarda el registro
+        de la cuenta activa. Requiere una sesión MT5 activa. Returns: cantidad de símbolos leídos del broker
+        """
+        cuenta = self._cuenta_activa()
+        self._cargar_disco(cuenta)
+        ahora = time.time()
+        leidos = 0
+        for simbolo in simbolos:
+            if not forzar and ahora - self._actualizado.get((cuenta, simbolo), 0) < self.ttl:
+                continue
+            espec = self._leer_broker(simbolo)
+            if espec is None:
+                print(f"⚠️  {simbolo}: sin symbol_info, se usan valores aproximados")
+                continue
+            self._registrar(cuenta, simbolo, espec, ahora)
+            leidos += 1
+        if leidos:
+            self._guardar_disco(cuenta)
+        return leidos
+
+    # ---------------- Consultas O(1) ----------------
+
+    def obtener(self, simbolo):
+        """
+        Especificación del símbolo en la cuenta activa. Si falta o caducó se pide al broker;
+        si el broker no responde se usa la copia caducada o, sin ella, una aproximación que no se cachea.
+        """
+        cuenta = self._cuenta_activa()
+        if cuenta not in self._cuentas_cargadas:
+            self._cargar_disco(cuenta)
+        clave = (cuenta, simbolo)
+        espec = self._simbolos.get(clave)
+        ahora = time.time()
+        if espec is not None and ahora - self._actualizado[clave] < self.ttl:
+            return espec
+
+        nueva = self._leer_broker(simbolo)
+        if nueva is not None:
+            self._registrar(cuenta, simbolo, nueva, ahora)
+            self._guardar_disco(cuenta)
+            return nueva
+        if espec is not None:
+            return espec
+        self.aproximaciones += 1
+        return EspecSimbolo.heuristica(simbolo)
+
+    def multiplicador_pips(self, simbolo):
+        return self.obtener(simbolo).multiplicador_pips
+
+    def tamaño_pip(self, simbolo):
+        return self.obtener(simbolo).tamaño_pip
+
+    def es_forex(self, simbolo):
+        return self.obtener(simbolo).es_forex
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'simbolos': len(self._simbolos),
+                'desde_broker': sum(1 for e in self._simbolos.values() if e.desde_broker),
+                'cuentas': len({cuenta for cuenta, _ in self._simbolos}),
+                'consultas_broker': self.consultas_broker,
+                'aproximaciones': self.aproximaciones,
+            }
+
+
+# Instancia única compartida por todo el bot (en cada proceso)
+registro_simbolos = RegistroSimbolos()
@@ -0,0 +1,157 @@
+"""
+MODO STREAMING DE TICKS
+Sondea el último tick de cada par en un bucle ligero y detecta el primer tick de cada vela nueva,
+para analizar la vela recién cerrada en milisegundos en lugar de esperar al planificador.
+El uso de CPU se limita con una pausa mínima entre pasadas y un porcentaje máximo de trabajo.
+"""
+import time
+from collections import deque
+from datetime import datetime
+
+import pytz
+from instrumentacion_mt5 import mt5
+from tiempo import reloj, convertir_a_hora_ny
+from planificador import SEGUNDOS_TEMPORALIDAD, MAX_ESPERA_PUBLICACION, apertura_vela, esperar_publicacion
+
+# Pausa mínima (s) entre pasadas por todos los pares
+INTERVALO_SONDEO = 0.05
+# Porcentaje máximo de un núcleo que puede ocupar el sondeo (sin contar las tareas de cierre)
+MAX_CPU_PCT = 25.0
+
+
+class FlujoTicks:
+    """
+    Detecta cierres de vela a partir de los ticks de los pares.
+    Una vela de la temporalidad cierra cuando llega el primer tick (de cualquier par) con hora de
+    servidor en la vela siguiente; los cierres se calculan sobre la hora del servidor, como las velas de MT5.
+    """
+
+    def __init__(self, pares, temporalidades, intervalo_sondeo=INTERVALO_SONDEO, max_cpu_pct=MAX_CPU_PCT,
+                 esperar_publicacion=False, simbolo_referencia=None,
+                 max_espera_publicacion=MAX_ESPERA_PUBLICACION, historial=500):
+        desconocidas = [tf for tf in temporalidades if tf not in SEGUNDOS_TEMPORALIDAD]
+        if desconocidas:
+            raise ValueError(f"Temporalidades no soportadas: {desconocidas}")
+
+        self.pares = pares  # Lista compartida con config (cambios en caliente incluidos)
+        self.temporalidades = list(dict.fromkeys(temporalidades))
+        self.intervalo_sondeo = intervalo_sondeo
+        self.max_cpu_pct = max(1.0, min(100.0, max_cpu_pct))
+        # El primer tick de la vela nueva puede llegar antes de que copy_rates la publique
+        self.esperar_publicacion = esperar_publicacion
+        self.simbolo_referencia = simbolo_referencia
+        self.max_espera_publicacion = max_espera_publicacion
+        self.ultimo_tick = {}  # par -> time_msc del último tick visto
+        self.apertura_actual = {}  # temporalidad -> apertura (hora servidor) de la vela en formación
+        self.activo = False
+
+        # Estadísticas
+        self.pasadas = 0
+        self.ticks = 0
+        self.tiempo_sondeo = 0.0
+        self.retrasos = deque(maxlen=historial)  # ms desde la apertura de la vela hasta su detección
+
+    def _apertura(self, temporalidad, ts_servidor):
+        return int(apertura_vela(temporalidad, int(ts_servidor)))
+
+    def sondear(self):
+        """
+        Una pasada por todos los pares.
+        Returns:
+            (nuevos, cerradas): pares con tick nuevo [(par, tick)] y temporalidades cuya vela cerró
+            con el mayor time_msc de la pasada
+        """
+        nuevos = []
+        ultimo_msc = None
+        for par in self.pares:
+            tick = mt5.symbol_info_tick(par)
+            if tick is None or tick.time_msc == self.ultimo_tick.get(par):
+                continue
+            self.ultimo_tick[par] = tick.time_msc
+            nuevos.append((par, tick))
+            if ultimo_msc is None or tick.time_msc > ultimo_msc:
+                ultimo_msc = tick.time_msc
+        self.ticks += len(nuevos)
+
+        cerradas = []
+        if ultimo_msc is not None:
+            ts_servidor = ultimo_msc / 1000
+            for tf in self.temporalidades:
+                apertura = self._apertura(tf, ts_servidor)
+                previa = self.apertura_actual.get(tf)
+                self.apertura_actual[tf] = max(apertura, previa or apertura)
+                # La primera pasada solo fija la vela en formación
+                if previa is not None and apertura > previa:
+                    cerradas.append((tf, apertura))
+        return nuevos, cerradas
+
+    def _esperar_publicacion(self, cerradas):
+        """Espera (como el planificador) a que el broker publique la vela nueva de cada temporalidad"""
+        if not self.esperar_publicacion:
+            return None
+        simbolo = self.simbolo_referencia or (self.pares[0] if self.pares else None)
+        if simbolo is None:
+            return None
+        esperado = None
+        for tf, apertura in cerradas:
+            ms = esperar_publicacion(simbolo, [tf], apertura, self.max_espera_publicacion)
+            if ms is not None:
+                esperado = (esperado or 0.0) + ms
+        return esperado
+
+    def _evento(self, cerradas):
+        """Evento con el mismo formato que Planificador.esperar_siguiente()"""
+        apertura = max(ap for _, ap in cerradas)
+        desfase = reloj.desfase_servidor or 0
+        cierre_utc = apertura - desfase
+        retraso = (reloj.timestamp() - cierre_utc) * 1000
+        self.retrasos.append(retraso)
+        retraso_publicacion = self._esperar_publicacion(cerradas)
+        return {
+            'cierre_utc': datetime.fromtimestamp(cierre_utc, pytz.UTC),
+            'hora_ny': convertir_a_hora_ny(float(cierre_utc)),
+            'temporalidades': [tf for tf, _ in cerradas],
+            'retraso_ms': retraso,
+            'retraso_publicacion_ms': retraso_publicacion,
+            'retraso_total_ms': (reloj.timestamp() - cierre_utc) * 1000,
+        }
+
+    def ejecutar(self, al_cerrar, al_tick=None):
+        """
+        Bucle principal hasta detener() (o Ctrl+C).
+        al_cerrar(evento): se llama con cada cierre de vela detectado.
+        al_tick(par, tick): opcional, con cada tick nuevo (p. ej. evaluar la vela en formación).
+        """
+        self.activo = True
+        while self.activo:
+            inicio = time.perf_counter()
+            nuevos, cerradas = self.sondear()
+            if al_tick is not None:
+                for par, tick in nuevos:
+                    al_tick(par, tick)
+            trabajo = time.perf_counter() - inicio
+            self.pasadas += 1
+            self.tiempo_sondeo += trabajo
+
+            if cerradas:
+                al_cerrar(self._evento(cerradas))
+                continue
+
+            # Pausa: la mínima configurada o la necesaria para no pasar del porcentaje de CPU
+            pausa = max(self.intervalo_sondeo, trabajo * (100.0 / self.max_cpu_pct - 1))
+            time.sleep(pausa)
+
+    def detener(self):
+        self.activo = False
+
+    def estadisticas(self):
+        """Pasadas, ticks y retraso de detección (ms) respecto a la apertura de la vela nueva"""
+        retrasos = sorted(self.retrasos)
+        return {
+            'pasadas': self.pasadas,
+            'ticks': self.ticks,
+            'sondeo_medio_ms': round(self.tiempo_sondeo / self.pasadas * 1000, 3) if self.pasadas else 0.0,
+            'cierres': len(retrasos),
+            'retraso_medio_ms': round(sum(retrasos) / len(retrasos), 2) if retrasos else None,
+            'retraso_p95_ms': round(retrasos[int(0.95 * (len(retrasos) - 1))], 2) if retrasos else None,
+        }
@@ -1,71 +1,200 @@
 # tiempo.py
 """
 Módulo simplificado para manejo de tiempo en trading.
-Solo 2 funciones esenciales: obtener hora actual y convertir a NY.
+Reloj del servidor sincronizado de forma periódica (sin I/O por consulta)
+y conversión a hora de Nueva York con zona horaria cacheada.
 """
 
+import time
+import threading
+from functools import lru_cache
+from datetime import datetime, timedelta
+
 import pytz
-from datetime import datetime
 from dateutil import parser
-import MetaTrader5 as mt5
+from instrumentacion_mt5 import mt5
+from sesion_mt5 import sesion
+
+# Zona horaria de NY construida una sola vez
+TZ_NY = pytz.timezone('America/New_York')
+
+# Resincronizar el reloj cada 15 minutos
+INTERVALO_SINCRONIZACION = 900
+# Segundos de diferencia entre reloj de pared y monotónico que se consideran deriva
+MAX_DERIVA = 2.0
+# Granularidad del huso horario del broker (30 minutos)
+GRANULARIDAD_HUSO = 1800
+# Reintento tras una sincronización fallida (sin sesión, sin tick o tick antiguo)
+REINTENTO_SINCRONIZACION = 60
+# Residuo máximo (s) tras redondear al huso: más indica un tick antiguo (fin de semana, mercado parado)
+MAX_RESIDUO_TICK = 5.0
+
+
+class RelojServidor:
+    """
+    Mide una vez el desfase del servidor MT5 y responde la hora actual
+    (servidor, UTC y NY) sin consultar al broker en cada llamada.
+    """
+
+    def __init__(self, simbolo="EURUSD", intervalo_sincronizacion=INTERVALO_SINCRONIZACION, max_deriva=MAX_DERIVA):
+        self._lock = threading.Lock()
+        self.simbolo = simbolo
+        self.intervalo_sincronizacion = intervalo_sincronizacion
+        self.max_deriva = max_deriva
+
+        self.desfase_servidor = None  # Segundos: hora servidor - UTC
+        self.correccion_local = 0.0   # Segundos que hay que sumar al reloj local
+        self.ultima_sincronizacion = None  # (time.time(), time.monotonic())
+        self.proxima_sincronizacion = 0.0  # Plazo en reloj monotónico
+        self.sincronizaciones = 0
+        self.ticks_antiguos = 0
+
+    def _leer_tick(self):
+        """Lee el último tick usando la sesión activa (sin initialize/shutdown)"""
+        if not sesion.inicializado:
+            return None
+        tick = mt5.symbol_info_tick(self.simbolo)
+        if tick is None:
+            return None
+        if getattr(tick, 'time_msc', 0):
+            return tick.time_msc / 1000.0
+        return float(tick.time)
+
+    def sincronizar(self):
+        """Mide el desfase del servidor a partir del último tick"""
+        try:
+            ts_tick = self._leer_tick()
+        except Exception:
+            ts_tick = None
+
+        with self._lock:
+            ahora_local = time.time()
+            monotonico = time.monotonic()
+            self.ultima_sincronizacion = (ahora_local, monotonico)
+            if ts_tick is None:
+                self.proxima_sincronizacion = monotonico + min(REINTENTO_SINCRONIZACION, self.intervalo_sincronizacion)
+                return False
+
+            bruto = ts_tick - ahora_local
+            desfase = round(bruto / GRANULARIDAD_HUSO) * GRANULARIDAD_HUSO
+            residuo = bruto - desfase
+
+            # Un tick de hace minutos u horas da un huso equivocado: se conserva la medida anterior
+            # (sin medida previa, el huso se adopta como provisional, sin corregir el reloj local)
+            if abs(residuo) > MAX_RESIDUO_TICK:
+                self.ticks_antiguos += 1
+                if self.desfase_servidor is None:
+                    self.desfase_servidor = desfase
+                self.proxima_sincronizacion = monotonico + min(REINTENTO_SINCRONIZACION, self.intervalo_sincronizacion)
+                return False
+
+            self.proxima_sincronizacion = monotonico + self.intervalo_sincronizacion
+            self.desfase_servidor = desfase
+            # Un tick no puede venir del futuro: si lo parece, el reloj local va atrasado
+            self.correccion_local = residuo if residuo > 0 else 0.0
+            self.sincronizaciones += 1
+            return True
+
+    def _necesita_sincronizar(self):
+        if self.ultima_sincronizacion is None:
+            return True
+        ahora = time.monotonic()
+        if ahora >= self.proxima_sincronizacion:
+            return True
+        pared, monotonico = self.ultima_sincronizacion
+        transcurrido = ahora - monotonico
+        # Deriva: el reloj de pared saltó respecto al monotónico
+        return abs((time.time() - pared) - transcurrido) > self.max_deriva
+
+    def timestamp(self):
+        """Epoch UTC actual corregido"""
+        if self._necesita_sincronizar():
+            self.sincronizar()
+        return time.time() + self.correccion_local
+
+    def ahora_utc(self):
+        """Hora actual en UTC"""
+        return datetime.fromtimestamp(self.timestamp(), pytz.UTC)
+
+    def ahora_servidor(self):
+        """Hora actual del servidor MT5 (naive, como la reporta MT5)"""
+        ts = self.timestamp()
+        return datetime.fromtimestamp(ts + (self.desfase_servidor or 0), pytz.UTC).replace(tzinfo=None)
+
+    def ahora_ny(self):
+        """Hora actual en Nueva York"""
+        return convertir_a_hora_ny(self.ahora_utc())
+
+    def estado(self):
+        """Resumen del estado de sincronización"""
+        return {
+            'desfase_servidor_h': None if self.desfase_servidor is None else self.desfase_servidor / 3600,
+            'correccion_local_s': round(self.correccion_local, 3),
+            'sincronizaciones': self.sincronizaciones,
+            'ticks_antiguos': self.ticks_antiguos,
+        }
+
+
+# Instancia única del reloj
+reloj = RelojServidor()
+
 
 def obtener_hora_actual():
     """
-    Obtiene la hora actual del servidor MT5 si está disponible, 
-    de lo contrario usa la hora local del sistema.
-    
+    Obtiene la hora actual del reloj del servidor sincronizado.
+    Solo consulta MT5 cuando toca resincronizar.
+
     Returns:
         datetime: Hora actual en UTC
     """
-    try:
-        # Intentar obtener hora del último tick de EURUSD
-        if mt5.initialize():
-            tick = mt5.symbol_info_tick("EURUSD")
-            mt5.shutdown()
-            
-            if tick and hasattr(tick, 'time'):
-                # tick.time es timestamp UTC en segundos
-                return datetime.fromtimestamp(tick.time, pytz.UTC)
-    except:
-        pass
-    
-    # Fallback: hora del sistema en UTC
-    return datetime.now(pytz.UTC)
+    return reloj.ahora_utc()
+
+
+@lru_cache(maxsize=256)
+def _tz_ny_por_hora(hora_epoch):
+    """
+    Desfase y tzinfo de NY para una hora UTC (epoch // 3600).
+    Los cambios de horario ocurren en horas exactas UTC, así que basta una entrada por hora.
+    """
+    dt_ny = datetime.fromtimestamp(hora_epoch * 3600, pytz.UTC).astimezone(TZ_NY)
+    return dt_ny.utcoffset(), dt_ny.tzinfo
+
 
 def convertir_a_hora_ny(hora_input):
     """
     Convierte cualquier hora a hora de Nueva York.
     Acepta: datetime, string, timestamp (int/float)
-    
+
     Args:
         hora_input: Hora en cualquier formato común
-    
+
     Returns:
         datetime: Hora en zona horaria de Nueva York
     """
-    tz_ny = pytz.timezone('America/New_York')
-    
     # Si ya es datetime
     if isinstance(hora_input, datetime):
         dt = hora_input
-    
+
     # Si es timestamp numérico
     elif isinstance(hora_input, (int, float)):
         dt = datetime.fromtimestamp(hora_input, pytz.UTC)
-    
+
     # Si es string
     elif isinstance(hora_input, str):
         dt = parser.parse(hora_input)
-    
+
     else:
         raise TypeError(f"Formato no soportado: {type(hora_input)}")
-    
+
     # Asegurar que tenga zona horaria (asumir UTC si no la tiene)
     if dt.tzinfo is None:
         dt = pytz.utc.localize(dt)
-    
-    # Convertir a Nueva York
-    return dt.astimezone(tz_ny)
+
+    # Convertir a Nueva York usando el desfase cacheado de esa hora
+    utc_naive = dt.astimezone(pytz.UTC).replace(tzinfo=None)
+    hora_epoch = int((utc_naive - datetime(1970, 1, 1)) // timedelta(hours=1))
+    desfase, tzinfo = _tz_ny_por_hora(hora_epoch)
+    return (utc_naive + desfase).replace(tzinfo=tzinfo)
 
 # Uso directo sin necesidad de funciones adicionales
 if __name__ == "__main__":
@@ -73,7 +202,7 @@ if __name__ == "__main__":
     hora_actual = obtener_hora_actual()
     hora_ny = convertir_a_hora_ny(hora_actual)
     print(f"Hora actual NY: {hora_ny.strftime('%Y-%m-%d %H:%M:%S %Z')}")
-    
+
     # Ejemplo 2: Convertir string cualquiera
     ejemplo = convertir_a_hora_ny("2024-01-15 14:30:00")
-    print(f"String a NY: {ejemplo.strftime('%H:%M %Z')}")
\ No newline at end of file
+    print(f"String a NY: {ejemplo.strftime('%H:%M %Z')}")